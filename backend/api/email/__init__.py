@@ -3,7 +3,8 @@ Email Module
 Email notifications system for RINOS E-Commerce
 """
 
-from .email_service import send_email, send_bulk_email, is_email_configured, test_email_connection
+from .email_service import send_email, send_email_now, send_bulk_email, is_email_configured, test_email_connection
+from .template_engine import render_email, render_emails
 from .email_notifications import (
     send_order_confirmation,
     send_payment_receipt,
@@ -19,6 +20,7 @@ from .email_notifications import (
 __all__ = [
     # Core functions
     "send_email",
+    "send_email_now",
     "send_bulk_email",
     "is_email_configured",
     "test_email_connection",
@@ -30,6 +32,10 @@ __all__ = [
     "send_email_verification",
     "send_password_reset",
     
+    # Templates
+    "render_email",
+    "render_emails",
+    
     # Helper functions for model integration
     "send_order_confirmation_from_order",
     "send_payment_receipt_from_payment",
@@ -8,13 +8,7 @@ from datetime import datetime
 from decimal import Decimal
 
 from api.email.email_service import send_email
-from api.email.email_templates import (
-    get_order_confirmation_template,
-    get_payment_receipt_template,
-    get_shipping_notification_template,
-    get_email_verification_template,
-    get_password_reset_template
-)
+from api.email.template_engine import render_email, render_subject
 
 
 # ============================================================================
@@ -41,13 +35,14 @@ def send_order_confirmation(order_data: Dict[str, Any]) -> bool:
             - billing_postalcode: str
             - billing_country: str
             - payment_method: str
+            - locale: str (optional, 'de' or 'en', default 'de')
             
     Returns:
         True if email sent successfully
     """
     
-    subject = f"Bestellbestätigung - Bestellung {order_data['order_number']}"
-    html_content = get_order_confirmation_template(order_data)
+    subject = render_subject('order_confirmation', order_data)
+    html_content = render_email('order_confirmation', order_data)
     
     return send_email(
         to_email=order_data['customer_email'],
@@ -70,13 +65,14 @@ def send_payment_receipt(payment_data: Dict[str, Any]) -> bool:
             - currency: str
             - payment_method: str
             - receipt_url: str (optional)
+            - locale: str (optional, 'de' or 'en', default 'de')
             
     Returns:
         True if email sent successfully
     """
     
-    subject = f"Zahlungsbestätigung - Bestellung {payment_data['order_number']}"
-    html_content = get_payment_receipt_template(payment_data)
+    subject = render_subject('payment_receipt', payment_data)
+    html_content = render_email('payment_receipt', payment_data)
     
     return send_email(
         to_email=payment_data['customer_email'],
@@ -97,13 +93,14 @@ def send_shipping_notification(shipping_data: Dict[str, Any]) -> bool:
             - tracking_number: str
             - carrier: str
             - estimated_delivery: str (optional)
+            - locale: str (optional, 'de' or 'en', default 'de')
             
     Returns:
         True if email sent successfully
     """
     
-    subject = f"Versandbestätigung - Bestellung {shipping_data['order_number']}"
-    html_content = get_shipping_notification_template(shipping_data)
+    subject = render_subject('shipping_notification', shipping_data)
+    html_content = render_email('shipping_notification', shipping_data)
     
     return send_email(
         to_email=shipping_data['customer_email'],
@@ -126,6 +123,7 @@ def send_email_verification(verification_data: Dict[str, Any]) -> bool:
             - user_email: str
             - verification_token: str
             - verification_url: str (or build from token)
+            - locale: str (optional, 'de' or 'en', default 'de')
             
     Returns:
         True if email sent successfully
@@ -137,8 +135,8 @@ def send_email_verification(verification_data: Dict[str, Any]) -> bool:
         token = verification_data['verification_token']
         verification_data['verification_url'] = f"{base_url}/verify-email?token={token}"
     
-    subject = "Bitte bestätigen Sie Ihre E-Mail-Adresse - RINOS Bikes"
-    html_content = get_email_verification_template(verification_data)
+    subject = render_subject('email_verification', verification_data)
+    html_content = render_email('email_verification', verification_data)
     
     return send_email(
         to_email=verification_data['user_email'],
@@ -157,6 +155,7 @@ def send_password_reset(reset_data: Dict[str, Any]) -> bool:
             - user_email: str
             - reset_token: str
             - reset_url: str (or build from token)
+            - locale: str (optional, 'de' or 'en', default 'de')
             
     Returns:
         True if email sent successfully
@@ -168,8 +167,8 @@ def send_password_reset(reset_data: Dict[str, Any]) -> bool:
         token = reset_data['reset_token']
         reset_data['reset_url'] = f"{base_url}/reset-password?token={token}"
     
-    subject = "Passwort zurücksetzen - RINOS Bikes"
-    html_content = get_password_reset_template(reset_data)
+    subject = render_subject('password_reset', reset_data)
+    html_content = render_email('password_reset', reset_data)
     
     return send_email(
         to_email=reset_data['user_email'],
@@ -255,7 +254,8 @@ def send_email_verification_from_user(user, verification_token: str) -> bool:
     verification_data = {
         'user_name': user.first_name,
         'user_email': user.email,
-        'verification_token': verification_token
+        'verification_token': verification_token,
+        'locale': user.language_preference
     }
     
     return send_email_verification(verification_data)
@@ -276,7 +276,8 @@ def send_password_reset_from_user(user, reset_token: str) -> bool:
     reset_data = {
         'user_name': user.first_name,
         'user_email': user.email,
-        'reset_token': reset_token
+        'reset_token': reset_token,
+        'locale': user.language_preference
     }
     
     return send_password_reset(reset_data)
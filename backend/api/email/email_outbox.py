@@ -0,0 +1,230 @@
+"""
+Email Outbox
+Queues emails in the database and sends them in the background
+
+send_email() inserts a row into email_outbox and returns; registration,
+password reset and the payment webhook worker no longer wait 1-3 seconds for
+an SMTP handshake. The email worker sends pending emails in batches of
+EMAIL_BATCH_SIZE over pooled SMTP connections (email_service.SMTPConnectionPool):
+
+    - right after the request that queued them: drain_email_outbox() as a
+      FastAPI BackgroundTask (auth routes, Stripe webhook) - needs no
+      long-lived process, so it also works on the Vercel serverless entry
+      point (api/index.py)
+    - in the API process: a background thread (EMAIL_WORKER) polling every
+      EMAIL_POLL_SECONDS, which picks up retries that are due
+    - from the command line: python send_emails.py [--loop]
+
+Serverless instances don't keep the thread alive between requests; schedule
+send_emails.py (cron) there so retries don't wait for the next email.
+
+Batches are claimed with FOR UPDATE SKIP LOCKED and marked 'sending' with a
+lease of EMAIL_SEND_LEASE_SECONDS in one short transaction, so several workers
+never send the same email and no database connection or row lock is held while
+SMTP runs. Emails of a worker that died mid-batch are sent again once their
+lease has run out. Temporary failures are retried with backoff (1, 2, 4, ... min);
+permanent ones (5xx, refused recipient) and emails out of EMAIL_MAX_ATTEMPTS
+are marked 'failed'. Every row keeps its delivery status and last error.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.connection import Base, engine
+from models.email import EmailOutbox
+from api.email.email_service import smtp_pool, build_message, is_permanent_error
+
+
+def ensure_email_outbox_table(engine) -> None:
+    """Create email_outbox if missing (called on startup)"""
+    Base.metadata.create_all(bind=engine, tables=[EmailOutbox.__table__])
+
+
+def queue_emails(emails: List[dict]) -> int:
+    """
+    Insert emails into the outbox (own transaction)
+
+    Args:
+        emails: [{to_email, subject, html_content, text_content}]
+
+    Returns:
+        Number of queued emails
+    """
+    if not emails:
+        return 0
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(EmailOutbox), [
+            dict(email, status='pending', attempts=0, created_at=now) for email in emails
+        ])
+    return len(emails)
+
+
+# ============================================================================
+# SENDING
+# ============================================================================
+
+def _retry_delay(attempts: int) -> timedelta:
+    """1, 2, 4, 8, ... minutes, capped at 1h"""
+    return timedelta(minutes=min(2 ** (attempts - 1), 60))
+
+
+def claim_batch(db: Session, batch_size: Optional[int] = None) -> List[tuple]:
+    """
+    Claim due emails for sending (and commit)
+
+    Marks them 'sending' until the lease runs out and counts the attempt.
+
+    Returns:
+        [(email_id, message)], ready for smtp_pool.send()
+    """
+    now = datetime.utcnow()
+    emails = db.query(EmailOutbox).filter(or_(
+        and_(
+            EmailOutbox.status == 'pending',
+            or_(EmailOutbox.next_attempt_at.is_(None), EmailOutbox.next_attempt_at <= now)
+        ),
+        # Claimed by a worker that didn't finish
+        and_(EmailOutbox.status == 'sending', EmailOutbox.next_attempt_at <= now)
+    )).order_by(EmailOutbox.email_id).limit(
+        batch_size or settings.EMAIL_BATCH_SIZE
+    ).with_for_update(skip_locked=True).all()
+
+    lease_until = now + timedelta(seconds=settings.EMAIL_SEND_LEASE_SECONDS)
+    claimed = []
+    for email in emails:
+        email.status = 'sending'
+        email.attempts += 1
+        email.next_attempt_at = lease_until
+        claimed.append((
+            email.email_id,
+            build_message(email.to_email, email.subject, email.html_content, email.text_content)
+        ))
+    db.commit()
+    return claimed
+
+
+def send_pending_batch(db: Session, batch_size: Optional[int] = None) -> dict:
+    """
+    Send one batch of due emails over one pooled connection and record the results
+
+    Claiming and recording are two short transactions; nothing is held open
+    while the SMTP server is talked to.
+
+    Returns:
+        {"sent": n, "retry": n, "failed": n}
+    """
+    report = {"sent": 0, "retry": 0, "failed": 0}
+    claimed = claim_batch(db, batch_size)
+    if not claimed:
+        return report
+
+    # The session's connection went back to the pool with the commit
+    errors = smtp_pool.send([message for _, message in claimed])
+
+    done_at = datetime.utcnow()
+    emails = {
+        email.email_id: email for email in db.query(EmailOutbox).filter(
+            EmailOutbox.email_id.in_([email_id for email_id, _ in claimed])
+        ).all()
+    }
+    for (email_id, _), error in zip(claimed, errors):
+        email = emails[email_id]
+        if error is None:
+            email.status = 'sent'
+            email.sent_at = done_at
+            email.next_attempt_at = None
+            email.last_error = None
+            report["sent"] += 1
+            continue
+
+        email.last_error = str(error)[:2000]
+        if is_permanent_error(error) or email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+            email.status = 'failed'
+            email.next_attempt_at = None
+            report["failed"] += 1
+            print(f"❌ Failed to send email to {email.to_email}: {str(error)}")
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = done_at + _retry_delay(email.attempts)
+            report["retry"] += 1
+    db.commit()
+    return report
+
+
+def send_pending_emails(db: Session, max_batches: int = 100) -> dict:
+    """Send due emails batch by batch until none are left"""
+    total = {"sent": 0, "retry": 0, "failed": 0}
+    for _ in range(max_batches):
+        report = send_pending_batch(db)
+        for key, count in report.items():
+            total[key] += count
+        if report["sent"] == 0:
+            # Nothing due, or the server doesn't accept anything right now
+            break
+    return total
+
+
+def drain_email_outbox(session_factory, max_batches: int = 5) -> dict:
+    """
+    Send due emails with an own session (BackgroundTask after queuing)
+
+    Errors are logged only; the emails stay in the outbox for the next run.
+    """
+    db = session_factory()
+    try:
+        report = send_pending_emails(db, max_batches)
+        if any(report.values()):
+            print(f"[OK] Emails: {report}")
+        return report
+    except Exception as e:
+        db.rollback()
+        print(f"[WARNING] Could not send queued emails: {e}")
+        return {"sent": 0, "retry": 0, "failed": 0}
+    finally:
+        db.close()
+
+
+# ============================================================================
+# WORKER THREAD
+# ============================================================================
+
+_worker_stop = threading.Event()
+_worker_wake = threading.Event()
+
+
+def start_email_worker(session_factory) -> Optional[threading.Thread]:
+    """Send queued emails in a background thread (EMAIL_WORKER=false = off)"""
+    if not settings.EMAIL_WORKER:
+        return None
+
+    def run():
+        while not _worker_stop.is_set():
+            _worker_wake.clear()
+            db = session_factory()
+            try:
+                report = send_pending_emails(db)
+                if any(report.values()):
+                    print(f"[OK] Emails: {report}")
+            except Exception as e:
+                db.rollback()
+                print(f"[WARNING] Email worker failed: {e}")
+            finally:
+                db.close()
+            _worker_wake.wait(settings.EMAIL_POLL_SECONDS)
+
+    _worker_stop.clear()
+    thread = threading.Thread(target=run, name="email-outbox", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_email_worker() -> None:
+    _worker_stop.set()
+    _worker_wake.set()
+    smtp_pool.close()
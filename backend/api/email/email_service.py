@@ -1,9 +1,14 @@
 """
 Email Service
 Handles sending emails using SMTP
+
+send_email() only queues; the email worker (api/email/email_outbox.py)
+delivers queued emails over pooled, already authenticated SMTP connections.
 """
 
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, List
@@ -33,10 +38,142 @@ class EmailConfig:
     SEND_EMAILS: bool = getattr(settings, 'SEND_EMAILS', True)
 
 
+# ============================================================================
+# SMTP CONNECTION POOL
+# ============================================================================
+
+# Errors about one message (the connection stays usable)
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """5xx answers and refused recipients won't succeed on a retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPConnectionPool:
+    """
+    Authenticated SMTP connections reused across messages
+
+    Connecting, STARTTLS and login take 1-3 seconds with IONOS; a pooled
+    connection sends the next message right away. Connections idle for more
+    than SMTP_IDLE_SECONDS or used for SMTP_MAX_MESSAGES_PER_CONNECTION
+    messages are closed, and a connection the server dropped is reopened once.
+    """
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # [server, messages sent, last used]
+        self._lock = threading.Lock()
+
+    def _open(self) -> list:
+        server = smtplib.SMTP(EmailConfig.SMTP_HOST, EmailConfig.SMTP_PORT, timeout=30)
+        # Only use STARTTLS for port 587, not for port 25
+        if EmailConfig.SMTP_PORT == 587:
+            server.starttls()
+        server.login(EmailConfig.SMTP_USERNAME, EmailConfig.SMTP_PASSWORD)
+        return [server, 0, time.monotonic()]
+
+    @staticmethod
+    def _close(entry: list) -> None:
+        try:
+            entry[0].quit()
+        except Exception:
+            pass
+
+    def _take(self) -> list:
+        with self._lock:
+            while self._idle:
+                entry = self._idle.pop()
+                if time.monotonic() - entry[2] < settings.SMTP_IDLE_SECONDS:
+                    return entry
+                self._close(entry)
+        return self._open()
+
+    def _give(self, entry: list) -> None:
+        if entry[1] >= settings.SMTP_MAX_MESSAGES_PER_CONNECTION:
+            self._close(entry)
+            return
+        entry[2] = time.monotonic()
+        with self._lock:
+            self._idle.append(entry)
+
+    def send(self, messages: List[MIMEMultipart]) -> List[Optional[Exception]]:
+        """
+        Send messages over one pooled connection
+
+        Returns None (sent) or the error for every message, in order.
+        """
+        results = []
+        with self._slots:
+            entry = None
+            for index, message in enumerate(messages):
+                for attempt in (1, 2):
+                    try:
+                        if entry is None:
+                            entry = self._take()
+                        entry[0].send_message(message)
+                        entry[1] += 1
+                        results.append(None)
+                        break
+                    except MESSAGE_ERRORS as e:
+                        results.append(e)
+                        break
+                    except smtplib.SMTPServerDisconnected as e:
+                        # Pooled connection timed out on the server side: reconnect once
+                        entry = None
+                        if attempt == 2:
+                            results.append(e)
+                    except (OSError, smtplib.SMTPException) as e:
+                        # Connection or login failed: the rest of the batch fails too
+                        if entry is not None:
+                            self._close(entry)
+                            entry = None
+                        results.extend([e] * (len(messages) - index))
+                        return results
+            if entry is not None:
+                self._give(entry)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._close(entry)
+
+
+smtp_pool = SMTPConnectionPool(settings.SMTP_POOL_SIZE)
+
+
 # ============================================================================
 # EMAIL SENDING
 # ============================================================================
 
+def build_message(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None
+) -> MIMEMultipart:
+    """MIME message with HTML and optional plain text part"""
+    message = MIMEMultipart('alternative')
+    message['Subject'] = subject
+    message['From'] = f"{EmailConfig.FROM_NAME} <{EmailConfig.FROM_EMAIL}>"
+    message['To'] = to_email
+
+    # Add text version if provided
+    if text_content:
+        text_part = MIMEText(text_content, 'plain', 'utf-8')
+        message.attach(text_part)
+
+    # Add HTML version
+    html_part = MIMEText(html_content, 'html', 'utf-8')
+    message.attach(html_part)
+    return message
+
+
 def send_email(
     to_email: str,
     subject: str,
@@ -44,7 +181,10 @@ def send_email(
     text_content: Optional[str] = None
 ) -> bool:
     """
-    Send an email via SMTP
+    Queue an email for sending
+    
+    The email goes into the outbox and is sent by the email worker
+    (api/email/email_outbox.py), so requests don't wait for SMTP.
     
     Args:
         to_email: Recipient email address
@@ -53,7 +193,7 @@ def send_email(
         text_content: Plain text version (optional)
         
     Returns:
-        True if sent successfully, False otherwise
+        True if queued (or sent directly when the outbox is unavailable), False otherwise
     """
     
     # Check if emails are enabled
@@ -67,36 +207,41 @@ def send_email(
         print(f"   Configure SMTP_USERNAME and SMTP_PASSWORD in config.py")
         return False
     
+    from api.email.email_outbox import queue_emails
+
+    email = {
+        'to_email': to_email,
+        'subject': subject,
+        'html_content': html_content,
+        'text_content': text_content
+    }
     try:
-        # Create message
-        message = MIMEMultipart('alternative')
-        message['Subject'] = subject
-        message['From'] = f"{EmailConfig.FROM_NAME} <{EmailConfig.FROM_EMAIL}>"
-        message['To'] = to_email
-
-        # Add text version if provided
-        if text_content:
-            text_part = MIMEText(text_content, 'plain', 'utf-8')
-            message.attach(text_part)
-
-        # Add HTML version
-        html_part = MIMEText(html_content, 'html', 'utf-8')
-        message.attach(html_part)
-
-        # Connect to SMTP server
-        with smtplib.SMTP(EmailConfig.SMTP_HOST, EmailConfig.SMTP_PORT) as server:
-            # Only use STARTTLS for port 587, not for port 25
-            if EmailConfig.SMTP_PORT == 587:
-                server.starttls()  # Enable TLS for port 587
-            server.login(EmailConfig.SMTP_USERNAME, EmailConfig.SMTP_PASSWORD)
-            server.send_message(message)
+        queue_emails([email])
+        return True
+    except Exception as e:
+        print(f"⚠️  Could not queue email to {to_email}, sending directly: {str(e)}")
+        return send_email_now(**email)
 
+
+def send_email_now(
+    to_email: str,
+    subject: str,
+    html_content: str,
+    text_content: Optional[str] = None
+) -> bool:
+    """
+    Send an email right away over a pooled SMTP connection (blocks)
+    
+    Returns:
+        True if sent successfully, False otherwise
+    """
+    error = smtp_pool.send([build_message(to_email, subject, html_content, text_content)])[0]
+    if error is None:
         print(f"✅ Email sent to {to_email}: {subject}")
         return True
-        
-    except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {str(e)}")
-        return False
+    
+    print(f"❌ Failed to send email to {to_email}: {str(error)}")
+    return False
 
 
 def send_bulk_email(
@@ -108,8 +253,11 @@ def send_bulk_email(
     """
     Send email to multiple recipients
     
+    All emails are queued with one insert; the worker sends them in batches
+    over pooled connections.
+    
     Returns:
-        Dictionary with success/failure counts
+        Dictionary with success/failure counts ('sent' = queued)
     """
     results = {
         'sent': 0,
@@ -117,11 +265,29 @@ def send_bulk_email(
         'total': len(to_emails)
     }
     
-    for email in to_emails:
-        if send_email(email, subject, html_content, text_content):
-            results['sent'] += 1
-        else:
-            results['failed'] += 1
+    if not EmailConfig.SEND_EMAILS or not is_email_configured():
+        for email in to_emails:
+            if send_email(email, subject, html_content, text_content):
+                results['sent'] += 1
+            else:
+                results['failed'] += 1
+        return results
+    
+    from api.email.email_outbox import queue_emails
+
+    try:
+        results['sent'] = queue_emails([
+            {
+                'to_email': email,
+                'subject': subject,
+                'html_content': html_content,
+                'text_content': text_content
+            }
+            for email in to_emails
+        ])
+    except Exception as e:
+        print(f"❌ Could not queue bulk email: {str(e)}")
+    results['failed'] = results['total'] - results['sent']
     
     return results
 
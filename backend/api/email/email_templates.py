@@ -1,6 +1,12 @@
 """
 Email Templates
-HTML email templates for various notifications
+HTML email templates for various notifications (f-string version)
+
+Benchmark reference only - the application doesn't use this module.
+Notifications are rendered from the precompiled Jinja2 templates in
+api/email/templates (see template_engine.py). These functions build the same
+German emails and are kept only as the reference (output and timing) for
+benchmark_email_templates.py. New emails go into the Jinja2 templates.
 """
 
 from typing import Dict, List, Any
@@ -0,0 +1,155 @@
+"""
+Email Template Engine
+Renders notification emails from precompiled Jinja2 templates
+
+Templates live in api/email/templates/<locale>/<name>.html and extend the
+base layout of their locale. All of them are compiled once at import
+(auto_reload is off, so rendering never touches the file system again); a
+render is a call into the compiled template code instead of rebuilding the
+whole HTML string with f-strings.
+
+Locales: "de" (default, the shop language) and "en". A recipient's locale
+comes from WebUser.language_preference; anything unknown ("fr", None) falls
+back to DEFAULT_LOCALE, region suffixes are ignored ("de-AT" -> "de").
+
+render_emails() renders one template for many recipients at once (newsletters,
+batch notifications for send_bulk_email) with the template looked up once per
+locale.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+LOCALES = ("de", "en")
+DEFAULT_LOCALE = "de"
+
+TEMPLATE_NAMES = (
+    "order_confirmation",
+    "payment_receipt",
+    "shipping_notification",
+    "email_verification",
+    "password_reset",
+)
+
+SUBJECTS = {
+    "de": {
+        "order_confirmation": "Bestellbestätigung - Bestellung {order_number}",
+        "payment_receipt": "Zahlungsbestätigung - Bestellung {order_number}",
+        "shipping_notification": "Versandbestätigung - Bestellung {order_number}",
+        "email_verification": "Bitte bestätigen Sie Ihre E-Mail-Adresse - RINOS Bikes",
+        "password_reset": "Passwort zurücksetzen - RINOS Bikes",
+    },
+    "en": {
+        "order_confirmation": "Order confirmation - Order {order_number}",
+        "payment_receipt": "Payment confirmation - Order {order_number}",
+        "shipping_notification": "Shipping confirmation - Order {order_number}",
+        "email_verification": "Please confirm your email address - RINOS Bikes",
+        "password_reset": "Reset your password - RINOS Bikes",
+    },
+}
+
+
+# ============================================================================
+# ENVIRONMENT
+# ============================================================================
+
+def format_money(value) -> str:
+    """1234.5 -> '1,234.50' (same format as the old templates)"""
+    return f"{value:,.2f}"
+
+
+def format_datetime(value, fmt: str = "%d.%m.%Y %H:%M") -> str:
+    return value.strftime(fmt) if value else ""
+
+
+_env = Environment(
+    loader=FileSystemLoader(str(TEMPLATE_DIR)),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    cache_size=-1,  # never evict compiled templates
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+_env.filters["money"] = format_money
+_env.filters["datetime"] = format_datetime
+
+
+def _compile_all() -> dict:
+    """Compile every template (and, through extends, every base layout) once"""
+    return {
+        (locale, name): _env.get_template(f"{locale}/{name}.html")
+        for locale in LOCALES
+        for name in TEMPLATE_NAMES
+    }
+
+
+_templates = _compile_all()
+
+
+# ============================================================================
+# RENDERING
+# ============================================================================
+
+def normalize_locale(locale: Optional[str]) -> str:
+    """'de-AT' -> 'de', unknown or empty -> DEFAULT_LOCALE"""
+    if not locale:
+        return DEFAULT_LOCALE
+    language = locale.replace("_", "-").split("-")[0].lower()
+    return language if language in LOCALES else DEFAULT_LOCALE
+
+
+def get_template(name: str, locale: Optional[str] = None):
+    try:
+        return _templates[(normalize_locale(locale), name)]
+    except KeyError:
+        raise ValueError(f"Unknown email template: {name}")
+
+
+def render_subject(name: str, data: Dict[str, Any], locale: Optional[str] = None) -> str:
+    """Subject line in the recipient's language (locale as in render_email)"""
+    return SUBJECTS[normalize_locale(locale or data.get("locale"))][name].format(**data)
+
+
+def render_email(name: str, data: Dict[str, Any], locale: Optional[str] = None) -> str:
+    """
+    Render one email
+
+    Args:
+        name: Template name (see TEMPLATE_NAMES)
+        data: Template variables (same keys as the email_templates functions)
+        locale: Recipient's language, default data['locale'] or DEFAULT_LOCALE
+
+    Returns:
+        Complete HTML email
+    """
+    return get_template(name, locale or data.get("locale")).render(data)
+
+
+def render_emails(name: str, recipients: Iterable[Dict[str, Any]],
+                  common: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Render one template for many recipients
+
+    Args:
+        name: Template name (see TEMPLATE_NAMES)
+        recipients: Per-recipient variables, each optionally with 'locale'
+        common: Variables shared by all recipients (overridden per recipient)
+
+    Returns:
+        HTML emails in the order of recipients
+    """
+    common = common or {}
+    templates = {}
+    rendered = []
+    for data in recipients:
+        locale = normalize_locale(data.get("locale") or common.get("locale"))
+        template = templates.get(locale)
+        if template is None:
+            template = templates[locale] = get_template(name, locale)
+        rendered.append(template.render({**common, **data}))
+    return rendered
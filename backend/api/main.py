@@ -74,6 +74,94 @@ async def startup_event():
     print("RINOS Bikes API starting up...")
     print(f"CORS Origins: {settings.CORS_ORIGINS}")
 
+    # Sync routes and dependencies (all DB work) run in AnyIO's threadpool;
+    # size it to the DB connection pool so threads don't queue for connections
+    import anyio.to_thread
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    print(f"Threadpool size: {settings.THREADPOOL_SIZE}")
+
+    # Order number counters (utils/order_numbers.py)
+    try:
+        from database.connection import engine
+        from utils.order_numbers import ensure_order_number_counters
+
+        ensure_order_number_counters(engine)
+        print("[OK] Order number counters ready")
+    except Exception as e:
+        print(f"[WARNING] Could not create order number counters: {e}")
+
+    # Order lines and stock reservations (utils/checkout.py)
+    try:
+        from database.connection import engine
+        from utils.checkout import ensure_checkout_tables
+
+        ensure_checkout_tables(engine)
+        print("[OK] Checkout tables ready")
+    except Exception as e:
+        print(f"[WARNING] Could not create checkout tables: {e}")
+
+    # Idempotency-Key responses (api/utils/idempotency.py)
+    try:
+        from database.connection import engine
+        from api.utils.idempotency import ensure_idempotency_table
+
+        ensure_idempotency_table(engine)
+        print("[OK] Idempotency keys ready")
+    except Exception as e:
+        print(f"[WARNING] Could not create idempotency keys table: {e}")
+
+    # Stripe webhook inbox and worker (utils/webhook_inbox.py)
+    try:
+        from database.connection import engine, SessionLocal
+        from utils.webhook_inbox import ensure_webhook_inbox_table, start_webhook_worker
+
+        ensure_webhook_inbox_table(engine)
+        if start_webhook_worker(SessionLocal):
+            print("[OK] Stripe webhook worker started")
+    except Exception as e:
+        print(f"[WARNING] Could not start Stripe webhook worker: {e}")
+
+    # Email outbox and worker (api/email/email_outbox.py)
+    try:
+        from database.connection import engine, SessionLocal
+        from api.email.email_outbox import ensure_email_outbox_table, start_email_worker
+
+        ensure_email_outbox_table(engine)
+        if start_email_worker(SessionLocal):
+            print("[OK] Email worker started")
+    except Exception as e:
+        print(f"[WARNING] Could not start email worker: {e}")
+
+    # Unique keys of the cart upserts (utils/cart_keys.py, migrations/006)
+    try:
+        from database.connection import engine
+        from utils.cart_keys import ensure_cart_unique_keys
+
+        ensure_cart_unique_keys(engine)
+        print("[OK] Cart unique keys ready")
+    except Exception as e:
+        print(f"[WARNING] Could not create cart unique keys: {e}")
+
+    # Guest cart write-behind (utils/cart_store.py)
+    try:
+        from database.connection import SessionLocal
+        from utils.cart_store import start_cart_writer
+
+        if start_cart_writer(SessionLocal):
+            print(f"[OK] Guest cart store: {settings.CART_STORE_URL.split('@')[-1]}")
+    except Exception as e:
+        print(f"[WARNING] Could not start guest cart writer: {e}")
+
+    # Periodic cleanup of expired carts, tokens and sessions (utils/cleanup.py)
+    try:
+        from database.connection import SessionLocal
+        from utils.cleanup import start_cleanup_task
+
+        if start_cleanup_task(SessionLocal):
+            print(f"[OK] Cleanup every {settings.CLEANUP_INTERVAL_MINUTES} minutes")
+    except Exception as e:
+        print(f"[WARNING] Could not start cleanup task: {e}")
+
     # Auto-create pages tables if they don't exist
     try:
         from sqlalchemy import text
@@ -141,3 +229,40 @@ async def startup_event():
 async def shutdown_event():
     """Run on shutdown"""
     print("RINOS Bikes API shutting down...")
+
+    try:
+        from utils.cleanup import stop_cleanup_task
+
+        stop_cleanup_task()
+    except Exception as e:
+        print(f"[WARNING] Could not stop cleanup task: {e}")
+
+    try:
+        from utils.webhook_inbox import stop_webhook_worker
+
+        stop_webhook_worker()
+    except Exception as e:
+        print(f"[WARNING] Could not stop Stripe webhook worker: {e}")
+
+    try:
+        from api.email.email_outbox import stop_email_worker
+
+        stop_email_worker()
+    except Exception as e:
+        print(f"[WARNING] Could not stop email worker: {e}")
+
+    try:
+        from utils.payment_gateway import close_gateway
+
+        await close_gateway()
+    except Exception as e:
+        print(f"[WARNING] Could not close payment gateway: {e}")
+
+    # Write guest carts that are still only in the cart store
+    try:
+        from database.connection import SessionLocal
+        from utils.cart_store import stop_cart_writer
+
+        stop_cart_writer(SessionLocal)
+    except Exception as e:
+        print(f"[WARNING] Could not write guest carts on shutdown: {e}")
@@ -30,6 +30,9 @@ from models.product import Product
 from models.order import WebOrder, Order
 from models.user import WebUser
 from api.utils.auth_dependencies import get_current_user
+from utils.catalog_cache import bump_catalog_version, invalidate_catalog_cache
+from utils.pagination import InvalidCursor, keyset_page, cached_count
+from utils.product_search import product_search
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -49,7 +52,7 @@ def require_admin(current_user: WebUser = Depends(get_current_user)):
 # ============================================================================
 
 @router.get("/stats")
-async def get_admin_stats(
+def get_admin_stats(
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
 ):
@@ -115,7 +118,7 @@ async def get_admin_stats(
 # ============================================================================
 
 @router.get("/products")
-async def get_admin_products(
+def get_admin_products(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
@@ -124,23 +127,18 @@ async def get_admin_products(
     father_only: Optional[bool] = None,
     sort_by: str = Query("articlename", pattern="^(articlename|priceEUR|articlenr|manufacturer)$"),
     sort_order: str = Query("asc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
 ):
-    """Get products list for admin with filters and pagination"""
+    """Get products list for admin with filters and pagination (pass next_cursor as cursor to skip OFFSET)"""
     try:
         query = db.query(Product)
 
-        # Apply filters
+        # Apply filters (full-text / trigram search, see utils/product_search.py)
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Product.articlename.ilike(search_term),
-                    Product.articlenr.ilike(search_term),
-                    Product.manufacturer.ilike(search_term)
-                )
-            )
+            condition, _ = product_search(db, search)
+            query = query.filter(condition)
 
         if manufacturer:
             query = query.filter(Product.manufacturer == manufacturer)
@@ -151,19 +149,21 @@ async def get_admin_products(
         if father_only:
             query = query.filter(Product.isfatherarticle == True)
 
-        # Get total count
-        total = query.count()
+        # Get total count (cached while paging with a cursor)
+        if cursor:
+            total = cached_count(
+                ("admin_products", search, manufacturer, type, father_only), query.count
+            )
+        else:
+            total = query.count()
 
-        # Apply sorting
+        # Apply sorting (productid keeps the order stable for cursors)
         sort_column = getattr(Product, sort_by, Product.articlename)
-        if sort_order == "desc":
-            query = query.order_by(desc(sort_column))
-        else:
-            query = query.order_by(sort_column)
+        sort_keys = [(sort_column, sort_order == "desc"), (Product.productid, sort_order == "desc")]
 
         # Apply pagination
         offset = (page - 1) * page_size
-        products = query.offset(offset).limit(page_size).all()
+        products, next_cursor = keyset_page(query, sort_keys, cursor, page_size, offset=offset)
 
         # Get unique manufacturers and types for filters
         manufacturers = db.query(Product.manufacturer).filter(
@@ -199,16 +199,19 @@ async def get_admin_products(
             "page": page,
             "page_size": page_size,
             "total_pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor,
             "manufacturers": [m[0] for m in manufacturers if m[0]],
             "product_types": [t[0] for t in product_types if t[0]]
         }
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error getting products: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/products/{articlenr}")
-async def get_admin_product(
+def get_admin_product(
     articlenr: str,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -254,7 +257,7 @@ async def get_admin_product(
 
 
 @router.put("/products/{articlenr}")
-async def update_admin_product(
+def update_admin_product(
     articlenr: str,
     data: Dict[str, Any],
     db: Session = Depends(get_db),
@@ -287,7 +290,10 @@ async def update_admin_product(
                     value = Decimal(str(value)) if value else None
                 setattr(product, field, value)
 
+        # Invalidate cached catalog snapshots (all workers) together with the update
+        bump_catalog_version(db)
         db.commit()
+        invalidate_catalog_cache()
         db.refresh(product)
 
         return {"status": "success", "message": "Product updated"}
@@ -299,22 +305,40 @@ async def update_admin_product(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/catalog/invalidate")
+def invalidate_catalog(
+    db: Session = Depends(get_db),
+    admin: WebUser = Depends(require_admin)
+):
+    """Force all workers to reload the catalog snapshot (e.g. after a manual ERP import)"""
+    try:
+        bump_catalog_version(db)
+        db.commit()
+        invalidate_catalog_cache()
+        return {"status": "success", "message": "Catalog cache invalidated"}
+    except Exception as e:
+        db.rollback()
+        print(f"Error invalidating catalog cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================================
 # ORDERS MANAGEMENT
 # ============================================================================
 
 @router.get("/orders")
-async def get_admin_orders(
+def get_admin_orders(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
     status: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
 ):
-    """Get orders list for admin with filters and pagination"""
+    """Get orders list for admin with filters and pagination (pass next_cursor as cursor to skip OFFSET)"""
     try:
         query = db.query(WebOrder)
 
@@ -337,15 +361,18 @@ async def get_admin_orders(
         if date_to:
             query = query.filter(func.date(WebOrder.created_at) <= date_to)
 
-        # Get total count
-        total = query.count()
+        # Get total count (cached while paging with a cursor)
+        if cursor:
+            total = cached_count(("admin_orders", search, status, date_from, date_to), query.count)
+        else:
+            total = query.count()
 
         # Order by most recent first
-        query = query.order_by(desc(WebOrder.created_at))
+        sort_keys = [(WebOrder.created_at, True), (WebOrder.web_order_id, True)]
 
         # Apply pagination
         offset = (page - 1) * page_size
-        orders = query.offset(offset).limit(page_size).all()
+        orders, next_cursor = keyset_page(query, sort_keys, cursor, page_size, offset=offset)
 
         # Build response with customer info
         orders_list = []
@@ -372,15 +399,18 @@ async def get_admin_orders(
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor
         }
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error getting orders: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/orders/{order_id}")
-async def get_admin_order(
+def get_admin_order(
     order_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -480,7 +510,7 @@ async def get_admin_order(
 
 
 @router.put("/orders/{order_id}")
-async def update_admin_order(
+def update_admin_order(
     order_id: int,
     data: Dict[str, Any],
     db: Session = Depends(get_db),
@@ -565,7 +595,7 @@ def save_homepage_content_to_file(content: Dict[str, Any]):
 
 
 @router.get("/homepage")
-async def get_homepage_content(
+def get_homepage_content(
     admin: WebUser = Depends(require_admin)
 ):
     """Get homepage content for editing"""
@@ -573,7 +603,7 @@ async def get_homepage_content(
 
 
 @router.put("/homepage")
-async def update_homepage_content(
+def update_homepage_content(
     data: Dict[str, Any],
     admin: WebUser = Depends(require_admin)
 ):
@@ -591,14 +621,15 @@ async def update_homepage_content(
 # ============================================================================
 
 @router.get("/users")
-async def get_admin_users(
+def get_admin_users(
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin),
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
-    search: str = Query('', min_length=0)
+    search: str = Query('', min_length=0),
+    cursor: Optional[str] = None
 ):
-    """Get list of all users"""
+    """Get list of all users (pass next_cursor as cursor to skip OFFSET)"""
     try:
         query = db.query(WebUser)
         
@@ -612,12 +643,17 @@ async def get_admin_users(
                 )
             )
         
-        # Count total
-        total = query.count()
+        # Count total (cached while paging with a cursor)
+        if cursor:
+            total = cached_count(("admin_users", search), query.count)
+        else:
+            total = query.count()
         
-        # Pagination
+        # Pagination, newest first
         skip = (page - 1) * page_size
-        users = query.order_by(desc(WebUser.created_at)).offset(skip).limit(page_size).all()
+        users, next_cursor = keyset_page(
+            query, [(WebUser.created_at, True), (WebUser.user_id, True)], cursor, page_size, offset=skip
+        )
         
         return {
             "users": [
@@ -639,15 +675,18 @@ async def get_admin_users(
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": (total + page_size - 1) // page_size
+            "total_pages": (total + page_size - 1) // page_size,
+            "next_cursor": next_cursor
         }
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error getting users: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/users/{user_id}")
-async def get_admin_user(
+def get_admin_user(
     user_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -681,7 +720,7 @@ async def get_admin_user(
 
 
 @router.put("/users/{user_id}")
-async def update_admin_user(
+def update_admin_user(
     user_id: int,
     data: Dict[str, Any],
     db: Session = Depends(get_db),
@@ -717,7 +756,7 @@ async def update_admin_user(
 # ============================================================================
 
 @router.post("/migrate-user-table")
-async def migrate_user_table(authorization: str = Header(None)):
+def migrate_user_table(authorization: str = Header(None)):
     """
     Run migration to update web_users table
     Requires admin authorization via token
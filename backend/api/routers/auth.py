@@ -4,7 +4,7 @@ Location: api/routers/auth.py
 
 Handles user registration, login, logout, and profile management
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import datetime
@@ -14,7 +14,8 @@ from api.email.email_notifications import (
     send_password_reset_from_user
 )
 
-from database.connection import get_db
+from database.connection import get_db, SessionLocal
+from api.email.email_outbox import drain_email_outbox
 from models import WebUser  # ← FIXED: Import from models package
 from api.schemas.auth_schemas import (
     UserRegister,
@@ -45,8 +46,9 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 # ============================================================================
 
 @router.post("/register", response_model=LoginResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(
+def register_user(
     user_data: UserRegister,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -99,6 +101,7 @@ async def register_user(
         email_sent = send_email_verification_from_user(new_user, verification_token)
         
         if email_sent:
+            background_tasks.add_task(drain_email_outbox, SessionLocal)
             print(f"✅ Verification email sent to {new_user.email}")
         else:
             print(f"⚠️  Verification email failed for {new_user.email}")
@@ -117,7 +120,7 @@ async def register_user(
 # ============================================================================
 
 @router.post("/login", response_model=LoginResponse)
-async def login(
+def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
@@ -163,7 +166,7 @@ async def login(
 
 
 @router.post("/login/json", response_model=LoginResponse)
-async def login_json(
+def login_json(
     login_data: UserLogin,
     db: Session = Depends(get_db)
 ):
@@ -213,7 +216,7 @@ async def login_json(
 # ============================================================================
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(
+def get_current_user_info(
     current_user: WebUser = Depends(get_current_user)
 ):
     """
@@ -229,7 +232,7 @@ async def get_current_user_info(
 # ============================================================================
 
 @router.post("/logout", response_model=MessageResponse)
-async def logout(
+def logout(
     current_user: WebUser = Depends(get_current_user)
 ):
     """
@@ -249,7 +252,7 @@ async def logout(
 # ============================================================================
 
 @router.post("/verify-email", response_model=MessageResponse)
-async def verify_email(
+def verify_email(
     verification: EmailVerification,
     db: Session = Depends(get_db)
 ):
@@ -305,7 +308,8 @@ async def verify_email(
 
 
 @router.post("/resend-verification", response_model=MessageResponse)
-async def resend_verification_email(
+def resend_verification_email(
+    background_tasks: BackgroundTasks,
     current_user: WebUser = Depends(get_current_user)
 ):
     """
@@ -332,6 +336,7 @@ async def resend_verification_email(
         email_sent = send_email_verification_from_user(current_user, verification_token)
         
         if email_sent:
+            background_tasks.add_task(drain_email_outbox, SessionLocal)
             print(f"✅ Verification email resent to {current_user.email}")
         else:
             print(f"⚠️  Verification email failed for {current_user.email}")
@@ -349,8 +354,9 @@ async def resend_verification_email(
 # ============================================================================
 
 @router.post("/password-reset", response_model=MessageResponse)
-async def request_password_reset(
+def request_password_reset(
     reset_request: PasswordReset,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """
@@ -373,6 +379,7 @@ async def request_password_reset(
             email_sent = send_password_reset_from_user(user, reset_token)
             
             if email_sent:
+                background_tasks.add_task(drain_email_outbox, SessionLocal)
                 print(f"✅ Password reset email sent to {user.email}")
             else:
                 print(f"⚠️  Password reset email failed for {user.email}")
@@ -387,7 +394,7 @@ async def request_password_reset(
 
 
 @router.post("/password-reset/confirm", response_model=MessageResponse)
-async def confirm_password_reset(
+def confirm_password_reset(
     reset_data: PasswordResetConfirm,
     db: Session = Depends(get_db)
 ):
@@ -442,7 +449,7 @@ async def confirm_password_reset(
 # ============================================================================
 
 @router.patch("/me", response_model=UserResponse)
-async def update_profile(
+def update_profile(
     first_name: Optional[str] = None,
     last_name: Optional[str] = None,
     phone: Optional[str] = None,
@@ -475,7 +482,7 @@ async def update_profile(
 # ============================================================================
 
 @router.delete("/me", response_model=MessageResponse)
-async def delete_account(
+def delete_account(
     current_user: WebUser = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -6,9 +6,11 @@ Handles cart operations for both authenticated and guest users
 Supports localized pricing with country-based VAT conversion
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session, noload
 from typing import Optional
 from datetime import datetime
+from decimal import Decimal
 import uuid
 
 from database.connection import get_db
@@ -24,7 +26,10 @@ from api.schemas.cart_schemas import (
     MessageResponse
 )
 from api.utils.auth_dependencies import get_current_user, get_optional_user
-from utils.pricing import convert_price_by_country, get_vat_rate, validate_country_code
+from utils.cart_store import GuestCart, get_cart_store
+from utils.catalog_cache import get_catalog_snapshot
+from utils.pricing import convert_prices_by_country, get_vat_rate, validate_country_code
+from utils.stock import get_stock
 
 router = APIRouter(prefix="/cart", tags=["Shopping Cart"])
 
@@ -33,6 +38,36 @@ router = APIRouter(prefix="/cart", tags=["Shopping Cart"])
 # HELPER FUNCTIONS
 # ============================================================================
 
+def upsert_cart(
+    db: Session,
+    user_id: Optional[int] = None,
+    guest_session_id: Optional[str] = None
+) -> ShoppingCart:
+    """
+    Insert the cart of a user / guest session, or touch updated_at if it exists
+    
+    One INSERT ... ON CONFLICT ... RETURNING inside the caller's transaction
+    (no commit). Concurrent requests for the same session get the same cart.
+    """
+    conflict_column = "user_id" if user_id else "guest_session_id"
+    statement = text(f"""
+        INSERT INTO shopping_carts (user_id, guest_session_id, shop_id, created_at, updated_at)
+        VALUES (:user_id, :guest_session_id, :shop_id, :now, :now)
+        ON CONFLICT ({conflict_column}) DO UPDATE
+        SET updated_at = EXCLUDED.updated_at
+        RETURNING cart_id, user_id, guest_session_id, shop_id, created_at, updated_at
+    """)
+    return db.scalars(
+        select(ShoppingCart).from_statement(statement),
+        {
+            "user_id": user_id,
+            "guest_session_id": guest_session_id if not user_id else None,
+            "shop_id": 1,  # Identifies this cart as belonging to rinosbikeat shop
+            "now": datetime.utcnow()
+        }
+    ).one()
+
+
 def get_or_create_cart(
     db: Session,
     user_id: Optional[int] = None,
@@ -63,18 +98,10 @@ def get_or_create_cart(
         guest_session_id = str(uuid.uuid4())
         cart = None
     
-    # Create cart if doesn't exist
+    # Create cart if doesn't exist (upsert, in case a parallel request just created it)
     if not cart:
-        cart = ShoppingCart(
-            user_id=user_id,
-            guest_session_id=guest_session_id if not user_id else None,
-            shop_id=1,  # Identifies this cart as belonging to rinosbikeat shop
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        db.add(cart)
+        cart = upsert_cart(db, user_id, guest_session_id)
         db.commit()
-        db.refresh(cart)
     
     return cart
 
@@ -133,46 +160,114 @@ def build_cart_response(cart: ShoppingCart, db: Session, country: str = "AT") ->
     Returns:
         CartResponse with all cart details
     """
-    # Get cart items
-    cart_items = db.query(CartItem).filter(
+    # Get cart items with their products in one query
+    rows = db.query(CartItem, Product).outerjoin(
+        Product, Product.articlenr == CartItem.articlenr
+    ).options(
+        noload(Product.categories)
+    ).filter(
         CartItem.cart_id == cart.cart_id
-    ).all()
+    ).order_by(CartItem.cart_item_id).all()
+    
+    cart_items = [item for item, _ in rows]
+    
+    # Prices of the target country from the catalog snapshot's price table;
+    # products newer than the snapshot are converted here
+    catalog = get_catalog_snapshot(db)
+    with_product = [(item, product) for item, product in rows if product]
+    localized_prices = [
+        catalog.localized_price(product.productid, country)
+        or convert_prices_by_country([product.priceEUR], country)[0]
+        for _, product in with_product
+    ]
+    
+    # Stock of all lines in one lookup
+    stock = get_stock(db, [product.articlenr for _, product in with_product])
+    
+    products = [
+        CartItemProduct(
+            articlenr=product.articlenr,
+            articlename=product.articlename,
+            price=float(price),
+            primary_image=product.get_primary_image(),
+            manufacturer=product.manufacturer,
+            colour=product.colour,
+            size=product.size,
+            in_stock=stock[product.articlenr] > 0
+        )
+        for (_, product), price in zip(with_product, localized_prices)
+    ]
+    
+    return cart_response(
+        cart, [item for item, _ in with_product], products, cart_items, country
+    )
+
+
+def build_guest_cart_response(cart: GuestCart, db: Session, country: str = "AT") -> CartResponse:
+    """
+    Build cart response for a guest cart from the cart store
+    
+    Product data comes from the catalog snapshot and stock from the cached
+    stock service, so usually no queries are needed.
+    """
+    catalog = get_catalog_snapshot(db)
+    
+    with_product = [
+        (item, catalog.get_product(item.articlenr))
+        for item in cart.items
+        if catalog.get_product(item.articlenr)
+    ]
+    localized_prices = [
+        catalog.localized_price(record["productid"], country) or Decimal("0.00")
+        for _, record in with_product
+    ]
+    stock = get_stock(db, [record["articlenr"] for _, record in with_product])
+    
+    products = [
+        CartItemProduct(
+            articlenr=record["articlenr"],
+            articlename=record["articlename"],
+            price=float(price),
+            primary_image=record["primary_image"],
+            manufacturer=record["manufacturer"],
+            colour=record["colour"],
+            size=record["size"],
+            in_stock=stock[record["articlenr"]] > 0
+        )
+        for (_, record), price in zip(with_product, localized_prices)
+    ]
+    
+    return cart_response(
+        cart, [item for item, _ in with_product], products, cart.items, country
+    )
+
+
+def cart_response(cart, items_with_product: list, products: list, cart_items: list,
+                  country: str = "AT") -> CartResponse:
+    """
+    Assemble CartResponse (shared by database and guest store carts)
     
+    Args:
+        cart: ShoppingCart or GuestCart
+        items_with_product: Cart lines whose product exists
+        products: CartItemProduct per line in items_with_product (localized price)
+        cart_items: All cart lines (for the summary)
+        country: Country code for VAT calculation
+    """
     # Build item responses
     items = []
-    for item in cart_items:
-        # Get product details
-        product = db.query(Product).filter(
-            Product.articlenr == item.articlenr
-        ).first()
+    for item, product_info in zip(items_with_product, products):
+        localized_price = product_info.price
         
-        if product:
-            # Convert product price to target country
-            localized_price = float(convert_price_by_country(
-                float(product.priceEUR) if product.priceEUR else 0.0,
-                country
-            ))
-            
-            product_info = CartItemProduct(
-                articlenr=product.articlenr,
-                articlename=product.articlename,
-                price=localized_price,
-                primary_image=product.get_primary_image(),
-                manufacturer=product.manufacturer,
-                colour=product.colour,
-                size=product.size,
-                in_stock=True  # TODO: Check actual inventory
-            )
-            
-            items.append(CartItemResponse(
-                cart_item_id=item.cart_item_id,
-                cart_id=item.cart_id,
-                product=product_info,
-                quantity=item.quantity,
-                price_at_addition=localized_price,
-                subtotal=localized_price * item.quantity,
-                added_at=item.added_at.isoformat() if item.added_at else datetime.utcnow().isoformat()
-            ))
+        items.append(CartItemResponse(
+            cart_item_id=item.cart_item_id,
+            cart_id=item.cart_id,
+            product=product_info,
+            quantity=item.quantity,
+            price_at_addition=localized_price,
+            subtotal=localized_price * item.quantity,
+            added_at=item.added_at.isoformat() if item.added_at else datetime.utcnow().isoformat()
+        ))
     
     # Calculate summary with country VAT
     summary = calculate_cart_summary(cart_items, country)
@@ -193,7 +288,7 @@ def build_cart_response(cart: ShoppingCart, db: Session, country: str = "AT") ->
 # ============================================================================
 
 @router.post("/add", response_model=CartResponse)
-async def add_to_cart(
+def add_to_cart(
     request: AddToCartRequest,
     current_user: Optional[WebUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -207,53 +302,64 @@ async def add_to_cart(
     
     Works for both authenticated and guest users.
     Returns complete cart with updated items and totals.
-    """
-    # Verify product exists
-    product = db.query(Product).filter(
-        Product.articlenr == request.articlenr
-    ).first()
     
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Product {request.articlenr} not found"
-        )
-    
-    # Get or create cart
+    Cart and line are upserted in one transaction (no read-modify-write),
+    so double clicks add up instead of racing.
+    """
     user_id = current_user.user_id if current_user else None
     guest_session_id = request.guest_session_id if not current_user else None
+    if not user_id and not guest_session_id:
+        # Create new guest session
+        guest_session_id = str(uuid.uuid4())
     
-    cart = get_or_create_cart(db, user_id, guest_session_id)
-    
-    # Check if item already in cart
-    existing_item = db.query(CartItem).filter(
-        CartItem.cart_id == cart.cart_id,
-        CartItem.articlenr == request.articlenr
-    ).first()
-    
-    if existing_item:
-        # Update quantity
-        existing_item.quantity += request.quantity
-        if existing_item.quantity > 100:
-            existing_item.quantity = 100  # Max quantity limit
-    else:
-        # Add new item
-        new_item = CartItem(
-            cart_id=cart.cart_id,
-            product_id=product.productid,
+    # Guest carts live in the cart store (written to the database behind)
+    store = get_cart_store()
+    if store and not user_id:
+        catalog = get_catalog_snapshot(db)
+        product = catalog.get_product(request.articlenr)
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product {request.articlenr} not found"
+            )
+        cart = store.add_item(
+            db, guest_session_id,
+            product_id=product["productid"],
             articlenr=request.articlenr,
             quantity=request.quantity,
-            shop_id=1,  # Identifies this item as belonging to rinosbikeat shop
-            price_at_addition=float(product.priceEUR) if product.priceEUR else 0.0,
-            added_at=datetime.utcnow()
+            price=catalog.raw_prices.get(product["productid"])
+        )
+        return build_guest_cart_response(cart, db)
+    
+    # Get or create cart (also bumps updated_at)
+    cart = upsert_cart(db, user_id, guest_session_id)
+    
+    # Add the line or increase its quantity (max 100). Selecting from productdata
+    # means nothing is inserted for unknown articles.
+    added = db.execute(text("""
+        INSERT INTO cart_items (cart_id, product_id, articlenr, quantity, shop_id, price_at_addition, added_at)
+        SELECT :cart_id, productid, articlenr, :quantity, :shop_id, COALESCE("priceEUR", 0), :now
+        FROM productdata
+        WHERE articlenr = :articlenr
+        ON CONFLICT (cart_id, articlenr) DO UPDATE
+        SET quantity = LEAST(cart_items.quantity + EXCLUDED.quantity, 100)
+        RETURNING cart_item_id
+    """), {
+        "cart_id": cart.cart_id,
+        "articlenr": request.articlenr,
+        "quantity": request.quantity,
+        "shop_id": 1,  # Identifies this item as belonging to rinosbikeat shop
+        "now": datetime.utcnow()
+    }).first()
+    
+    if not added:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product {request.articlenr} not found"
         )
-        db.add(new_item)
-    
-    # Update cart timestamp
-    cart.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(cart)
     
     # Return complete cart
     return build_cart_response(cart, db)
@@ -264,7 +370,7 @@ async def add_to_cart(
 # ============================================================================
 
 @router.get("/", response_model=CartResponse)
-async def view_cart(
+def view_cart(
     guest_session_id: Optional[str] = None,
     country: str = "AT",
     current_user: Optional[WebUser] = Depends(get_optional_user),
@@ -295,6 +401,10 @@ async def view_cart(
             detail="Either authentication or guest_session_id required"
         )
     
+    store = get_cart_store()
+    if store and not user_id:
+        return build_guest_cart_response(store.get(db, guest_session_id), db, country)
+    
     cart = get_or_create_cart(db, user_id, guest_session_id)
     
     return build_cart_response(cart, db, country)
@@ -305,7 +415,7 @@ async def view_cart(
 # ============================================================================
 
 @router.put("/items/{cart_item_id}", response_model=CartResponse)
-async def update_cart_item(
+def update_cart_item(
     cart_item_id: int,
     request: UpdateCartItemRequest,
     current_user: Optional[WebUser] = Depends(get_optional_user),
@@ -319,6 +429,18 @@ async def update_cart_item(
     
     Set quantity to 0 to remove the item from cart.
     """
+    # Lines of hot guest carts are changed in the cart store
+    store = get_cart_store()
+    guest_session_id = store.find_session(cart_item_id) if store and not current_user else None
+    if guest_session_id:
+        cart = store.set_quantity(db, guest_session_id, cart_item_id, request.quantity)
+        if not cart:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cart item not found"
+            )
+        return build_guest_cart_response(cart, db)
+    
     # Get cart item
     cart_item = db.query(CartItem).filter(
         CartItem.cart_item_id == cart_item_id
@@ -365,7 +487,7 @@ async def update_cart_item(
 # ============================================================================
 
 @router.delete("/items/{cart_item_id}", response_model=CartResponse)
-async def remove_cart_item(
+def remove_cart_item(
     cart_item_id: int,
     current_user: Optional[WebUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -375,6 +497,18 @@ async def remove_cart_item(
     
     - **cart_item_id**: ID of cart item to remove
     """
+    # Lines of hot guest carts are removed in the cart store
+    store = get_cart_store()
+    guest_session_id = store.find_session(cart_item_id) if store and not current_user else None
+    if guest_session_id:
+        cart = store.set_quantity(db, guest_session_id, cart_item_id, 0)
+        if not cart:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cart item not found"
+            )
+        return build_guest_cart_response(cart, db)
+    
     # Get cart item
     cart_item = db.query(CartItem).filter(
         CartItem.cart_item_id == cart_item_id
@@ -414,7 +548,7 @@ async def remove_cart_item(
 # ============================================================================
 
 @router.delete("/", response_model=MessageResponse)
-async def clear_cart(
+def clear_cart(
     guest_session_id: Optional[str] = None,
     current_user: Optional[WebUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -433,6 +567,19 @@ async def clear_cart(
             detail="Either authentication or guest_session_id required"
         )
     
+    store = get_cart_store()
+    if store and not user_id:
+        if not store.get(db, guest_session_id, create=False):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Cart not found"
+            )
+        store.clear(db, guest_session_id)
+        return MessageResponse(
+            message="Cart cleared successfully",
+            detail="All items have been removed from your cart"
+        )
+    
     # Find cart
     if user_id:
         cart = db.query(ShoppingCart).filter(
@@ -468,7 +615,7 @@ async def clear_cart(
 # ============================================================================
 
 @router.post("/merge", response_model=CartResponse)
-async def merge_carts(
+def merge_carts(
     request: MergeCartRequest,
     current_user: WebUser = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -480,11 +627,21 @@ async def merge_carts(
     
     Requires authentication. Merges items from guest cart into user's cart.
     Handles duplicate products by combining quantities.
+    
+    One transaction with set-based statements: the guest cart row is locked,
+    all lines are copied with INSERT ... SELECT ... ON CONFLICT, then the guest
+    cart is deleted. A second merge of the same guest cart (other tab) waits
+    for the lock and then finds no guest cart.
     """
-    # Get guest cart
+    # Write the hot guest cart to the database first, merging reads it from there
+    store = get_cart_store()
+    if store:
+        store.flush(db, request.guest_session_id)
+    
+    # Get and lock guest cart
     guest_cart = db.query(ShoppingCart).filter(
         ShoppingCart.guest_session_id == request.guest_session_id
-    ).first()
+    ).with_for_update().first()
     
     if not guest_cart:
         raise HTTPException(
@@ -492,39 +649,28 @@ async def merge_carts(
             detail="Guest cart not found"
         )
     
-    # Get or create user cart
-    user_cart = get_or_create_cart(db, user_id=current_user.user_id)
+    # Get or create user cart (also bumps updated_at)
+    user_cart = upsert_cart(db, user_id=current_user.user_id)
     
-    # Get items from guest cart
-    guest_items = db.query(CartItem).filter(
-        CartItem.cart_id == guest_cart.cart_id
-    ).all()
-    
-    # Merge items
-    for guest_item in guest_items:
-        # Check if user already has this product
-        existing_item = db.query(CartItem).filter(
-            CartItem.cart_id == user_cart.cart_id,
-            CartItem.articlenr == guest_item.articlenr
-        ).first()
-        
-        if existing_item:
-            # Combine quantities
-            existing_item.quantity += guest_item.quantity
-            if existing_item.quantity > 100:
-                existing_item.quantity = 100
-        else:
-            # Move item to user cart
-            guest_item.cart_id = user_cart.cart_id
+    # Move all lines, combining quantities of products the user already has (max 100)
+    db.execute(text("""
+        INSERT INTO cart_items (cart_id, product_id, articlenr, quantity, shop_id, price_at_addition, added_at)
+        SELECT :user_cart_id, product_id, articlenr, LEAST(quantity, 100), shop_id, price_at_addition, added_at
+        FROM cart_items
+        WHERE cart_id = :guest_cart_id
+        ON CONFLICT (cart_id, articlenr) DO UPDATE
+        SET quantity = LEAST(cart_items.quantity + EXCLUDED.quantity, 100)
+    """), {"user_cart_id": user_cart.cart_id, "guest_cart_id": guest_cart.cart_id})
     
     # Delete guest cart
-    db.delete(guest_cart)
-    
-    # Update user cart timestamp
-    user_cart.updated_at = datetime.utcnow()
+    db.execute(text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {"cart_id": guest_cart.cart_id})
+    db.execute(text("DELETE FROM shopping_carts WHERE cart_id = :cart_id"), {"cart_id": guest_cart.cart_id})
     
     db.commit()
     
+    if store:
+        store.drop(request.guest_session_id)
+    
     return build_cart_response(user_cart, db)
 
 
@@ -533,7 +679,7 @@ async def merge_carts(
 # ============================================================================
 
 @router.get("/count")
-async def get_cart_count(
+def get_cart_count(
     guest_session_id: Optional[str] = None,
     current_user: Optional[WebUser] = Depends(get_optional_user),
     db: Session = Depends(get_db)
@@ -551,6 +697,16 @@ async def get_cart_count(
     if not user_id and not guest_session_id:
         return {"count": 0}
     
+    store = get_cart_store()
+    if store and not user_id:
+        guest_cart = store.get(db, guest_session_id, create=False)
+        if not guest_cart:
+            return {"count": 0}
+        return {
+            "count": sum(item.quantity for item in guest_cart.items),
+            "unique_items": len(guest_cart.items)
+        }
+    
     # Find cart
     if user_id:
         cart = db.query(ShoppingCart).filter(
@@ -10,6 +10,7 @@ from typing import Optional
 from database.connection import get_db
 from models.order import Order, OrderDetail, DeliveryOrder
 from models.customer import Customer
+from utils.pagination import InvalidCursor, keyset_page
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
@@ -19,6 +20,7 @@ def get_orders(
     skip: int = 0,
     limit: int = 20,
     customer_id: Optional[int] = None,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -26,6 +28,7 @@ def get_orders(
     - skip: Number to skip (pagination)
     - limit: Max orders to return (max 100)
     - customer_id: Filter by customer ID
+    - cursor: next_cursor of the previous page (replaces skip)
     """
     try:
         query = db.query(Order)
@@ -34,11 +37,10 @@ def get_orders(
         if customer_id:
             query = query.filter(Order.customer == customer_id)
         
-        # Order by newest first
-        query = query.order_by(Order.orderdataid.desc())
-        
-        # Get orders with pagination
-        orders = query.offset(skip).limit(min(limit, 100)).all()
+        # Get orders with pagination, newest first
+        orders, next_cursor = keyset_page(
+            query, [(Order.orderdataid, True)], cursor, min(limit, 100), offset=skip
+        )
         
         # Convert to dict with customer info
         orders_list = []
@@ -58,9 +60,12 @@ def get_orders(
         return {
             "status": "success",
             "count": len(orders_list),
+            "next_cursor": next_cursor,
             "orders": orders_list
         }
     
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error in get_orders: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -79,7 +79,7 @@ def require_admin(current_user: WebUser = Depends(get_current_user)):
 # ============================================================================
 
 @router.get("/public/menu")
-async def get_menu_pages(db: Session = Depends(get_db)):
+def get_menu_pages(db: Session = Depends(get_db)):
     """
     Get all published pages that should appear in the header menu.
     Public endpoint - no authentication required.
@@ -123,7 +123,7 @@ async def get_menu_pages(db: Session = Depends(get_db)):
 
 
 @router.get("/public/{slug}")
-async def get_public_page(slug: str, db: Session = Depends(get_db)):
+def get_public_page(slug: str, db: Session = Depends(get_db)):
     """
     Get a published page by slug with all its blocks.
     Public endpoint - no authentication required.
@@ -163,7 +163,7 @@ async def get_public_page(slug: str, db: Session = Depends(get_db)):
 # ============================================================================
 
 @router.get("")
-async def get_pages(
+def get_pages(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
@@ -204,7 +204,7 @@ async def get_pages(
 
 
 @router.get("/{page_id}")
-async def get_page(
+def get_page(
     page_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -225,7 +225,7 @@ async def get_page(
 
 
 @router.post("")
-async def create_page(
+def create_page(
     data: PageCreate,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -281,7 +281,7 @@ async def create_page(
 
 
 @router.put("/{page_id}")
-async def update_page(
+def update_page(
     page_id: int,
     data: PageUpdate,
     db: Session = Depends(get_db),
@@ -330,7 +330,7 @@ async def update_page(
 
 
 @router.delete("/{page_id}")
-async def delete_page(
+def delete_page(
     page_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -359,7 +359,7 @@ async def delete_page(
 # ============================================================================
 
 @router.post("/{page_id}/blocks")
-async def add_block(
+def add_block(
     page_id: int,
     data: BlockCreate,
     db: Session = Depends(get_db),
@@ -402,7 +402,7 @@ async def add_block(
 
 
 @router.put("/{page_id}/blocks/{block_id}")
-async def update_block(
+def update_block(
     page_id: int,
     block_id: int,
     data: BlockUpdate,
@@ -446,7 +446,7 @@ async def update_block(
 
 
 @router.delete("/{page_id}/blocks/{block_id}")
-async def delete_block(
+def delete_block(
     page_id: int,
     block_id: int,
     db: Session = Depends(get_db),
@@ -475,7 +475,7 @@ async def delete_block(
 
 
 @router.post("/{page_id}/blocks/reorder")
-async def reorder_blocks(
+def reorder_blocks(
     page_id: int,
     data: BlockReorder,
     db: Session = Depends(get_db),
@@ -514,7 +514,7 @@ async def reorder_blocks(
 # ============================================================================
 
 @router.post("/{page_id}/publish")
-async def publish_page(
+def publish_page(
     page_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
@@ -541,7 +541,7 @@ async def publish_page(
 
 
 @router.post("/{page_id}/unpublish")
-async def unpublish_page(
+def unpublish_page(
     page_id: int,
     db: Session = Depends(get_db),
     admin: WebUser = Depends(require_admin)
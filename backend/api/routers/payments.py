@@ -3,15 +3,15 @@ Payment API Router
 Handles Stripe payment processing for orders
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
 import stripe
-from api.email.email_notifications import send_payment_receipt_from_payment
 
-from database.connection import get_db
+from database.connection import get_db, SessionLocal
 from models import WebOrder, StripePaymentIntent
 from api.schemas.payment_schemas import (
     PaymentIntentCreate,
@@ -23,8 +23,14 @@ from api.schemas.payment_schemas import (
     PaymentMethodsResponse
 )
 from api.auth.dependencies import get_current_user_optional
+from api.utils.idempotency import run_idempotent_async, REPLAYED_HEADER
 from models import WebUser
 from config import settings  # ← Import settings from config
+from utils.checkout import release_reservations
+from utils.webhook_inbox import store_event, drain_webhook_events
+from api.email.email_outbox import drain_email_outbox
+from utils import payment_status
+from utils.payment_gateway import get_gateway, PaymentGatewayError, PaymentGatewayUnavailable
 
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
@@ -35,11 +41,14 @@ router = APIRouter(prefix="/payments", tags=["Payments"])
 # ============================================================================
 
 # Load Stripe API key from config file
+# (API calls go through utils/payment_gateway.py; the stripe library verifies webhooks)
 stripe.api_key = settings.STRIPE_SECRET_KEY
 STRIPE_WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET.strip() if settings.STRIPE_WEBHOOK_SECRET else ""
 
 # Check if Stripe is configured
-if not stripe.api_key or stripe.api_key == "sk_test_YOUR_ACTUAL_KEY_HERE":
+if settings.PAYMENT_GATEWAY == "fake":
+    print("[WARNING] PAYMENT_GATEWAY=fake - payments are simulated")
+elif not stripe.api_key or stripe.api_key == "sk_test_YOUR_ACTUAL_KEY_HERE":
     print("[WARNING] STRIPE_SECRET_KEY not set in config.py")
 else:
     print(f"[OK] Stripe configured with key: {stripe.api_key[:12]}...")  # Show first 12 chars only
@@ -52,6 +61,8 @@ else:
 @router.post("/create-payment-intent", response_model=PaymentIntentResponse)
 async def create_payment_intent(
     payment_data: PaymentIntentCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: Optional[WebUser] = Depends(get_current_user_optional)
 ):
@@ -62,11 +73,38 @@ async def create_payment_intent(
     - Creates Stripe Checkout Session
     - Stores payment intent in database
     - Returns session ID for frontend redirect
+
+    With an Idempotency-Key header, repeats return the first session instead
+    of calling Stripe again (api/utils/idempotency.py).
     """
+    body, replayed = await run_idempotent_async(
+        db, "payments/create-payment-intent", idempotency_key, payment_data,
+        lambda: create_checkout_session(payment_data, db, idempotency_key)
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return body
+
+
+def gateway_http_error(e: PaymentGatewayError) -> HTTPException:
+    """HTTP error for a failed gateway call"""
+    if isinstance(e, PaymentGatewayUnavailable):
+        return HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Payment provider unavailable: {str(e)}"
+        )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Stripe error: {str(e)}"
+    )
+
+
+def load_order_for_payment(db: Session, order_id: int) -> dict:
+    """Order data for a new Checkout Session (blocking, runs in the threadpool)"""
     
     # Get order
     order = db.query(WebOrder).filter(
-        WebOrder.web_order_id == payment_data.order_id
+        WebOrder.web_order_id == order_id
     ).first()
     
     if not order:
@@ -86,85 +124,117 @@ async def create_payment_intent(
             detail="Order already paid or payment in progress"
         )
     
+    order_data = {
+        "web_order_id": order.web_order_id,
+        "ordernr": order.ordernr,
+        "orderamount": order.orderamount,
+        "currency": order.currency,
+    }
+    # The session is created without holding the connection
+    db.rollback()
+    return order_data
+
+
+def store_checkout_session(db: Session, order_data: dict, checkout_session: dict) -> None:
+    """Record the new Checkout Session on the order (blocking, runs in the threadpool)"""
+    
+    order = db.query(WebOrder).filter(
+        WebOrder.web_order_id == order_data["web_order_id"]
+    ).first()
+    existing_payment = db.query(StripePaymentIntent).filter(
+        StripePaymentIntent.web_order_id == order.web_order_id
+    ).first()
+    
+    # Store in database
+    if existing_payment:
+        # Update existing
+        existing_payment.stripe_payment_intent_id = checkout_session["id"]
+        existing_payment.amount = order.orderamount
+        existing_payment.currency = order.currency
+        existing_payment.status = checkout_session["status"]
+        existing_payment.updated_at = datetime.now()
+    else:
+        # Create new
+        db.add(StripePaymentIntent(
+            web_order_id=order.web_order_id,
+            stripe_payment_intent_id=checkout_session["id"],
+            amount=order.orderamount,
+            currency=order.currency,
+            status=checkout_session["status"],
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        ))
+    
+    # Update order payment status and store payment_intent_id for webhook matching
+    order.payment_status = "pending"
+    # Store the payment_intent_id from the checkout session (will be available after payment)
+    order.payment_intent_id = checkout_session.get('payment_intent')
+    
+    db.commit()
+
+
+async def create_checkout_session(payment_data: PaymentIntentCreate, db: Session,
+                                  idempotency_key: Optional[str] = None) -> PaymentIntentResponse:
+    """
+    Create the Stripe Checkout Session (called by create_payment_intent)
+
+    Database work runs in the threadpool; the Stripe call is awaited through
+    the payment gateway (utils/payment_gateway.py), so no thread waits for it.
+    """
+    
+    order = await run_in_threadpool(load_order_for_payment, db, payment_data.order_id)
+    
     # Convert amount to cents (Stripe uses smallest currency unit)
-    amount_cents = int(float(order.orderamount) * 100)
+    amount_cents = int(float(order["orderamount"]) * 100)
     
     try:
         # Create Stripe Checkout Session (not just PaymentIntent)
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": order.currency.lower(),
-                        "product_data": {
-                            "name": f"Order {order.ordernr}",
-                            "description": f"Order {order.ordernr} - RINOS Bikes",
+        checkout_session = await get_gateway().create_checkout_session(
+            {
+                "payment_method_types": ["card"],
+                "line_items": [
+                    {
+                        "price_data": {
+                            "currency": order["currency"].lower(),
+                            "product_data": {
+                                "name": f"Order {order['ordernr']}",
+                                "description": f"Order {order['ordernr']} - RINOS Bikes",
+                            },
+                            "unit_amount": amount_cents,
                         },
-                        "unit_amount": amount_cents,
-                    },
-                    "quantity": 1,
-                }
-            ],
-            mode="payment",
-            success_url=f"{payment_data.return_url}?session_id={{CHECKOUT_SESSION_ID}}",
-            cancel_url=f"{payment_data.return_url.split('/order')[0]}/checkout",
-            metadata={
-                "order_id": order.web_order_id,
-                "order_number": order.ordernr,
+                        "quantity": 1,
+                    }
+                ],
+                "mode": "payment",
+                "success_url": f"{payment_data.return_url}?session_id={{CHECKOUT_SESSION_ID}}",
+                "cancel_url": f"{payment_data.return_url.split('/order')[0]}/checkout",
+                "metadata": {
+                    "order_id": order["web_order_id"],
+                    "order_number": order["ordernr"],
+                },
             },
+            # Stripe's own idempotency: a retry after a lost response gets the same session
+            idempotency_key=f"checkout-{idempotency_key}" if idempotency_key else None
         )
-        
-        # Store in database
-        if existing_payment:
-            # Update existing
-            existing_payment.stripe_payment_intent_id = checkout_session.id
-            existing_payment.amount = order.orderamount
-            existing_payment.currency = order.currency
-            existing_payment.status = checkout_session.status
-            existing_payment.updated_at = datetime.now()
-            db_payment = existing_payment
-        else:
-            # Create new
-            db_payment = StripePaymentIntent(
-                web_order_id=order.web_order_id,
-                stripe_payment_intent_id=checkout_session.id,
-                amount=order.orderamount,
-                currency=order.currency,
-                status=checkout_session.status,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            db.add(db_payment)
-        
-        # Update order payment status and store payment_intent_id for webhook matching
-        order.payment_status = "pending"
-        # Store the payment_intent_id from the checkout session (will be available after payment)
-        order.payment_intent_id = checkout_session.get('payment_intent')
-        
-        db.commit()
-        db.refresh(db_payment)
-        
-        # Log the session URL for debugging
-        checkout_url = checkout_session.url or f"https://checkout.stripe.com/c/pay/{checkout_session.id}"
-        print(f"[DEBUG] Checkout Session ID: {checkout_session.id}")
-        print(f"[DEBUG] Checkout Session URL: {checkout_session.url}")
-        print(f"[DEBUG] Final Checkout URL: {checkout_url}")
-        
-        return PaymentIntentResponse(
-            payment_intent_id=checkout_session.id,
-            client_secret=checkout_url,
-            amount=order.orderamount,
-            currency=order.currency,
-            status=checkout_session.status,
-            order_id=order.web_order_id
-        )
-        
-    except stripe.error.StripeError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Stripe error: {str(e)}"
-        )
+    except PaymentGatewayError as e:
+        raise gateway_http_error(e)
+    
+    await run_in_threadpool(store_checkout_session, db, order, checkout_session)
+    
+    # Log the session URL for debugging
+    checkout_url = checkout_session.get("url") or f"https://checkout.stripe.com/c/pay/{checkout_session['id']}"
+    print(f"[DEBUG] Checkout Session ID: {checkout_session['id']}")
+    print(f"[DEBUG] Checkout Session URL: {checkout_session.get('url')}")
+    print(f"[DEBUG] Final Checkout URL: {checkout_url}")
+    
+    return PaymentIntentResponse(
+        payment_intent_id=checkout_session["id"],
+        client_secret=checkout_url,
+        amount=order["orderamount"],
+        currency=order["currency"],
+        status=checkout_session["status"],
+        order_id=order["web_order_id"]
+    )
 
 
 # ============================================================================
@@ -178,49 +248,20 @@ async def get_payment_status(
 ):
     """
     Get the status of a payment intent
-    """
     
-    # Get from database
-    payment = db.query(StripePaymentIntent).filter(
-        StripePaymentIntent.stripe_payment_intent_id == payment_intent_id
-    ).first()
+    Answered from the cache / database while the status is final or fresh;
+    Stripe is only asked (without blocking) otherwise - see utils/payment_status.py
+    """
     
-    if not payment:
+    try:
+        return await payment_status.get_payment_status(db, payment_intent_id)
+    except payment_status.PaymentNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Payment not found"
         )
-    
-    try:
-        # Get latest status from Stripe
-        stripe_payment = stripe.PaymentIntent.retrieve(payment_intent_id)
-        
-        # Update database
-        payment.status = stripe_payment.status
-        payment.payment_method = stripe_payment.payment_method
-        payment.updated_at = datetime.now()
-        
-        if stripe_payment.charges.data:
-            payment.receipt_url = stripe_payment.charges.data[0].receipt_url
-        
-        db.commit()
-        
-        return PaymentStatus(
-            payment_intent_id=payment.stripe_payment_intent_id,
-            status=payment.status,
-            order_id=payment.web_order_id,
-            amount=payment.amount,
-            currency=payment.currency,
-            payment_method=payment.payment_method,
-            receipt_url=payment.receipt_url,
-            created_at=payment.created_at
-        )
-        
-    except stripe.error.StripeError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Stripe error: {str(e)}"
-        )
+    except PaymentGatewayError as e:
+        raise gateway_http_error(e)
 
 
 # ============================================================================
@@ -230,175 +271,49 @@ async def get_payment_status(
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
+    background_tasks: BackgroundTasks,
     stripe_signature: str = Header(None, alias="stripe-signature"),
     db: Session = Depends(get_db)
 ):
     """
     Handle Stripe webhook events
     
-    Automatically updates order status when payment succeeds/fails
+    Stores the verified event and answers immediately; order status updates
+    and receipt emails are applied right after the answer, in a background
+    task (utils/webhook_inbox.py)
     """
     
     payload = await request.body()
     
-    # DEBUG: Log webhook details
-    print(f"\n[WEBHOOK DEBUG]")
-    print(f"  Signature header: {stripe_signature[:20]}..." if stripe_signature else "  Signature: MISSING")
-    print(f"  Secret loaded: {STRIPE_WEBHOOK_SECRET[:20]}..." if STRIPE_WEBHOOK_SECRET else "  Secret: MISSING")
-    print(f"  Payload size: {len(payload)} bytes")
-    
+    # Signature check and inbox insert block - run them in the threadpool
+    result = await run_in_threadpool(process_stripe_webhook, payload, stripe_signature, db)
+    # Apply it (and send the receipts it queues) without a long-lived worker,
+    # so serverless deployments work too
+    background_tasks.add_task(drain_webhook_events, SessionLocal)
+    background_tasks.add_task(drain_email_outbox, SessionLocal)
+    return result
+
+
+def process_stripe_webhook(payload: bytes, stripe_signature: Optional[str], db: Session):
+    """
+    Verify a Stripe webhook event and store it in the inbox (blocking, called from stripe_webhook)
+
+    The event is applied after the answer (utils/webhook_inbox.py), so
+    Stripe gets its answer after a single insert.
+    """
     try:
         # Verify webhook signature
         event = stripe.Webhook.construct_event(
             payload, stripe_signature, STRIPE_WEBHOOK_SECRET
         )
-        print(f"  ✅ Signature verified successfully")
-        print(f"  Event type: {event.get('type')}")
     except ValueError as e:
-        print(f"  ❌ ValueError: {str(e)}")
+        print(f"[WARNING] Stripe webhook with invalid payload: {e}")
         raise HTTPException(status_code=400, detail="Invalid payload")
     except stripe.error.SignatureVerificationError as e:
-        print(f"  ❌ SignatureVerificationError: {str(e)}")
-        print(f"  Secret is empty: {not STRIPE_WEBHOOK_SECRET}")
-        print(f"  Signature is empty: {not stripe_signature}")
+        print(f"[WARNING] Stripe webhook with invalid signature: {e}")
         raise HTTPException(status_code=400, detail="Invalid signature")
-    
-    # Handle the event
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        
-        # Update payment in database
-        payment = db.query(StripePaymentIntent).filter(
-            StripePaymentIntent.stripe_payment_intent_id == payment_intent['id']
-        ).first()
-        
-        if payment:
-            payment.status = 'succeeded'
-            payment.updated_at = datetime.now()
-            
-            # Update order
-            order = db.query(WebOrder).filter(
-                WebOrder.web_order_id == payment.web_order_id
-            ).first()
-            
-            if order:
-                order.payment_status = 'paid'
-                order.order_status = 'processing'
-                order.updated_at = datetime.now()
-            
-            db.commit()
-            
-            print(f"✅ Payment succeeded for order {order.order_number if order else payment.web_order_id}")
-            
-            # ========================================================
-            # SEND PAYMENT RECEIPT EMAIL
-            # ========================================================
-            if order:
-                try:
-                    email_sent = send_payment_receipt_from_payment(payment, order)
-                    
-                    if email_sent:
-                        print(f"✅ Payment receipt email sent to {order.customer_email}")
-                    else:
-                        print(f"⚠️  Payment receipt email failed for {order.customer_email}")
-                except Exception as e:
-                    print(f"⚠️  Error sending payment receipt email: {str(e)}")
-                
-    
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        
-        # Update payment in database
-        payment = db.query(StripePaymentIntent).filter(
-            StripePaymentIntent.stripe_payment_intent_id == payment_intent['id']
-        ).first()
-        
-        if payment:
-            payment.status = 'failed'
-            payment.updated_at = datetime.now()
-            
-            # Update order
-            order = db.query(WebOrder).filter(
-                WebOrder.web_order_id == payment.web_order_id
-            ).first()
-            
-            if order:
-                order.payment_status = 'failed'
-                order.updated_at = datetime.now()
-            
-            db.commit()
-            
-            print(f"❌ Payment failed for order {order.order_number if order else payment.web_order_id}")
-    
-    elif event['type'] == 'checkout.session.completed':
-        # Handle Stripe Checkout Session completion
-        session = event['data']['object']
-        
-        print(f"\n[CHECKOUT.SESSION.COMPLETED]")
-        print(f"  Session ID: {session.get('id')}")
-        print(f"  Payment Intent: {session.get('payment_intent')}")
-        print(f"  Metadata: {session.get('metadata')}")
-        print(f"  Status: {session.get('status')}")
-        
-        try:
-            # Strategy 1: Try to find order by metadata order_id (most reliable)
-            metadata = session.get('metadata', {})
-            order_id = metadata.get('order_id')
-            
-            order = None
-            if order_id:
-                try:
-                    order = db.query(WebOrder).filter(
-                        WebOrder.web_order_id == int(order_id)
-                    ).first()
-                    
-                    if order:
-                        print(f"  ✅ Found order by metadata: {order.ordernr}")
-                except Exception as e:
-                    print(f"  ❌ Error querying order by metadata: {str(e)}")
-            
-            # Strategy 2: If not found, try payment_intent_id
-            payment_intent_id = session.get('payment_intent')
-            if not order and payment_intent_id:
-                try:
-                    order = db.query(WebOrder).filter(
-                        WebOrder.payment_intent_id == payment_intent_id
-                    ).first()
-                    
-                    if order:
-                        print(f"  ✅ Found order by payment_intent: {order.ordernr}")
-                except Exception as e:
-                    print(f"  ❌ Error querying order by payment_intent: {str(e)}")
-            
-            # If order found, update it
-            if order:
-                # Update payment status
-                order.payment_status = 'paid'
-                order.payment_intent_id = payment_intent_id  # Store for future reference
-                order.updated_at = datetime.utcnow()
-                
-                db.commit()
-                db.refresh(order)
-                
-                print(f"  ✅ Order updated: {order.ordernr} -> payment_status=paid")
-                
-                # Try to send payment receipt email
-                try:
-                    email_sent = send_payment_receipt_from_payment(None, order)
-                    if email_sent:
-                        print(f"  ✅ Payment receipt email sent to {order.customer_email if hasattr(order, 'customer_email') else 'customer'}")
-                except Exception as e:
-                    print(f"  ⚠️  Error sending payment receipt email: {str(e)}")
-            else:
-                print(f"  ❌ Order not found - order_id={order_id}, payment_intent={payment_intent_id}")
-                # Don't raise error - just log it so webhook still returns 200
-        
-        except Exception as e:
-            print(f"  ❌ Error processing checkout.session.completed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Don't raise error - just log it so webhook still returns 200
-    
+
+    store_event(db, event, payload)
     return {"status": "success"}
 
 
@@ -420,9 +335,11 @@ async def create_refund(
     """
     
     # Get payment
-    payment = db.query(StripePaymentIntent).filter(
-        StripePaymentIntent.stripe_payment_intent_id == refund_data.payment_intent_id
-    ).first()
+    payment = await run_in_threadpool(
+        lambda: db.query(StripePaymentIntent).filter(
+            StripePaymentIntent.stripe_payment_intent_id == refund_data.payment_intent_id
+        ).first()
+    )
     
     if not payment:
         raise HTTPException(
@@ -436,43 +353,55 @@ async def create_refund(
             detail="Can only refund succeeded payments"
         )
     
+    # Create refund in Stripe
+    refund_amount = None
+    if refund_data.amount:
+        refund_amount = int(float(refund_data.amount) * 100)
+    
     try:
-        # Create refund in Stripe
-        refund_amount = None
-        if refund_data.amount:
-            refund_amount = int(float(refund_data.amount) * 100)
-        
-        refund = stripe.Refund.create(
-            payment_intent=refund_data.payment_intent_id,
-            amount=refund_amount,
-            reason=refund_data.reason
-        )
-        
-        # Update order
-        order = db.query(WebOrder).filter(
-            WebOrder.web_order_id == payment.web_order_id
-        ).first()
-        
-        if order:
-            order.payment_status = 'refunded'
-            order.order_status = 'cancelled'
-            order.updated_at = datetime.now()
-            db.commit()
-        
-        return RefundResponse(
-            refund_id=refund.id,
-            payment_intent_id=refund_data.payment_intent_id,
-            amount=Decimal(str(refund.amount / 100)),
-            currency=refund.currency.upper(),
-            status=refund.status,
-            reason=refund.reason or ""
-        )
+        gateway = get_gateway()
+        payment_intent_id = refund_data.payment_intent_id
+        if payment_intent_id.startswith("cs_"):
+            # Checkout payments are stored by session id (see create_checkout_session)
+            session = await gateway.retrieve_checkout_session(payment_intent_id)
+            intent = session.get("payment_intent")
+            payment_intent_id = intent["id"] if isinstance(intent, dict) else intent
         
-    except stripe.error.StripeError as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Stripe error: {str(e)}"
-        )
+        refund = await gateway.create_refund({
+            "payment_intent": payment_intent_id,
+            "amount": refund_amount,
+            "reason": refund_data.reason
+        })
+    except PaymentGatewayError as e:
+        raise gateway_http_error(e)
+    
+    await run_in_threadpool(cancel_refunded_order, db, payment.web_order_id)
+    payment_status.forget_status(refund_data.payment_intent_id, payment_intent_id)
+    
+    return RefundResponse(
+        refund_id=refund["id"],
+        payment_intent_id=refund_data.payment_intent_id,
+        amount=Decimal(str(refund["amount"] / 100)),
+        currency=refund["currency"].upper(),
+        status=refund["status"],
+        reason=refund.get("reason") or ""
+    )
+
+
+def cancel_refunded_order(db: Session, web_order_id: int) -> None:
+    """Mark the order refunded and give its stock back (blocking, runs in the threadpool)"""
+    
+    # Update order
+    order = db.query(WebOrder).filter(
+        WebOrder.web_order_id == web_order_id
+    ).first()
+    
+    if order:
+        order.payment_status = 'refunded'
+        order.order_status = 'cancelled'
+        order.updated_at = datetime.now()
+        release_reservations(db, order.web_order_id)
+        db.commit()
 
 
 # ============================================================================
@@ -500,7 +429,7 @@ async def get_payment_methods():
 # ============================================================================
 
 @router.get("/order/{order_id}")
-async def get_order_payments(
+def get_order_payments(
     order_id: int,
     db: Session = Depends(get_db)
 ):
@@ -5,21 +5,96 @@ Handles father/child article structure with proper category mapping
 Includes defensive error handling for variation combinations
 Supports multi-country pricing with automatic VAT conversion
 """
+from bisect import bisect_right
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, noload
 from sqlalchemy import func, or_, and_
 from typing import Optional, List
 from database.connection import get_db
 from models.product import (
     Product, Category, VariationData, VariationCombinationData,
-    ProductAvailability, InventoryData,
-    product_category_association
+    ProductAvailability,
+    product_category_association, products_to_simple_dicts
 )
-from utils.pricing import convert_price_by_country, validate_country_code
+from utils.pricing import validate_country_code
+from utils.catalog_cache import get_catalog_snapshot
+from utils.pagination import InvalidCursor, encode_cursor, decode_cursor, keyset_page, cached_count
+from utils.product_search import product_search
+from utils.stock import add_availability, availability, get_stock
 
 router = APIRouter()
 
 
+# ============================================================================
+# HELPER FUNCTIONS
+# ============================================================================
+
+def load_product_detail(db: Session, articlenr: str) -> Optional[dict]:
+    """
+    Load everything the product page needs with one query per table
+
+    - productdata: requested article, its father and its children in one query
+      (categories come with it through the joined eager load)
+    - variationdata / variationcombinationdata: one query each, fathers only
+    - inventorydata: stock service (cached, see utils/stock.py)
+
+    Args:
+        db: Database session
+        articlenr: Requested article number (father, child or standalone)
+
+    Returns:
+        dict with product, father, children, variation_definitions,
+        variation_combinations and total_stock - or None if not found
+    """
+    father_of_requested = db.query(Product.fatherarticle).filter(
+        Product.articlenr == articlenr
+    ).scalar_subquery()
+
+    rows = db.query(Product).filter(
+        or_(
+            Product.articlenr == articlenr,
+            Product.fatherarticle == articlenr,
+            Product.articlenr == father_of_requested
+        )
+    ).order_by(Product.productid).all()
+
+    product = next((p for p in rows if p.articlenr == articlenr), None)
+    if not product:
+        return None
+
+    father = None
+    children = []
+    if product.fatherarticle:
+        father = next((p for p in rows if p.articlenr == product.fatherarticle), None)
+    else:
+        children = [p for p in rows if p.fatherarticle == articlenr]
+
+    variation_definitions = []
+    variation_combinations = []
+    if product.isfatherarticle and not product.fatherarticle:
+        variation_definitions = db.query(VariationData).filter(
+            VariationData.fatherarticle == articlenr
+        ).order_by(
+            VariationData.variationsortnr.asc().nullslast(),
+            VariationData.variationvaluesortnr.asc().nullslast()
+        ).all()
+
+        variation_combinations = db.query(VariationCombinationData).filter(
+            VariationCombinationData.fatherarticle == articlenr
+        ).all()
+
+    total_stock = get_stock(db, [articlenr])[articlenr]
+
+    return {
+        "product": product,
+        "father": father,
+        "children": children,
+        "variation_definitions": variation_definitions,
+        "variation_combinations": variation_combinations,
+        "total_stock": total_stock
+    }
+
+
 # ============================================================================
 # CORE PRODUCT ENDPOINTS
 # ============================================================================
@@ -35,6 +110,7 @@ def get_products(
     max_price: Optional[float] = None,
     only_fathers: bool = True,
     country: str = "AT",
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
@@ -46,9 +122,10 @@ def get_products(
     - productgroup: Filter by product group
     - manufacturer: Filter by manufacturer
     - category: Filter by category (from category table)
-    - min_price, max_price: Price range filter (in source currency)
+    - min_price, max_price: Price range filter (gross prices of `country`)
     - only_fathers: If true, only return father articles (main products)
     - country: Country code for pricing (default: "AT" for Austria)
+    - cursor: next_cursor of the previous page (replaces skip, for infinite scroll)
     """
     try:
         # Validate country code
@@ -58,62 +135,66 @@ def get_products(
                 detail=f"Invalid country code: {country}"
             )
         
-        query = db.query(Product)
+        # Served from the in-memory catalog snapshot (see utils/catalog_cache.py)
+        catalog = get_catalog_snapshot(db)
         
         # By default, only show father articles
-        if only_fathers:
-            query = query.filter(Product.isfatherarticle == True)
-        
-        # Apply filters
-        if productgroup:
-            query = query.filter(Product.productgroup.ilike(f"%{productgroup}%"))
-        
-        if manufacturer:
-            query = query.filter(Product.manufacturer.ilike(f"%{manufacturer}%"))
-        
-        if min_price is not None:
-            query = query.filter(Product.priceEUR >= min_price)
-        
-        if max_price is not None:
-            query = query.filter(Product.priceEUR <= max_price)
+        records = catalog.fathers if only_fathers else catalog.listing_order
         
         # Filter by category if provided
+        category_product_ids = None
         if category:
-            cat = db.query(Category).filter(
-                Category.category.ilike(f"%{category}%")
-            ).first()
+            cat = catalog.find_category(category)
             if cat:
-                query = query.join(Category, Product.categories).filter(
-                    Category.categoryid == cat.categoryid
-                )
-        
-        # Order by product group, then by price
-        query = query.order_by(Product.productgroup, Product.priceEUR)
-        
-        # Get products with pagination
-        products = query.offset(skip).limit(min(limit, 100)).all()
-        total_count = query.count()
-        
-        # Convert prices to target country
+                category_product_ids = set(catalog.category_product_ids.get(cat["categoryid"], []))
+        
+        # Apply filters (same semantics as ILIKE '%value%'; price range on localized prices)
+        checks = catalog.filter_checks(
+            productgroup=productgroup,
+            manufacturer=manufacturer,
+            category_product_ids=category_product_ids,
+            min_price=min_price,
+            max_price=max_price,
+            country=country
+        ).values()
+        
+        # Already ordered by product group, then by price
+        filtered = [p for p in records if all(check(p) for check in checks)]
+        total_count = len(filtered)
+        
+        # Get products with pagination (cursor continues after the last product of the previous page)
+        if cursor:
+            after = tuple(decode_cursor(cursor, 5, catalog.LISTING_KEY_TYPES))
+            skip = bisect_right([catalog.listing_key(p) for p in filtered], after)
+        skip = max(skip, 0)
+        products = filtered[skip:skip + min(limit, 100)]
+        has_more = skip + len(products) < total_count
+        
+        # Prices of the target country (precomputed in the snapshot)
         products_data = []
-        for p in products:
-            product_dict = p.to_simple_dict(include_categories=True, db_session=db)
-            # Convert price to target country
+        for record in products:
+            product_dict = catalog.simple_dict(record, include_categories=True)
             if product_dict.get("price"):
-                product_dict["price"] = float(convert_price_by_country(product_dict["price"], country))
+                product_dict["price"] = float(catalog.localized_price(record["productid"], country))
             product_dict["country"] = country
             products_data.append(product_dict)
         
+        # Stock of the whole page in one lookup (fathers include their variations)
+        add_availability(db, products_data, catalog.children_by_father)
+        
         return {
             "status": "success",
             "count": len(products),
             "total": total_count,
             "page": (skip // limit) + 1 if limit > 0 else 1,
             "pages": (total_count + limit - 1) // limit if limit > 0 else 1,
+            "next_cursor": encode_cursor(catalog.listing_key(products[-1])) if products and has_more else None,
             "country": country,
             "products": products_data
         }
     
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except HTTPException:
         raise
     except Exception as e:
@@ -130,16 +211,13 @@ def get_featured_products_list(
     Get featured products for homepage
     """
     try:
-        products = db.query(Product).filter(
-            Product.isfatherarticle == True
-        ).order_by(
-            Product.productid.desc()
-        ).limit(limit).all()
+        catalog = get_catalog_snapshot(db)
+        products = catalog.newest_fathers[:max(limit, 0)]
         
         return {
             "status": "success",
             "count": len(products),
-            "products": [p.to_simple_dict(include_categories=True, db_session=db) for p in products]
+            "products": [catalog.simple_dict(p, include_categories=True) for p in products]
         }
 
     except Exception as e:
@@ -199,12 +277,14 @@ def get_product(articlenr: str, country: str = "AT", db: Session = Depends(get_d
                 detail=f"Invalid country code: {country}"
             )
         
-        # Get the main product
-        product = db.query(Product).filter(Product.articlenr == articlenr).first()
+        # Get the main product together with father, children, variations and stock
+        detail = load_product_detail(db, articlenr)
 
-        if not product:
+        if not detail:
             raise HTTPException(status_code=404, detail="Product not found")
 
+        product = detail["product"]
+
         # Determine if this is a father or child product
         # IMPORTANT: Keep the actual product data (don't replace child with father)
         # Frontend needs child-specific images and data
@@ -219,21 +299,21 @@ def get_product(articlenr: str, country: str = "AT", db: Session = Depends(get_d
             is_child_product = True
 
             # Just verify father exists, but DON'T replace the product
-            father_product = db.query(Product).filter(Product.articlenr == father_article_nr).first()
-            if not father_product:
+            if not detail["father"]:
                 # Father not found, return child product alone
-                product_dict = product.to_dict(include_categories=True, db_session=db)
+                product_dict = product.to_dict(include_categories=True)
                 return {"status": "success", "product": product_dict}
         elif product.isfatherarticle:
             # This is a father product
             father_article_nr = articlenr
         else:
             # This is a standalone product (no variations)
-            product_dict = product.to_dict(include_categories=True, db_session=db)
+            product_dict = product.to_dict(include_categories=True)
             return {"status": "success", "product": product_dict}
 
         # Build product dict - use the ORIGINAL product (child or father as requested)
-        product_dict = product.to_dict(include_categories=True, db_session=db)
+        # Categories were eager-loaded with the product query
+        product_dict = product.to_dict(include_categories=True)
         if requested_child_nr:
             product_dict["requested_variation"] = requested_child_nr
 
@@ -241,30 +321,21 @@ def get_product(articlenr: str, country: str = "AT", db: Session = Depends(get_d
         # Child products don't need variation data (frontend already has it from father)
         if father_article_nr and not is_child_product:
             try:
-                # 1. Get child products from productdata table
-                child_products = db.query(Product).filter(
-                    Product.fatherarticle == father_article_nr
-                ).all()
-
-                # 2. Get variation definitions from variationdata table (types and values for father)
-                # Order by variationsortnr and variationvaluesortnr for correct sequence
-                variation_definitions = db.query(VariationData).filter(
-                    VariationData.fatherarticle == father_article_nr
-                ).order_by(
-                    VariationData.variationsortnr.asc().nullslast(),
-                    VariationData.variationvaluesortnr.asc().nullslast()
-                ).all()
-
-                # 3. Get variation combinations from variationcombinationdata table (maps children to variations)
-                variation_combos = db.query(VariationCombinationData).filter(
-                    VariationCombinationData.fatherarticle == father_article_nr
-                ).all()
+                # 1. Child products from productdata table (loaded with the product)
+                child_products = detail["children"]
+
+                # 2. Variation definitions from variationdata table (types and values for father)
+                # Ordered by variationsortnr and variationvaluesortnr for correct sequence
+                variation_definitions = detail["variation_definitions"]
+
+                # 3. Variation combinations from variationcombinationdata table (maps children to variations)
+                variation_combos = detail["variation_combinations"]
 
                 # Build variations list with full product info
                 variations_list = []
                 for child in child_products:
                     if child:
-                        variations_list.append(child.to_simple_dict(include_categories=False, db_session=db))
+                        variations_list.append(child.to_simple_dict(include_categories=False))
 
                 product_dict["variations"] = variations_list
                 product_dict["variation_count"] = len(variations_list)
@@ -328,26 +399,7 @@ def get_product(articlenr: str, country: str = "AT", db: Session = Depends(get_d
                 product_dict["variation_combinations"] = []
         
         # Get availability status
-        total_stock = db.query(func.sum(InventoryData.quantity)).filter(
-            InventoryData.articlenr == articlenr
-        ).scalar() or 0
-        
-        # Determine status
-        if total_stock > 10:
-            status = "in_stock"
-            status_display = "In Stock"
-        elif total_stock > 0:
-            status = "low_stock"
-            status_display = f"Low Stock - Only {int(total_stock)} left"
-        else:
-            status = "out_of_stock"
-            status_display = "Out of Stock"
-        
-        product_dict["availability"] = {
-            "status": status,
-            "status_display": status_display,
-            "total_stock": int(total_stock)
-        }
+        product_dict["availability"] = availability(detail["total_stock"])
         
         return {
             "status": "success",
@@ -371,114 +423,32 @@ def get_product_variations(articlenr: str, db: Session = Depends(get_db)):
     Includes both child products and variation metadata
     """
     try:
+        catalog = get_catalog_snapshot(db)
+
         # Get the main product (can be father or child)
-        product = db.query(Product).filter(
-            Product.articlenr == articlenr
-        ).first()
-        
+        product = catalog.get_product(articlenr)
+
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        father_articlenr = product.fatherarticle if not product.isfatherarticle else articlenr
-        
+
+        father_articlenr = product["father_article"] if not product["is_father_article"] else articlenr
+
         if not father_articlenr:
             raise HTTPException(status_code=404, detail="Product has no variations")
-        
-        # Get all variations (child articles) - filter out None values
-        variations = [v for v in db.query(Product).filter(
-            Product.fatherarticle == father_articlenr
-        ).all() if v is not None]
-
-        # Extract variation options from variationcombinationdata
-        # Build variation_options dict: { "Farbe": ["Schwarz/Grün", "Blau"], "Größe": ["XS", "S"] }
-        variation_options = {}
-        try:
-            # Get unique variation types and values from variationcombinationdata
-            var_combos = db.query(VariationCombinationData).filter(
-                VariationCombinationData.fatherarticle == father_articlenr
-            ).all()
-
-            for vc in var_combos:
-                try:
-                    # Process variation1
-                    if hasattr(vc, 'variation1') and vc.variation1 and hasattr(vc, 'variationvalue1') and vc.variationvalue1:
-                        if vc.variation1 not in variation_options:
-                            variation_options[vc.variation1] = []
-                        if vc.variationvalue1 not in variation_options[vc.variation1]:
-                            variation_options[vc.variation1].append(vc.variationvalue1)
-
-                    # Process variation2
-                    if hasattr(vc, 'variation2') and vc.variation2 and hasattr(vc, 'variationvalue2') and vc.variationvalue2:
-                        if vc.variation2 not in variation_options:
-                            variation_options[vc.variation2] = []
-                        if vc.variationvalue2 not in variation_options[vc.variation2]:
-                            variation_options[vc.variation2].append(vc.variationvalue2)
-
-                    # Process variation3
-                    if hasattr(vc, 'variation3') and vc.variation3 and hasattr(vc, 'variationvalue3') and vc.variationvalue3:
-                        if vc.variation3 not in variation_options:
-                            variation_options[vc.variation3] = []
-                        if vc.variationvalue3 not in variation_options[vc.variation3]:
-                            variation_options[vc.variation3].append(vc.variationvalue3)
-                except Exception as e:
-                    print(f"Error processing variation from combination: {e}")
-                    continue
-        except Exception as e:
-            print(f"Error extracting variations from combinations: {e}")
-
-        # Get variation combinations with error handling
-        variation_combinations = []
-        try:
-            var_combos = db.query(VariationCombinationData).filter(
-                VariationCombinationData.fatherarticle == father_articlenr
-            ).all()
-
-            for vc in var_combos:
-                try:
-                    if vc is not None:
-                        # Build variations list, filtering out None values
-                        variations_list = []
-                        if hasattr(vc, 'variation1') and vc.variation1:
-                            variations_list.append({"type": vc.variation1, "value": vc.variationvalue1})
-                        if hasattr(vc, 'variation2') and vc.variation2:
-                            variations_list.append({"type": vc.variation2, "value": vc.variationvalue2})
-                        if hasattr(vc, 'variation3') and vc.variation3:
-                            variations_list.append({"type": vc.variation3, "value": vc.variationvalue3})
-
-                        variation_combinations.append({
-                            "articlenr": vc.articlenr if hasattr(vc, 'articlenr') and vc.articlenr else "",
-                            "variations": variations_list
-                        })
-                except Exception as e:
-                    print(f"Error processing variation combo: {e}")
-                    continue
-        except Exception as e:
-            print(f"Error querying variation combinations: {e}")
-
-        # Group variations by attributes
-        variations_by_attr = {}
-        for var in variations:
-            try:
-                for attr in ['colour', 'size', 'type', 'component']:
-                    val = getattr(var, attr, None)
-                    if val:
-                        if attr not in variations_by_attr:
-                            variations_by_attr[attr] = {}
-                        if val not in variations_by_attr[attr]:
-                            variations_by_attr[attr][val] = []
-                        variations_by_attr[attr][val].append(var.to_simple_dict(include_categories=False, db_session=db))
-            except Exception as e:
-                print(f"Error grouping variation by attribute: {e}")
-                continue
+
+        # Children, options, combinations and groupings are precomputed per snapshot
+        matrix = catalog.variation_matrix(father_articlenr)
 
         return {
             "status": "success",
             "father_article": father_articlenr,
-            "variation_count": len(variations),
-            "variations": [v.to_simple_dict(include_categories=False, db_session=db) for v in variations],
-            "variation_options": variation_options,  # Frontend expects this key!
-            "variation_combinations": variation_combinations,
-            "grouped_by_attribute": variations_by_attr
+            "variation_count": len(matrix.variations),
+            "variations": matrix.variations,
+            "variation_options": matrix.variation_options,  # Frontend expects this key!
+            "variation_combinations": matrix.variation_combinations,
+            "grouped_by_attribute": matrix.grouped_by_attribute,
+            # { "Farbe=Blau|Größe=M": "ART-123" } for resolving a full selection
+            "combination_lookup": matrix.combination_lookup
         }
     
     except HTTPException:
@@ -497,30 +467,35 @@ def search_products(
     q: str = Query(..., min_length=2),
     skip: int = 0,
     limit: int = 24,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     Search products by name, article number, or manufacturer
+    Ranked full-text prefix search (see utils/product_search.py), ILIKE if not migrated
+    Pass next_cursor as `cursor` to continue without OFFSET (total is then cached)
     """
     try:
-        search_term = f"%{q}%"
+        condition, rank = product_search(db, q)
+        query = db.query(Product).filter(condition)
         
-        query = db.query(Product).filter(
-            or_(
-                Product.articlename.ilike(search_term),
-                Product.articlenr.ilike(search_term),
-                Product.manufacturer.ilike(search_term)
-            )
-        )
-        
-        # Prioritize father articles
-        query = query.order_by(
-            Product.isfatherarticle.desc(),
-            Product.articlename
-        )
+        if cursor:
+            total_count = cached_count(("search_products", q.lower(), rank is not None), query.count)
+        else:
+            total_count = query.count()
+        
+        # Prioritize father articles, then relevance (or name without full-text search).
+        # productid keeps the order stable for cursors.
+        if rank is not None:
+            rank = rank.label("search_rank")
+            query = query.with_entities(Product, Product.isfatherarticle, rank, Product.productid)
+            sort_keys = [(Product.isfatherarticle, True), (rank, True), (Product.productid, False)]
+        else:
+            sort_keys = [(Product.isfatherarticle, True), (Product.articlename, False), (Product.productid, False)]
+        query = query.options(noload(Product.categories))
         
-        total_count = query.count()
-        products = query.offset(skip).limit(limit).all()
+        rows, next_cursor = keyset_page(query, sort_keys, cursor, limit, offset=skip)
+        products = [row.Product for row in rows] if rank is not None else rows
         
         return {
             "status": "success",
@@ -529,9 +504,16 @@ def search_products(
             "total": total_count,
             "page": (skip // limit) + 1 if limit > 0 else 1,
             "pages": (total_count + limit - 1) // limit if limit > 0 else 1,
-            "products": [p.to_simple_dict(include_categories=True, db_session=db) for p in products]
+            "next_cursor": next_cursor,
+            "products": add_availability(
+                db,
+                products_to_simple_dicts(products, include_categories=True, db_session=db),
+                get_catalog_snapshot(db).children_by_father
+            )
         }
 
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         print(f"Error in search_products: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -545,41 +527,25 @@ def search_products(
 def get_categories(db: Session = Depends(get_db)):
     """
     Get all categories from the category table with product counts
+    product_count includes variations, father_count only the listed main products
     """
     try:
-        categories = db.query(
-            Category.categoryid,
-            Category.category,
-            Category.categorypath,
-            Category.categoryimageurl,
-            func.count(Product.productid).label('count')
-        ).outerjoin(
-            product_category_association,
-            Category.categoryid == product_category_association.c.categoryid
-        ).outerjoin(
-            Product,
-            product_category_association.c.productid == Product.productid
-        ).group_by(
-            Category.categoryid,
-            Category.category,
-            Category.categorypath,
-            Category.categoryimageurl
-        ).order_by(
-            Category.category
-        ).all()
+        catalog = get_catalog_snapshot(db)
+        counts = catalog.category_counts()
         
         return {
             "status": "success",
-            "count": len(categories),
+            "count": len(catalog.categories),
             "categories": [
                 {
-                    "categoryid": cat[0],
-                    "category": cat[1],
-                    "categorypath": cat[2],
-                    "categoryimageurl": cat[3],
-                    "product_count": cat[4] or 0
+                    "categoryid": cat["categoryid"],
+                    "category": cat["category"],
+                    "categorypath": cat["categorypath"],
+                    "categoryimageurl": cat["categoryimageurl"],
+                    "product_count": counts.get(cat["categoryid"], 0),
+                    "father_count": catalog.category_father_counts.get(cat["categoryid"], 0)
                 }
-                for cat in categories
+                for cat in catalog.categories
             ]
         }
     
@@ -588,57 +554,79 @@ def get_categories(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@router.get("/meta/categories/tree")
+def get_category_tree(db: Session = Depends(get_db)):
+    """
+    Get categories as a tree parsed from categorypath
+    Each node has product_count, father_count, level and children
+    """
+    try:
+        catalog = get_catalog_snapshot(db)
+        
+        return {
+            "status": "success",
+            "count": len(catalog.categories),
+            "tree": catalog.category_tree
+        }
+    
+    except Exception as e:
+        print(f"Error in get_category_tree: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
 @router.get("/meta/categories/{categoryid}")
 def get_category_products(
     categoryid: int,
     skip: int = 0,
     limit: int = 24,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """
     Get all products in a specific category
+    Pass next_cursor as `cursor` to continue after the previous page instead of using skip
     """
     try:
+        catalog = get_catalog_snapshot(db)
+        
         # Get category
-        category = db.query(Category).filter(
-            Category.categoryid == categoryid
-        ).first()
+        category = catalog.categories_by_id.get(categoryid)
         
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
         
         # Get products in this category
-        products = db.query(Product).join(
-            product_category_association,
-            Product.productid == product_category_association.c.productid
-        ).filter(
-            product_category_association.c.categoryid == categoryid,
-            Product.isfatherarticle == True
-        ).offset(skip).limit(min(limit, 100)).all()
-        
-        total_count = db.query(Product).join(
-            product_category_association,
-            Product.productid == product_category_association.c.productid
-        ).filter(
-            product_category_association.c.categoryid == categoryid,
-            Product.isfatherarticle == True
-        ).count()
+        category_products = catalog.products_in_category(categoryid, only_fathers=True)
+        total_count = len(category_products)
+        if cursor:
+            after_productid, = decode_cursor(cursor, 1, [(int,)])
+            skip = bisect_right([p["productid"] for p in category_products], after_productid)
+        skip = max(skip, 0)
+        products = category_products[skip:skip + min(limit, 100)]
+        has_more = skip + len(products) < total_count
         
         return {
             "status": "success",
             "category": {
-                "categoryid": category.categoryid,
-                "category": category.category,
-                "categorypath": category.categorypath,
-                "categoryimageurl": category.categoryimageurl
+                "categoryid": category["categoryid"],
+                "category": category["category"],
+                "categorypath": category["categorypath"],
+                "categoryimageurl": category["categoryimageurl"]
             },
             "count": len(products),
             "total": total_count,
             "page": (skip // limit) + 1 if limit > 0 else 1,
             "pages": (total_count + limit - 1) // limit if limit > 0 else 1,
-            "products": [p.to_simple_dict(include_categories=False, db_session=db) for p in products]
+            "next_cursor": encode_cursor([products[-1]["productid"]]) if products and has_more else None,
+            "products": add_availability(
+                db,
+                [catalog.simple_dict(p, include_categories=False) for p in products],
+                catalog.children_by_father
+            )
         }
 
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except HTTPException:
         raise
     except Exception as e:
@@ -656,27 +644,17 @@ def get_manufacturers(db: Session = Depends(get_db)):
     Get all manufacturers for filter dropdown
     """
     try:
-        manufacturers = db.query(
-            Product.manufacturer,
-            func.count(Product.productid).label('count')
-        ).filter(
-            Product.isfatherarticle == True,
-            Product.manufacturer.isnot(None)
-        ).group_by(
-            Product.manufacturer
-        ).order_by(
-            Product.manufacturer
-        ).all()
+        manufacturers = get_catalog_snapshot(db).manufacturer_counts
         
         return {
             "status": "success",
             "count": len(manufacturers),
             "manufacturers": [
                 {
-                    "name": manu[0],
-                    "count": manu[1]
+                    "name": name,
+                    "count": count
                 }
-                for manu in manufacturers
+                for name, count in manufacturers
             ]
         }
     
@@ -690,79 +668,88 @@ def get_manufacturers(db: Session = Depends(get_db)):
 # ============================================================================
 
 @router.get("/meta/filters")
-def get_available_filters(db: Session = Depends(get_db)):
+def get_available_filters(country: str = "AT", db: Session = Depends(get_db)):
     """
     Get available filters based on all products in database
+
+    The price range is in gross prices of `country` (as the price filter of GET /).
     """
     try:
-        # Get price range
-        price_stats = db.query(
-            func.min(Product.priceEUR),
-            func.max(Product.priceEUR)
-        ).filter(
-            Product.isfatherarticle == True
-        ).first()
-        
-        min_price = float(price_stats[0]) if price_stats[0] else 0
-        max_price = float(price_stats[1]) if price_stats[1] else 0
-        
-        # Get manufacturers
-        manufacturers = db.query(
-            Product.manufacturer
-        ).filter(
-            Product.isfatherarticle == True,
-            Product.manufacturer.isnot(None)
-        ).distinct().all()
-        
-        # Get product groups
-        product_groups = db.query(
-            Product.productgroup
-        ).filter(
-            Product.isfatherarticle == True,
-            Product.productgroup.isnot(None)
-        ).distinct().all()
-        
-        # Get colours
-        colours = db.query(
-            Product.colour
-        ).filter(
-            Product.colour.isnot(None)
-        ).distinct().all()
-        
-        # Get sizes
-        sizes = db.query(
-            Product.size
-        ).filter(
-            Product.size.isnot(None)
-        ).distinct().all()
-        
-        # Get types
-        types = db.query(
-            Product.type
-        ).filter(
-            Product.type.isnot(None)
-        ).distinct().all()
-        
+        if not validate_country_code(country):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid country code: {country}"
+            )
+
         return {
             "status": "success",
-            "filters": {
-                "price_range": {
-                    "min": min_price,
-                    "max": max_price
-                },
-                "manufacturers": [m[0] for m in manufacturers if m[0]],
-                "product_groups": [pg[0] for pg in product_groups if pg[0]],
-                "colours": [c[0] for c in colours if c[0]],
-                "sizes": [s[0] for s in sizes if s[0]],
-                "types": [t[0] for t in types if t[0]]
-            }
+            "filters": get_catalog_snapshot(db).available_filters(country)
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_available_filters: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@router.get("/meta/facets")
+def get_facets(
+    productgroup: Optional[str] = None,
+    manufacturer: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    only_fathers: bool = True,
+    country: str = "AT",
+    db: Session = Depends(get_db)
+):
+    """
+    Filter values with product counts under the current filter set
+    
+    Takes the same filters as GET / and returns, for every facet, each value
+    with the number of matching products. Manufacturer and product group
+    counts ignore their own filter, the price range ignores the price filter.
+    Colours, sizes and types of a father include those of its variations.
+    Price filter and price range are gross prices of `country`.
+    """
+    try:
+        if not validate_country_code(country):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid country code: {country}"
+            )
+        
+        catalog = get_catalog_snapshot(db)
+        records = catalog.fathers if only_fathers else catalog.listing_order
+        
+        category_product_ids = None
+        if category:
+            cat = catalog.find_category(category)
+            if cat:
+                category_product_ids = set(catalog.category_product_ids.get(cat["categoryid"], []))
+        
+        checks = catalog.filter_checks(
+            productgroup=productgroup,
+            manufacturer=manufacturer,
+            category_product_ids=category_product_ids,
+            min_price=min_price,
+            max_price=max_price,
+            country=country
+        )
+        
+        return {
+            "status": "success",
+            **catalog.facet_counts(records, checks, country)
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_facets: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
 # ============================================================================
 # FEATURED PRODUCTS ENDPOINT
 # ============================================================================
@@ -776,16 +763,13 @@ def get_featured_products(
     Get featured products for homepage
     """
     try:
-        products = db.query(Product).filter(
-            Product.isfatherarticle == True
-        ).order_by(
-            Product.productid.desc()
-        ).limit(limit).all()
+        catalog = get_catalog_snapshot(db)
+        products = catalog.newest_fathers[:max(limit, 0)]
         
         return {
             "status": "success",
             "count": len(products),
-            "products": [p.to_simple_dict(include_categories=True, db_session=db) for p in products]
+            "products": [catalog.simple_dict(p, include_categories=True) for p in products]
         }
 
     except Exception as e:
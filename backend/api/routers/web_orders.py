@@ -4,15 +4,19 @@ Location: api/routers/web_orders.py
 
 Handles web order creation from client-side cart (localStorage)
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from datetime import datetime
-from decimal import Decimal
 
 from database.connection import get_db
-from models.order import WebOrder
+from models.order import WebOrder, WebOrderItem
 from api.utils.auth_dependencies import get_optional_user
+from api.utils.idempotency import run_idempotent, REPLAYED_HEADER
+from utils.cart_store import get_cart_store
+from utils.checkout import create_order, commit_reservations, release_reservations, CheckoutError, OutOfStock
+from utils.order_numbers import next_order_number
+from utils.pricing import resolve_country
 
 router = APIRouter(prefix="/web-orders", tags=["Web Orders"])
 
@@ -25,49 +29,12 @@ def generate_web_order_number(db: Session) -> str:
     """
     Generate unique web order number in format: AT-NNNN-YYYY
     AT is prefix, NNNN starts from 1001 and increments, YYYY is year
-    """
-    from sqlalchemy import func
 
+    Taken from the atomic per-year counter (utils/order_numbers.py)
+    """
     current_year = datetime.utcnow().year
-
-    # Get the highest order number for this year
-    # Query for orders with format AT-NNNN-YYYY
-    try:
-        # Get all orders for this year
-        year_orders = db.query(WebOrder).filter(
-            WebOrder.ordernr.like(f'AT-%-{current_year}')
-        ).all()
-
-        if year_orders:
-            # Extract numbers from order numbers
-            numbers = []
-            for order in year_orders:
-                try:
-                    # Parse AT-NNNN-YYYY format
-                    parts = order.ordernr.split('-')
-                    if len(parts) == 3 and parts[0] == 'AT':
-                        numbers.append(int(parts[1]))
-                except:
-                    continue
-
-            if numbers:
-                next_number = max(numbers) + 1
-            else:
-                next_number = 1001
-        else:
-            next_number = 1001
-
-    except Exception as e:
-        print(f"Error querying for order number: {e}")
-        # Fallback: use current count + 1001
-        try:
-            total_count = db.query(func.count(WebOrder.web_order_id)).scalar() or 0
-            next_number = total_count + 1001
-        except:
-            next_number = 1001
-
-    order_num = f'AT-{next_number}-{current_year}'
-    return order_num
+    next_number = next_order_number(db, "AT", current_year, first_number=1001)
+    return f'AT-{next_number}-{current_year}'
 
 
 # ============================================================================
@@ -75,8 +42,10 @@ def generate_web_order_number(db: Session) -> str:
 # ============================================================================
 
 @router.post("/create", response_model=dict)
-async def create_web_order(
+def create_web_order(
     order_data: dict,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: Optional[dict] = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
@@ -100,19 +69,43 @@ async def create_web_order(
                 "articlenr": str,
                 "articlename": str,
                 "quantity": int,
-                "price_at_addition": float
+                "price_at_addition": float (ignored - prices come from productdata)
             }
         ],
         "subtotal": float,
         "tax_amount": float,
         "shipping": float,
         "total_amount": float,
-        "payment_method": str
+        "payment_method": str,
+        "guest_session_id": str (optional - server cart of a guest)
     }
+
+    Stock is reserved for STOCK_RESERVATION_MINUTES; 409 with the shortages
+    if an article doesn't have enough stock or has no inventory record at all.
+
+    With an Idempotency-Key header, repeats of the same request return the
+    first order instead of creating another one (api/utils/idempotency.py).
     """
+    user_id = current_user.user_id if current_user else None
+    body, replayed = run_idempotent(
+        db, "web-orders/create", idempotency_key,
+        {"user_id": user_id, "order": order_data},
+        lambda: place_web_order(order_data, current_user, db)
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return body
+
+
+def place_web_order(order_data: dict, current_user, db: Session) -> dict:
+    """Validate, price and store the order (see utils/checkout.py)"""
     try:
+        # Write the guest's hot server cart to the database before checkout
+        store = get_cart_store()
+        if store and order_data.get('guest_session_id'):
+            store.flush(db, order_data['guest_session_id'])
+
         # Validate required fields
-        print("[DEBUG] Step 1: Validating order data")
         if 'customer_info' not in order_data:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -125,81 +118,26 @@ async def create_web_order(
                 detail="cart_items cannot be empty"
             )
 
-        customer_info = order_data['customer_info']
-        cart_items = order_data['cart_items']
-        
-        # Get customer's country for VAT calculation
-        customer_country = customer_info.get('customer_country', 'AT')
-        print(f"[DEBUG] Customer country: {customer_country}")
-        
-        # FIXED PRICE STRATEGY: Price stays the SAME across all countries
-        # We just store different netto/tax breakdown for accounting
-        # The price_at_addition is already the FINAL price customer should pay
-        
-        subtotal = Decimal('0')
-        for item in cart_items:
-            # Keep the SAME price - no conversion needed
-            # The price in DB is already the target final price
-            original_price = Decimal(str(item['price_at_addition']))
-            quantity = item['quantity']
-            subtotal += original_price * quantity
-        
-        # Calculate shipping (free over 100 EUR)
-        shipping = Decimal('0') if subtotal >= 100 else Decimal('0')  # Free shipping for now
-        
-        # Total amount - SAME for all countries
-        total_amount = subtotal + shipping
-        
-        print(f"[DEBUG] Order totals (FIXED price) - Subtotal: {subtotal}, Shipping: {shipping}, Total: {total_amount}")
-
-        # Generate order number
-        print("[DEBUG] Step 2: Generating order number")
-        ordernr = generate_web_order_number(db)
-        print(f"[DEBUG] Generated order number: {ordernr}")
-
-        # Get user_id if authenticated
-        user_id = current_user.user_id if current_user else None
-        print(f"[DEBUG] Current user: {current_user}")
-        print(f"[DEBUG] User ID: {user_id}")
-
-        # Create web order
-        print("[DEBUG] Step 3: Creating WebOrder object")
-        web_order = WebOrder(
-            ordernr=ordernr,
-            shop_id=1,  # rinosbikeat shop
-            user_id=user_id,
-            customer_id=None,  # Will be linked later if customer exists
-            orderamount=total_amount,  # Use recalculated amount based on customer's country
-            currency='EUR',
-            payment_status='pending',
-            synced_to_erp=False,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-
-        print("[DEBUG] Step 4: Adding to database session")
-        db.add(web_order)
-
-        print("[DEBUG] Step 5: Flushing to get ID")
-        db.flush()  # Get web_order_id without committing
-        print(f"[DEBUG] Order flushed, ID: {web_order.web_order_id}")
-
-        # Store customer info (we'll need to create a web_order_customers table or similar)
-        # For now, we'll store it in a JSON field or separate table
-        # TODO: Create web_order_customer_info table to store delivery details
-
-        # Store order items
-        # TODO: Create web_order_items table to store cart items
-        # For now, we'll return success and the order can be completed
-
-        print("[DEBUG] Step 6: Committing transaction")
-        db.commit()
+        # The checkout form sends country names ('Österreich'), API clients codes
+        country_value = order_data['customer_info'].get('customer_country') or 'AT'
+        if not resolve_country(country_value):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid country: {country_value}"
+            )
 
-        print("[DEBUG] Step 7: Refreshing order object")
-        db.refresh(web_order)
+        # Re-price, reserve stock and insert order + lines in one transaction
+        # (utils/checkout.py); price_at_addition from the client is ignored.
+        # FIXED PRICE STRATEGY: the gross price is the same for every delivery
+        # country, so lines are priced like the cart (PRICE_COUNTRY), not in
+        # customer_country
+        web_order, lines, reserved_until = create_order(
+            db,
+            generate_web_order_number,
+            order_data['cart_items'],
+            user_id=current_user.user_id if current_user else None
+        )
 
-        # Return order details
-        print("[DEBUG] Step 8: Returning success response")
         return {
             "status": "success",
             "web_order_id": web_order.web_order_id,
@@ -208,11 +146,32 @@ async def create_web_order(
             "currency": web_order.currency,
             "payment_status": web_order.payment_status,
             "created_at": web_order.created_at.isoformat(),
+            "reserved_until": reserved_until.isoformat(),
+            "items": [
+                {
+                    "articlenr": line["articlenr"],
+                    "articlename": line["articlename"],
+                    "quantity": line["quantity"],
+                    "unit_price": float(line["unit_price"]),
+                    "line_total": float(line["line_total"])
+                }
+                for line in lines
+            ],
             "message": "Order created successfully. Proceed to payment."
         }
 
     except HTTPException:
         raise
+    except OutOfStock as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "shortages": e.shortages}
+        )
+    except CheckoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         db.rollback()
         import traceback
@@ -229,7 +188,7 @@ async def create_web_order(
 # ============================================================================
 
 @router.get("/{web_order_id}", response_model=dict)
-async def get_web_order(
+def get_web_order(
     web_order_id: int,
     db: Session = Depends(get_db)
 ):
@@ -246,9 +205,14 @@ async def get_web_order(
             detail="Order not found"
         )
 
+    items = db.query(WebOrderItem).filter(
+        WebOrderItem.web_order_id == web_order_id
+    ).order_by(WebOrderItem.web_order_item_id).all()
+
     return {
         "status": "success",
-        "order": web_order.to_dict()
+        "order": web_order.to_dict(),
+        "items": [item.to_dict() for item in items]
     }
 
 
@@ -258,7 +222,7 @@ async def get_web_order(
 
 @router.get("/", response_model=dict)
 @router.get("", response_model=dict)  # Handle both with and without trailing slash
-async def get_user_web_orders(
+def get_user_web_orders(
     current_user: dict = Depends(get_optional_user),
     db: Session = Depends(get_db)
 ):
@@ -287,7 +251,7 @@ async def get_user_web_orders(
 # ============================================================================
 
 @router.put("/{web_order_id}/payment-status", response_model=dict)
-async def update_payment_status(
+def update_payment_status(
     web_order_id: int,
     status_data: dict,
     db: Session = Depends(get_db)
@@ -317,6 +281,12 @@ async def update_payment_status(
     if 'payment_intent_id' in status_data:
         web_order.payment_intent_id = status_data['payment_intent_id']
 
+    # Paid orders keep their reserved stock, failed ones give it back
+    if web_order.payment_status == 'paid':
+        commit_reservations(db, web_order.web_order_id)
+    elif web_order.payment_status in ('failed', 'refunded', 'cancelled'):
+        release_reservations(db, web_order.web_order_id)
+
     web_order.updated_at = datetime.utcnow()
 
     db.commit()
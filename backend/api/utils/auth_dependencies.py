@@ -23,7 +23,7 @@ oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_e
 # DEPENDENCY: GET CURRENT USER
 # ============================================================================
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> WebUser:
@@ -125,7 +125,7 @@ async def require_verified_email(
 # OPTIONAL AUTHENTICATION
 # ============================================================================
 
-async def get_optional_user(
+def get_optional_user(
     token: Optional[str] = Depends(oauth2_scheme_optional),
     db: Session = Depends(get_db)
 ) -> Optional[WebUser]:
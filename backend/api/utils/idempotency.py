@@ -0,0 +1,300 @@
+"""
+Idempotency-Key support for POST endpoints
+Location: api/utils/idempotency.py
+
+A client sends the same Idempotency-Key header with every retry of one logical
+request (double submit, network retry). The first request runs; repeats get
+the stored response instead of creating another order / Stripe session.
+
+- Keys live in idempotency_keys for IDEMPOTENCY_KEY_TTL_HOURS. A key is
+  claimed with one INSERT ... ON CONFLICT, so only one request per key runs,
+  also across API instances. A duplicate arriving while the first one is still
+  running gets 409 (other instance) or waits for its result (same instance -
+  concurrent duplicates collapse onto the one in-flight execution).
+- The same key with a different request body is rejected with 422.
+- Failed requests are not stored; a retry with the same key runs again.
+- Requests without the header behave as before.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.connection import Base
+from models.order import IdempotencyKey
+
+
+MAX_KEY_LENGTH = 255
+
+# Response header set on replayed responses
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def ensure_idempotency_table(engine) -> None:
+    """Create idempotency_keys if missing (called on startup)"""
+    Base.metadata.create_all(bind=engine, tables=[IdempotencyKey.__table__])
+
+
+def request_hash(payload) -> str:
+    """Fingerprint of a request body (key order doesn't matter)"""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+def _claim(db: Session, scope: str, key: str, fingerprint: str, now: datetime) -> Optional[dict]:
+    """
+    Claim the key for this request
+
+    Returns None if claimed (new or expired key), else the existing row.
+    Runs on its own connection and commits at once, like the order number
+    counter, so other requests see the claim immediately.
+    """
+    with db.get_bind().begin() as conn:
+        claimed = conn.execute(text("""
+            INSERT INTO idempotency_keys
+                (scope, idempotency_key, request_hash, status, created_at, expires_at)
+            VALUES (:scope, :key, :hash, 'in_progress', :now, :lock_until)
+            ON CONFLICT (scope, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash,
+                status = 'in_progress',
+                response_body = NULL,
+                created_at = EXCLUDED.created_at,
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < :now
+            RETURNING idempotency_key
+        """), {
+            "scope": scope,
+            "key": key,
+            "hash": fingerprint,
+            "now": now,
+            "lock_until": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        }).first()
+        if claimed:
+            return None
+
+        return conn.execute(text("""
+            SELECT request_hash, status, response_body FROM idempotency_keys
+            WHERE scope = :scope AND idempotency_key = :key
+        """), {"scope": scope, "key": key}).mappings().first()
+
+
+def _complete(db: Session, scope: str, key: str, body, now: datetime) -> None:
+    with db.get_bind().begin() as conn:
+        conn.execute(text("""
+            UPDATE idempotency_keys
+            SET status = 'completed', response_body = :body, expires_at = :expires_at
+            WHERE scope = :scope AND idempotency_key = :key
+        """), {
+            "scope": scope,
+            "key": key,
+            "body": json.dumps(body),
+            "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        })
+
+
+def _release(db: Session, scope: str, key: str) -> None:
+    with db.get_bind().begin() as conn:
+        conn.execute(text("""
+            DELETE FROM idempotency_keys
+            WHERE scope = :scope AND idempotency_key = :key AND status = 'in_progress'
+        """), {"scope": scope, "key": key})
+
+
+def _replay(existing, fingerprint: str) -> dict:
+    """Stored response of a claimed key, or the error for this repeat"""
+    if existing["request_hash"] != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if existing["status"] == "completed":
+        return json.loads(existing["response_body"])
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still in progress"
+    )
+
+
+def _release_quietly(db: Session, scope: str, key: str) -> None:
+    try:
+        _release(db, scope, key)
+    except Exception as e:
+        print(f"[WARNING] Could not release idempotency key {scope}/{key}: {e}")
+
+
+def _complete_quietly(db: Session, scope: str, key: str, body) -> None:
+    try:
+        _complete(db, scope, key, body, datetime.utcnow())
+    except Exception as e:
+        # The request itself succeeded; a retry after IDEMPOTENCY_LOCK_SECONDS runs again
+        print(f"[WARNING] Could not store idempotent response {scope}/{key}: {e}")
+
+
+def _execute(db: Session, scope: str, key: str, fingerprint: str, fn: Callable) -> Tuple[dict, bool]:
+    existing = _claim(db, scope, key, fingerprint, datetime.utcnow())
+    if existing is not None:
+        return _replay(existing, fingerprint), True
+
+    try:
+        body = jsonable_encoder(fn())
+    except Exception:
+        _release_quietly(db, scope, key)
+        raise
+
+    _complete_quietly(db, scope, key, body)
+    return body, False
+
+
+async def _execute_async(db: Session, scope: str, key: str, fingerprint: str, fn: Callable) -> Tuple[dict, bool]:
+    existing = await run_in_threadpool(_claim, db, scope, key, fingerprint, datetime.utcnow())
+    if existing is not None:
+        return _replay(existing, fingerprint), True
+
+    try:
+        body = jsonable_encoder(await fn())
+    except Exception:
+        await run_in_threadpool(_release_quietly, db, scope, key)
+        raise
+
+    await run_in_threadpool(_complete_quietly, db, scope, key, body)
+    return body, False
+
+
+# ============================================================================
+# IN-FLIGHT COLLAPSING
+# ============================================================================
+
+class _Call:
+    """One in-flight execution that concurrent duplicates wait for"""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_inflight = {}  # (scope, key) -> _Call
+_inflight_lock = threading.Lock()
+
+
+def run_idempotent(db: Session, scope: str, key: Optional[str], payload, fn: Callable) -> Tuple[dict, bool]:
+    """
+    Run fn() once per (scope, key) and replay its response for repeats
+
+    Args:
+        db: Database session (its engine stores the keys)
+        scope: Endpoint name, keys are unique per scope
+        key: Idempotency-Key header value (None = just run fn)
+        payload: Request data that must match for a replay
+        fn: Does the actual work, returns a JSON-encodable response
+
+    Returns:
+        (response body, replayed)
+    """
+    if not key:
+        return jsonable_encoder(fn()), False
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"
+        )
+
+    fingerprint = request_hash(payload)
+    with _inflight_lock:
+        call = _inflight.get((scope, key))
+        leader = call is None
+        if leader:
+            call = _inflight[(scope, key)] = _Call(fingerprint)
+
+    if not leader:
+        if call.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if not call.done.wait(settings.IDEMPOTENCY_LOCK_SECONDS):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        if call.error is not None:
+            raise call.error
+        return call.result[0], True
+
+    try:
+        call.result = _execute(db, scope, key, fingerprint, fn)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop((scope, key), None)
+        call.done.set()
+
+
+_inflight_async = {}  # (scope, key) -> (fingerprint, asyncio.Future), event loop only
+
+
+async def run_idempotent_async(db: Session, scope: str, key: Optional[str], payload,
+                               fn: Callable) -> Tuple[dict, bool]:
+    """
+    run_idempotent() for async endpoints
+
+    fn is a coroutine function; the key storage runs in the threadpool and
+    concurrent duplicates wait for the in-flight execution on the event loop.
+    """
+    if not key:
+        return jsonable_encoder(await fn()), False
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"
+        )
+
+    fingerprint = request_hash(payload)
+    inflight = _inflight_async.get((scope, key))
+    if inflight is not None:
+        if inflight[0] != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        try:
+            body, _ = await asyncio.wait_for(
+                asyncio.shield(inflight[1]), settings.IDEMPOTENCY_LOCK_SECONDS
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress"
+            )
+        return body, True
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_async[(scope, key)] = (fingerprint, future)
+    try:
+        result = await _execute_async(db, scope, key, fingerprint, fn)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # retrieved - no warning when nobody waited
+        raise
+    finally:
+        _inflight_async.pop((scope, key), None)
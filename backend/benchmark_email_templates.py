@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Email Template Benchmark
+Compares the precompiled Jinja2 templates (api/email/template_engine.py)
+with the f-string functions they replaced (api/email/email_templates.py), per
+email and as a batch for many recipients, and checks that both produce the
+same emails. Speedups are f-string time / Jinja2 time (below 1.0x = Jinja2 is
+slower).
+
+Usage:
+    python benchmark_email_templates.py [rounds] [batch_size]
+    python benchmark_email_templates.py 2000 500
+"""
+
+import re
+import sys
+import os
+import time
+from datetime import datetime
+from decimal import Decimal
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from api.email import email_templates
+from api.email.template_engine import render_email, render_emails
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+BATCH_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+
+def sample_data():
+    """Template name -> variables, shaped like the email_notifications callers"""
+    items = [
+        {"articlenr": f"RB-{n:04d}", "articlename": f"RINOS Sandman {n}.0", "quantity": n % 3 + 1,
+         "price": Decimal("1299.00") + n}
+        for n in range(5)
+    ]
+    return {
+        "order_confirmation": {
+            "order_number": "WEB-2025-00042", "order_date": datetime(2025, 3, 14, 9, 30),
+            "customer_name": "Max Mustermann", "items": items,
+            "subtotal": Decimal("5450.42"), "vat_amount": Decimal("1090.08"),
+            "total_amount": Decimal("6540.50"), "currency": "EUR",
+            "billing_address": "Hauptstraße 1", "billing_city": "Wien",
+            "billing_postalcode": "1010", "billing_country": "AT",
+            "payment_method": "Kreditkarte",
+        },
+        "payment_receipt": {
+            "order_number": "WEB-2025-00042", "customer_name": "Max Mustermann",
+            "payment_date": datetime(2025, 3, 14, 9, 31), "amount": Decimal("6540.50"),
+            "currency": "EUR", "payment_method": "Kreditkarte",
+            "receipt_url": "https://pay.stripe.com/receipts/abc123",
+        },
+        "shipping_notification": {
+            "order_number": "WEB-2025-00042", "customer_name": "Max Mustermann",
+            "tracking_number": "00340434161234567890", "carrier": "DHL",
+            "estimated_delivery": "18.03.2025",
+        },
+        "email_verification": {
+            "user_name": "Max", "verification_url": "https://rinosbike.at/verify-email?token=abc123",
+        },
+        "password_reset": {
+            "user_name": "Max", "reset_url": "https://rinosbike.at/reset-password?token=abc123",
+        },
+    }
+
+
+def legacy_function(name):
+    return getattr(email_templates, f"get_{name}_template")
+
+
+def same_text(a: str, b: str) -> bool:
+    """Equal up to whitespace between tags and lines"""
+    normalize = lambda html: re.sub(r"\s+", " ", re.sub(r">\s+<", "><", html)).strip()
+    return normalize(a) == normalize(b)
+
+
+def time_calls(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6  # microseconds
+
+
+def main():
+    samples = sample_data()
+    print("=" * 60)
+    print(f"EMAIL TEMPLATE BENCHMARK: {ROUNDS} renders per email, batch of {BATCH_SIZE}")
+    print("=" * 60)
+
+    print("\nSame output (German):")
+    for name, data in samples.items():
+        match = same_text(legacy_function(name)(data), render_email(name, data, "de"))
+        print(f"  {name:<24} {'yes' if match else 'NO'}")
+
+    print("\nAverage cost per email (speedup vs. f-string):")
+    print(f"  {'template':<24} {'f-string':>11} {'jinja2':>11}")
+    for name, data in samples.items():
+        legacy = legacy_function(name)
+        old = time_calls(lambda: legacy(data), ROUNDS)
+        new = time_calls(lambda: render_email(name, data, "de"), ROUNDS)
+        print(f"  {name:<24} {old:8.1f} us {new:8.1f} us  ({old / new:5.2f}x)")
+
+    # Batch: one template for many recipients, mixed locales
+    data = samples["order_confirmation"]
+    recipients = [
+        {"customer_name": f"Kunde {n}", "order_number": f"WEB-2025-{n:05d}",
+         "locale": "en" if n % 4 == 0 else "de"}
+        for n in range(BATCH_SIZE)
+    ]
+    legacy = legacy_function("order_confirmation")
+    start = time.perf_counter()
+    for recipient in recipients:
+        legacy({**data, **recipient})
+    old = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    render_emails("order_confirmation", recipients, common=data)
+    new = (time.perf_counter() - start) * 1e3
+    print(f"\nBatch of {BATCH_SIZE} order confirmations (25% English):")
+    print(f"  f-string loop   {old:8.1f} ms")
+    print(f"  render_emails   {new:8.1f} ms  ({old / new:5.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
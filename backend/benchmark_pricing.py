@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Pricing Benchmark
+Compares per-price Decimal conversion (convert_price_by_country) with the
+batch integer engine (localize_prices / localize_cents_array) and checks that
+both give identical prices
+
+Usage:
+    python benchmark_pricing.py [page_size] [rounds]
+    python benchmark_pricing.py 24 2000
+"""
+
+import random
+import sys
+import os
+import time
+from decimal import Decimal
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.pricing import (
+    VAT_RATES, convert_price_by_country, localize_prices, localize_cents_array
+)
+
+PAGE_SIZE = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+
+def random_price():
+    """Shop-like gross price in EUR with cents (Numeric(10, 2))"""
+    return Decimal(random.randint(99, 899999)).scaleb(-2)
+
+
+def check_exactness(samples=200000):
+    """Every country, all prices up to 2000.00 EUR plus random larger ones"""
+    prices = [Decimal(c).scaleb(-2) for c in range(200000)]
+    prices += [Decimal(random.randint(0, 10**9)).scaleb(-2) for _ in range(samples // 10)]
+    mismatches = 0
+    for country in VAT_RATES:
+        batch = localize_prices(prices, country)
+        for price, localized in zip(prices, batch):
+            if localized != convert_price_by_country(price, country):
+                mismatches += 1
+    return len(prices) * len(VAT_RATES), mismatches
+
+
+def time_per_page(fn, pages):
+    start = time.perf_counter()
+    for page in pages:
+        fn(page)
+    return (time.perf_counter() - start) / len(pages) * 1e6  # microseconds
+
+
+def main():
+    random.seed(42)
+    print("=" * 60)
+    print(f"PRICING BENCHMARK: page size {PAGE_SIZE}, {ROUNDS} pages per country")
+    print("=" * 60)
+
+    checked, mismatches = check_exactness()
+    print(f"Exactness: {checked} conversions, {mismatches} mismatches")
+
+    pages = [[random_price() for _ in range(PAGE_SIZE)] for _ in range(ROUNDS)]
+    cent_pages = [[int(p.scaleb(2)) for p in page] for page in pages]
+
+    results = {"per price (Decimal)": 0.0, "localize_prices": 0.0}
+    try:
+        import numpy  # noqa: F401
+        results["localize_cents_array"] = 0.0
+    except ImportError:
+        pass
+
+    for country in VAT_RATES:
+        results["per price (Decimal)"] += time_per_page(
+            lambda page: [convert_price_by_country(p, country) for p in page], pages
+        )
+        results["localize_prices"] += time_per_page(
+            lambda page: localize_prices(page, country), pages
+        )
+        if "localize_cents_array" in results:
+            results["localize_cents_array"] += time_per_page(
+                lambda page: localize_cents_array(page, country), cent_pages
+            )
+
+    baseline = results["per price (Decimal)"] / len(VAT_RATES)
+    print(f"\nAverage cost per page of {PAGE_SIZE} prices:")
+    for name, total in results.items():
+        per_page = total / len(VAT_RATES)
+        print(f"  {name:<24} {per_page:8.1f} us  ({baseline / per_page:4.1f}x)")
+    if "localize_cents_array" not in results:
+        print("  (numpy not installed - localize_cents_array skipped)")
+
+
+if __name__ == "__main__":
+    main()
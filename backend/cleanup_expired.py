@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Cleanup Script
+Deletes abandoned guest carts, expired tokens and sessions, stale stock reservations,
+expired idempotency keys, old Stripe webhook events and old sent emails
+(see utils/cleanup.py for the rules)
+
+Usage:
+    python cleanup_expired.py              # delete and report
+    python cleanup_expired.py --dry-run    # only count
+    python cleanup_expired.py --vacuum     # also VACUUM (ANALYZE) the tables afterwards
+
+Suitable for a cron job / Railway scheduled task, e.g. every hour.
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.connection import engine, SessionLocal
+from utils.cleanup import run_cleanup, table_sizes, vacuum_tables
+
+
+def format_size(size):
+    if size is None:
+        return "-"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired carts, tokens and sessions")
+    parser.add_argument("--dry-run", action="store_true", help="only count matching rows")
+    parser.add_argument("--batch-size", type=int, default=None, help="rows per transaction")
+    parser.add_argument("--max-batches", type=int, default=100, help="max batches per table")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) afterwards")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        sizes_before = table_sizes(db)
+        report = run_cleanup(
+            db, dry_run=args.dry_run, batch_size=args.batch_size, max_batches=args.max_batches
+        )
+
+        print("\n" + "="*50)
+        print("Would delete:" if args.dry_run else "Deleted:")
+        print("="*50)
+        for name, count in report.items():
+            print(f"  {name:<28} {'failed' if count is None else count}")
+
+        if args.vacuum and not args.dry_run:
+            vacuum_tables(engine)
+
+        sizes_after = table_sizes(db)
+        if any(size is not None for size in sizes_after.values()):
+            print("\nTable sizes (incl. indexes):")
+            for table, size in sizes_after.items():
+                print(f"  {table:<28} {format_size(sizes_before.get(table))} -> {format_size(size)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -41,7 +41,74 @@ class Settings(BaseSettings):
     FROM_EMAIL: str = os.getenv("FROM_EMAIL", "info@rinosbike.at")
     FROM_NAME: str = "RINOS Bikes"
     SEND_EMAILS: bool = os.getenv("SEND_EMAILS", "true").lower() == "true"
-    
+
+    # Email outbox and SMTP connection pool (see api/email/email_outbox.py)
+    # Requests that queue emails send them right after their answer; the worker thread
+    # (not kept alive on serverless) and send_emails.py (cron) pick up retries
+    EMAIL_WORKER: bool = os.getenv("EMAIL_WORKER", "true").lower() == "true"
+    EMAIL_POLL_SECONDS: int = int(os.getenv("EMAIL_POLL_SECONDS", "10"))
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+    EMAIL_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+    EMAIL_SEND_LEASE_SECONDS: int = int(os.getenv("EMAIL_SEND_LEASE_SECONDS", "300"))  # Claimed emails are sent again after this
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "2"))
+    SMTP_IDLE_SECONDS: int = int(os.getenv("SMTP_IDLE_SECONDS", "60"))  # Idle connections are closed after this
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+
+    # Catalog cache (see utils/catalog_cache.py)
+    CATALOG_VERSION_CHECK_SECONDS: int = int(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "30"))
+    CATALOG_CACHE_MAX_AGE_SECONDS: int = int(os.getenv("CATALOG_CACHE_MAX_AGE_SECONDS", "3600"))
+
+    # Worker threads for sync routes (pool_size 10 + max_overflow 20 in database/connection.py)
+    THREADPOOL_SIZE: int = int(os.getenv("THREADPOOL_SIZE", "30"))
+
+    # Guest cart store with write-behind (see utils/cart_store.py)
+    # "" = guest carts in the database (default), "redis://host:6379/0" = shared by all
+    # instances (the only setting for replicas / serverless), "memory://" = single worker only
+    CART_STORE_URL: str = os.getenv("CART_STORE_URL", "")
+    CART_STORE_TTL_SECONDS: int = int(os.getenv("CART_STORE_TTL_SECONDS", "86400"))
+    CART_STORE_FLUSH_SECONDS: int = int(os.getenv("CART_STORE_FLUSH_SECONDS", "5"))
+
+    # Cleanup of abandoned guest carts, expired tokens and sessions (see utils/cleanup.py)
+    CLEANUP_INTERVAL_MINUTES: int = int(os.getenv("CLEANUP_INTERVAL_MINUTES", "0"))  # 0 = only via cleanup_expired.py
+    CLEANUP_BATCH_SIZE: int = int(os.getenv("CLEANUP_BATCH_SIZE", "1000"))
+    CLEANUP_GUEST_CART_DAYS: int = int(os.getenv("CLEANUP_GUEST_CART_DAYS", "30"))
+    CLEANUP_EMPTY_CART_HOURS: int = int(os.getenv("CLEANUP_EMPTY_CART_HOURS", "24"))
+    CLEANUP_WEBHOOK_EVENT_DAYS: int = int(os.getenv("CLEANUP_WEBHOOK_EVENT_DAYS", "30"))
+    CLEANUP_SENT_EMAIL_DAYS: int = int(os.getenv("CLEANUP_SENT_EMAIL_DAYS", "30"))
+
+    # Stock lookups from inventorydata are reused this long (see utils/stock.py)
+    STOCK_CACHE_SECONDS: int = int(os.getenv("STOCK_CACHE_SECONDS", "30"))
+
+    # Checkout holds stock this long for unpaid orders (see utils/checkout.py)
+    STOCK_RESERVATION_MINUTES: int = int(os.getenv("STOCK_RESERVATION_MINUTES", "30"))
+
+    # Idempotency-Key responses are replayed this long (see api/utils/idempotency.py)
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+    IDEMPOTENCY_LOCK_SECONDS: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))  # Max. time of one execution
+
+    # Stripe webhook inbox (see utils/webhook_inbox.py)
+    # Each webhook applies due events right after its answer; the worker thread (not
+    # kept alive on serverless) and process_webhooks.py (cron) pick up retries
+    STRIPE_WEBHOOK_WORKER: bool = os.getenv("STRIPE_WEBHOOK_WORKER", "true").lower() == "true"
+    STRIPE_WEBHOOK_POLL_SECONDS: int = int(os.getenv("STRIPE_WEBHOOK_POLL_SECONDS", "10"))
+    STRIPE_WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("STRIPE_WEBHOOK_MAX_ATTEMPTS", "10"))
+
+    # Payment gateway (see utils/payment_gateway.py)
+    PAYMENT_GATEWAY: str = os.getenv("PAYMENT_GATEWAY", "stripe")  # "fake" = simulated payments for load tests
+    PAYMENT_GATEWAY_FAKE_LATENCY_MS: int = int(os.getenv("PAYMENT_GATEWAY_FAKE_LATENCY_MS", "0"))
+    STRIPE_API_BASE: str = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")  # e.g. http://localhost:12111 for stripe-mock
+    STRIPE_API_TIMEOUT_SECONDS: float = float(os.getenv("STRIPE_API_TIMEOUT_SECONDS", "10"))
+    STRIPE_API_VERSION: str = os.getenv("STRIPE_API_VERSION", "")  # "" = the installed stripe library's version
+    STRIPE_MAX_CONCURRENCY: int = int(os.getenv("STRIPE_MAX_CONCURRENCY", "10"))  # Calls (and kept-alive connections) at once
+
+    # Payment status polling (see utils/payment_status.py)
+    PAYMENT_STATUS_CACHE_SECONDS: int = int(os.getenv("PAYMENT_STATUS_CACHE_SECONDS", "10"))  # Max. one Stripe lookup per payment this often
+    PAYMENT_STATUS_FINAL_CACHE_SECONDS: int = int(os.getenv("PAYMENT_STATUS_FINAL_CACHE_SECONDS", "3600"))  # succeeded / canceled / expired
+    PAYMENT_STATUS_CACHE_MAX_ENTRIES: int = int(os.getenv("PAYMENT_STATUS_CACHE_MAX_ENTRIES", "10000"))
+
+    # Cursor pagination: how long list totals are reused (see utils/pagination.py)
+    PAGINATION_COUNT_CACHE_SECONDS: int = int(os.getenv("PAGINATION_COUNT_CACHE_SECONDS", "60"))
+
     # CORS - Frontend URLs
     CORS_ORIGINS: list = [
         "http://localhost:3000",
@@ -0,0 +1,20 @@
+-- Migration: Catalog version counter
+-- Purpose: Lets every API worker detect catalog changes (ERP sync, admin edits)
+--          and refresh its in-memory catalog snapshot (utils/catalog_cache.py)
+-- Shop: rinosbikeat (default)
+
+-- ============================================================================
+-- CATALOG VERSION (single row)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO catalog_version (id, version, updated_at)
+VALUES (1, 1, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO NOTHING;
+
+COMMENT ON TABLE catalog_version IS 'Bumped after ERP sync and admin product edits to invalidate cached catalog snapshots';
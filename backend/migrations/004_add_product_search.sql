@@ -0,0 +1,41 @@
+-- Migration: Product search (full-text + trigram)
+-- Purpose: Ranked prefix search for /search/query and the admin product list
+--          without a sequential ILIKE scan of productdata (utils/product_search.py)
+-- Shop: rinosbikeat (default)
+--
+-- search_vector is a STORED generated column: Postgres recomputes it on every
+-- INSERT/UPDATE, so it stays correct when the ERP sync truncates and reloads
+-- productdata. No trigger or reindex job is needed.
+
+-- ============================================================================
+-- EXTENSIONS
+-- ============================================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ============================================================================
+-- SEARCH VECTOR
+-- ============================================================================
+-- Article names are indexed twice: German (stemmed, "Fahrräder" finds
+-- "Fahrrad") and simple (exact words, brand and model names).
+
+ALTER TABLE productdata ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(articlenr, '')), 'A') ||
+        setweight(to_tsvector('german', coalesce(articlename, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(articlename, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(manufacturer, '')), 'C')
+    ) STORED;
+
+-- ============================================================================
+-- INDEXES
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_productdata_search_vector
+    ON productdata USING GIN (search_vector);
+
+-- Substring matches on article numbers ("1234" finds "RB-1234-M")
+CREATE INDEX IF NOT EXISTS idx_productdata_articlenr_trgm
+    ON productdata USING GIN (articlenr gin_trgm_ops);
+
+COMMENT ON COLUMN productdata.search_vector IS 'Generated full-text vector for product search (articlenr, articlename, manufacturer)';
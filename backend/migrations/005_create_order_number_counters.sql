@@ -0,0 +1,41 @@
+-- Migration: Order number counters
+-- Purpose: Atomic per-shop, per-year order numbers (AT-NNNN-YYYY) instead of
+--          scanning all orders of the year on every checkout (utils/order_numbers.py)
+-- Shop: rinosbikeat (default)
+--
+-- The API also creates and seeds this table on startup, so running this
+-- migration by hand is optional.
+
+-- ============================================================================
+-- ORDER NUMBER COUNTERS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS order_number_counters (
+    shop_id TEXT NOT NULL DEFAULT 'rinosbikeat',
+    prefix TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    last_number INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (shop_id, prefix, year)
+);
+
+-- Continue after the highest existing web order number of every prefix and year
+INSERT INTO order_number_counters (shop_id, prefix, year, last_number)
+SELECT 'rinosbikeat', 'AT',
+       CAST(split_part(ordernr, '-', 3) AS INTEGER),
+       MAX(CAST(split_part(ordernr, '-', 2) AS INTEGER))
+FROM web_orders
+WHERE ordernr ~ '^AT-[0-9]+-[0-9]{4}$'
+GROUP BY split_part(ordernr, '-', 3)
+UNION ALL
+-- WEB-YYYY-NNNNN (generate_order_number in models/orders.py)
+SELECT 'rinosbikeat', 'WEB',
+       CAST(split_part(ordernr, '-', 2) AS INTEGER),
+       MAX(CAST(split_part(ordernr, '-', 3) AS INTEGER))
+FROM web_orders
+WHERE ordernr ~ '^WEB-[0-9]{4}-[0-9]+$'
+GROUP BY split_part(ordernr, '-', 2)
+ON CONFLICT (shop_id, prefix, year) DO UPDATE
+SET last_number = GREATEST(order_number_counters.last_number, EXCLUDED.last_number);
+
+COMMENT ON TABLE order_number_counters IS 'Last issued order number per shop, prefix and year (taken with INSERT ... ON CONFLICT ... RETURNING)';
@@ -0,0 +1,69 @@
+-- Migration: Unique keys for cart upserts
+-- Purpose: One cart per guest session / user and one line per article per cart,
+--          so /cart/add can use INSERT ... ON CONFLICT instead of read-modify-write
+-- Shop: rinosbikeat (default)
+--
+-- Existing duplicates (created by concurrent requests) are merged first:
+-- items move to the oldest cart of a session/user, duplicate lines are summed
+-- (capped at 100) into the oldest line.
+--
+-- The API runs the same statements on startup when one of the indexes is
+-- missing (ensure_cart_unique_keys in utils/cart_keys.py).
+
+-- ============================================================================
+-- MERGE DUPLICATE CARTS
+-- ============================================================================
+
+UPDATE cart_items ci
+SET cart_id = d.keep_id
+FROM (
+    SELECT cart_id, MIN(cart_id) OVER (PARTITION BY guest_session_id) AS keep_id
+    FROM shopping_carts
+    WHERE guest_session_id IS NOT NULL
+) d
+WHERE ci.cart_id = d.cart_id AND d.cart_id <> d.keep_id;
+
+UPDATE cart_items ci
+SET cart_id = d.keep_id
+FROM (
+    SELECT cart_id, MIN(cart_id) OVER (PARTITION BY user_id) AS keep_id
+    FROM shopping_carts
+    WHERE user_id IS NOT NULL
+) d
+WHERE ci.cart_id = d.cart_id AND d.cart_id <> d.keep_id;
+
+DELETE FROM shopping_carts c
+USING shopping_carts keep
+WHERE c.guest_session_id = keep.guest_session_id AND c.cart_id > keep.cart_id;
+
+DELETE FROM shopping_carts c
+USING shopping_carts keep
+WHERE c.user_id = keep.user_id AND c.cart_id > keep.cart_id;
+
+-- ============================================================================
+-- MERGE DUPLICATE CART LINES
+-- ============================================================================
+
+UPDATE cart_items ci
+SET quantity = LEAST(d.total_quantity, 100)
+FROM (
+    SELECT MIN(cart_item_id) AS keep_id, SUM(quantity) AS total_quantity
+    FROM cart_items
+    GROUP BY cart_id, articlenr
+    HAVING COUNT(*) > 1
+) d
+WHERE ci.cart_item_id = d.keep_id;
+
+DELETE FROM cart_items ci
+USING cart_items keep
+WHERE ci.cart_id = keep.cart_id
+  AND ci.articlenr = keep.articlenr
+  AND ci.cart_item_id > keep.cart_item_id;
+
+-- ============================================================================
+-- UNIQUE INDEXES (conflict targets for the upserts in api/routers/cart.py)
+-- ============================================================================
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_carts_guest_session_id ON shopping_carts(guest_session_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_carts_user_id ON shopping_carts(user_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_cart_articlenr ON cart_items(cart_id, articlenr);
@@ -0,0 +1,50 @@
+-- Migration: Web order lines and stock reservations
+-- Purpose: Store the lines of web orders with server-side prices and hold stock
+--          for unpaid orders (utils/checkout.py)
+-- Shop: rinosbikeat (default)
+--
+-- The API also creates both tables on startup, so running this migration by
+-- hand is optional.
+
+-- ============================================================================
+-- WEB ORDER ITEMS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS web_order_items (
+    web_order_item_id SERIAL PRIMARY KEY,
+    web_order_id INTEGER NOT NULL REFERENCES web_orders(web_order_id),
+    product_id INTEGER,  -- productdata.productid at checkout, no FK (see below)
+    articlenr TEXT NOT NULL,
+    articlename TEXT,
+    quantity INTEGER NOT NULL,
+    unit_price NUMERIC(10, 2) NOT NULL,
+    line_total NUMERIC(10, 2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_web_order_items_web_order_id ON web_order_items(web_order_id);
+
+-- Order lines are a snapshot (articlenr, articlename, prices) and must outlive
+-- catalog reloads: the ERP sync runs TRUNCATE productdata CASCADE, which would
+-- empty web_order_items through a foreign key. Databases created with an
+-- earlier version of this migration lose that key here.
+ALTER TABLE web_order_items DROP CONSTRAINT IF EXISTS web_order_items_product_id_fkey;
+
+-- ============================================================================
+-- STOCK RESERVATIONS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    reservation_id SERIAL PRIMARY KEY,
+    web_order_id INTEGER NOT NULL REFERENCES web_orders(web_order_id),
+    articlenr TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'held',
+    expires_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_stock_reservations_web_order_id ON stock_reservations(web_order_id);
+CREATE INDEX IF NOT EXISTS ix_stock_reservations_articlenr_status ON stock_reservations(articlenr, status);
+
+COMMENT ON TABLE stock_reservations IS 'Stock held for web orders: held until paid or expires_at, committed until the order is synced to the ERP';
@@ -0,0 +1,29 @@
+-- Migration: Idempotency keys
+-- Purpose: Replay the response of POST /web-orders/create and
+--          POST /payments/create-payment-intent for repeated Idempotency-Key
+--          headers instead of creating duplicate orders / Stripe sessions
+--          (api/utils/idempotency.py)
+-- Shop: rinosbikeat (default)
+--
+-- The API also creates this table on startup, so running this migration by
+-- hand is optional.
+
+-- ============================================================================
+-- IDEMPOTENCY KEYS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idempotency_key_id SERIAL PRIMARY KEY,
+    scope TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'in_progress',
+    response_body TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_idempotency_keys_scope_key ON idempotency_keys(scope, idempotency_key);
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expires_at ON idempotency_keys(expires_at);
+
+COMMENT ON TABLE idempotency_keys IS 'Stored responses per endpoint and Idempotency-Key; in_progress rows are claims of running requests';
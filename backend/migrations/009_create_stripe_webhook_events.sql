@@ -0,0 +1,30 @@
+-- Migration: Stripe webhook inbox
+-- Purpose: The Stripe webhook stores verified events here and answers at once;
+--          a worker applies them afterwards (utils/webhook_inbox.py)
+-- Shop: rinosbikeat (default)
+--
+-- The API also creates this table on startup, so running this migration by
+-- hand is optional.
+
+-- ============================================================================
+-- STRIPE WEBHOOK EVENTS
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS stripe_webhook_events (
+    webhook_event_id SERIAL PRIMARY KEY,
+    stripe_event_id TEXT NOT NULL UNIQUE,
+    event_type TEXT NOT NULL,
+    stripe_created INTEGER,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP,
+    received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_stripe_webhook_events_stripe_event_id ON stripe_webhook_events(stripe_event_id);
+CREATE INDEX IF NOT EXISTS ix_stripe_webhook_events_status ON stripe_webhook_events(status);
+
+COMMENT ON TABLE stripe_webhook_events IS 'Verified Stripe events (inbox): pending until applied by the webhook worker, then processed or failed';
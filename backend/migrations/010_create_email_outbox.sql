@@ -0,0 +1,29 @@
+-- Migration: Email outbox
+-- Purpose: send_email() queues emails here; a worker sends them over pooled
+--          SMTP connections and records the delivery status (api/email/email_outbox.py)
+-- Shop: rinosbikeat (default)
+--
+-- The API also creates this table on startup, so running this migration by
+-- hand is optional.
+
+-- ============================================================================
+-- EMAIL OUTBOX
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    email_id SERIAL PRIMARY KEY,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html_content TEXT NOT NULL,
+    text_content TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_status ON email_outbox(status);
+
+COMMENT ON TABLE email_outbox IS 'Queued emails: pending, sending while claimed by a worker (lease until next_attempt_at), then sent or failed (with last_error)';
@@ -16,11 +16,14 @@ from .user import Shop, WebUser, EmailVerificationToken, PasswordResetToken, Use
 from .cart import WebCart
 
 # Order models
-from .order import WebOrder, Order, OrderDetail, DeliveryOrder, ShoppingCart, CartItem, StripePaymentIntent
+from .order import WebOrder, Order, OrderDetail, DeliveryOrder, ShoppingCart, CartItem, StripePaymentIntent, WebOrderItem, StockReservation, IdempotencyKey, StripeWebhookEvent
 
 # Page models
 from .page import Page, PageBlock
 
+# Email models
+from .email import EmailOutbox
+
 __all__ = [
     # Product models
     'Product',
@@ -52,8 +55,15 @@ __all__ = [
     'ShoppingCart',
     'CartItem',
     'StripePaymentIntent',
+    'WebOrderItem',
+    'StockReservation',
+    'IdempotencyKey',
+    'StripeWebhookEvent',
 
     # Page models
     'Page',
     'PageBlock',
+
+    # Email models
+    'EmailOutbox',
 ]
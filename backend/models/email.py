@@ -0,0 +1,47 @@
+"""
+Email outbox model
+Emails are queued here by send_email() and delivered by the email worker
+(api/email/email_outbox.py)
+"""
+
+from sqlalchemy import Column, Integer, Text, DateTime
+from datetime import datetime
+from database.connection import Base
+
+
+class EmailOutbox(Base):
+    """
+    Email outbox - NEW table, one row per email to send
+    pending -> sending (claimed by a worker) -> sent, or back to pending for a
+    retry, or failed after EMAIL_MAX_ATTEMPTS
+    """
+    __tablename__ = "email_outbox"
+
+    email_id = Column(Integer, primary_key=True)
+
+    to_email = Column(Text, nullable=False)
+    subject = Column(Text, nullable=False)
+    html_content = Column(Text, nullable=False)
+    text_content = Column(Text)
+
+    # Delivery status
+    status = Column(Text, nullable=False, default='pending', index=True)  # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime)  # Retry time, or end of the lease while 'sending'
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            "email_id": self.email_id,
+            "to_email": self.to_email,
+            "subject": self.subject,
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "sent_at": self.sent_at.isoformat() if self.sent_at else None
+        }
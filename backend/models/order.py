@@ -4,7 +4,7 @@ Order models - Maps to your existing 'orderdata' table
 Plus related tables for order details and delivery
 """
 
-from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, Date, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, Date, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 import sys
@@ -140,6 +140,11 @@ class ShoppingCart(Base):
     Supports both logged-in users and guests
     """
     __tablename__ = "shopping_carts"
+    __table_args__ = (
+        # One cart per guest session / user (conflict targets of the cart upsert)
+        Index("uq_shopping_carts_guest_session_id", "guest_session_id", unique=True),
+        Index("uq_shopping_carts_user_id", "user_id", unique=True),
+    )
 
     cart_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('web_users.user_id'))
@@ -155,6 +160,10 @@ class CartItem(Base):
     Cart items - NEW table for items in shopping cart
     """
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # One line per article and cart (conflict target of /cart/add)
+        Index("uq_cart_items_cart_articlenr", "cart_id", "articlenr", unique=True),
+    )
 
     cart_item_id = Column(Integer, primary_key=True)
     cart_id = Column(Integer, ForeignKey('shopping_carts.cart_id'), index=True)
@@ -228,6 +237,83 @@ class WebOrder(Base):
         }
 
 
+class WebOrderItem(Base):
+    """
+    Web order lines - NEW table, one row per article of a web order
+    Prices are re-calculated on the server at checkout (not taken from the client)
+    articlenr, articlename and prices are a snapshot taken at checkout: lines must
+    outlive catalog reloads, so product_id is deliberately not a foreign key (the
+    ERP sync runs TRUNCATE productdata CASCADE)
+    """
+    __tablename__ = "web_order_items"
+
+    web_order_item_id = Column(Integer, primary_key=True)
+    web_order_id = Column(Integer, ForeignKey('web_orders.web_order_id'), nullable=False, index=True)
+    product_id = Column(Integer)  # productdata.productid at checkout time, no FK (see above)
+
+    articlenr = Column(Text, nullable=False)
+    articlename = Column(Text)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Numeric(10, 2), nullable=False)  # Gross, in the customer's country
+    line_total = Column(Numeric(10, 2), nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            "web_order_item_id": self.web_order_item_id,
+            "web_order_id": self.web_order_id,
+            "articlenr": self.articlenr,
+            "articlename": self.articlename,
+            "quantity": self.quantity,
+            "unit_price": float(self.unit_price) if self.unit_price else 0,
+            "line_total": float(self.line_total) if self.line_total else 0
+        }
+
+
+class StockReservation(Base):
+    """
+    Stock reservations - NEW table, stock held for web orders
+    'held' until payment (or expires_at), 'committed' once paid until the
+    order is synced to the ERP (whose inventorydata then contains the sale)
+    """
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_articlenr_status", "articlenr", "status"),
+    )
+
+    reservation_id = Column(Integer, primary_key=True)
+    web_order_id = Column(Integer, ForeignKey('web_orders.web_order_id'), nullable=False, index=True)
+    articlenr = Column(Text, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(Text, nullable=False, default='held')  # held, committed
+    expires_at = Column(DateTime)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdempotencyKey(Base):
+    """
+    Idempotency keys - NEW table, responses of POST requests sent with an
+    Idempotency-Key header (see api/utils/idempotency.py)
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        # One row per endpoint and key (conflict target of the claim)
+        Index("uq_idempotency_keys_scope_key", "scope", "idempotency_key", unique=True),
+    )
+
+    idempotency_key_id = Column(Integer, primary_key=True)
+    scope = Column(Text, nullable=False)  # Endpoint, e.g. 'web-orders/create'
+    idempotency_key = Column(Text, nullable=False)
+    request_hash = Column(Text, nullable=False)
+    status = Column(Text, nullable=False, default='in_progress')  # in_progress, completed
+    response_body = Column(Text)  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 class StripePaymentIntent(Base):
     """
     Stripe payment tracking - NEW table for payment intents
@@ -263,3 +349,25 @@ class StripePaymentIntent(Base):
             "status": self.status,
             "receipt_url": self.receipt_url
         }
+
+
+class StripeWebhookEvent(Base):
+    """
+    Stripe webhook inbox - NEW table, verified webhook events as received
+    The webhook only stores them; utils/webhook_inbox.py applies them
+    """
+    __tablename__ = "stripe_webhook_events"
+
+    webhook_event_id = Column(Integer, primary_key=True)
+    stripe_event_id = Column(Text, unique=True, nullable=False, index=True)  # evt_...
+    event_type = Column(Text, nullable=False)
+    stripe_created = Column(Integer)  # Event creation time at Stripe (unix seconds)
+    payload = Column(Text, nullable=False)  # Raw verified JSON
+
+    status = Column(Text, nullable=False, default='pending', index=True)  # pending, processed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime)
+
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime)
@@ -28,6 +28,7 @@ from utils.pricing import (
     apply_country_vat,
     validate_country_code
 )
+from utils.order_numbers import next_order_number
 
 
 router = APIRouter(prefix="/api/orders", tags=["Orders"])
@@ -38,22 +39,10 @@ router = APIRouter(prefix="/api/orders", tags=["Orders"])
 # ============================================================================
 
 def generate_order_number(db: Session) -> str:
-    """Generate unique order number"""
+    """Generate unique order number (atomic per-year counter, see utils/order_numbers.py)"""
     # Get current year
     year = datetime.now().year
-    
-    # Get last order number for this year
-    last_order = db.query(WebOrder).filter(
-        WebOrder.order_number.like(f"WEB-{year}-%")
-    ).order_by(WebOrder.web_order_id.desc()).first()
-    
-    if last_order:
-        # Extract number and increment
-        last_num = int(last_order.order_number.split("-")[-1])
-        next_num = last_num + 1
-    else:
-        # First order of the year
-        next_num = 1
+    next_num = next_order_number(db, "WEB", year, first_number=1)
     
     # Format: WEB-2025-00001
     return f"WEB-{year}-{next_num:05d}"
@@ -70,20 +59,21 @@ def calculate_order_totals(cart_items: List, country_code: str = "AT"):
     Returns:
         dict with subtotal, vat_amount, total_amount
     """
-    from utils.pricing import convert_price_by_country
+    from utils.pricing import convert_prices_by_country
     
     # Get VAT rate for country
     vat_rate = get_vat_rate(country_code)
     
     subtotal = Decimal("0.00")
     
+    # item.price is DB price (German BRUTTO with 19% VAT) - convert all at once
+    localized_prices = convert_prices_by_country(
+        [float(item.price) for item in cart_items], country_code
+    )
+    
     # Sum prices converted to target country
-    for item in cart_items:
-        # item.price is DB price (German BRUTTO with 19% VAT)
-        db_price = float(item.price)
-        # Convert to target country
-        localized_price = float(convert_price_by_country(db_price, country_code))
-        item_total = Decimal(str(localized_price)) * item.quantity
+    for item, localized_price in zip(cart_items, localized_prices):
+        item_total = localized_price * item.quantity
         subtotal += item_total
     
     # Calculate VAT for target country
@@ -260,13 +260,14 @@ class Product(Base):
 
         return data
     
-    def to_simple_dict(self, include_categories=True, db_session=None):
+    def to_simple_dict(self, include_categories=True, db_session=None, categories=None):
         """
         Simplified version for product listings
 
         Args:
             include_categories: Include category information
             db_session: Optional SQLAlchemy session for manual category loading
+            categories: Optional pre-loaded list of category dicts (see products_to_simple_dicts)
         """
         data = {
             "productid": self.productid,
@@ -286,7 +287,9 @@ class Product(Base):
         }
 
         # Include categories if requested
-        if include_categories:
+        if include_categories and categories is not None:
+            data["categories"] = categories
+        elif include_categories:
             try:
                 # If db_session provided, manually load categories to avoid lazy-loading issues
                 if db_session is not None:
@@ -344,6 +347,87 @@ class Product(Base):
         }
 
 
+# ============================================================================
+# BULK SERIALIZATION (for product listings)
+# ============================================================================
+
+def load_categories_for_products(db_session, product_ids):
+    """
+    Load categories for many products with a single articlecategory IN-query
+
+    Args:
+        db_session: SQLAlchemy session
+        product_ids: Iterable of productid values
+
+    Returns:
+        dict mapping productid -> list of category dicts (empty list if none)
+    """
+    product_ids = list({pid for pid in product_ids if pid is not None})
+    categories_by_product = {pid: [] for pid in product_ids}
+    if not product_ids:
+        return categories_by_product
+
+    rows = db_session.query(
+        product_category_association.c.productid,
+        Category
+    ).join(
+        Category,
+        Category.categoryid == product_category_association.c.categoryid
+    ).filter(
+        product_category_association.c.productid.in_(product_ids)
+    ).order_by(
+        product_category_association.c.productid,
+        Category.categoryid
+    ).all()
+
+    for productid, category in rows:
+        if category is not None:
+            categories_by_product[productid].append(category.to_dict())
+
+    return categories_by_product
+
+
+def products_to_simple_dicts(products, include_categories=True, db_session=None):
+    """
+    Serialize a list of products for listings with a constant number of queries
+
+    Categories for the whole page are fetched in one query instead of one
+    query per product (see Product.to_simple_dict).
+
+    Args:
+        products: List of Product instances
+        include_categories: Include category information
+        db_session: SQLAlchemy session used for the bulk category query
+
+    Returns:
+        List of dicts in the same shape as Product.to_simple_dict()
+    """
+    products = [p for p in products if p is not None]
+
+    if not include_categories:
+        return [p.to_simple_dict(include_categories=False) for p in products]
+
+    if db_session is None:
+        # Fall back to the (eager-loaded) ORM relationship
+        return [p.to_simple_dict(include_categories=True) for p in products]
+
+    try:
+        categories_by_product = load_categories_for_products(
+            db_session, [p.productid for p in products]
+        )
+    except Exception as e:
+        print(f"Error bulk loading categories: {e}")
+        categories_by_product = {}
+
+    return [
+        p.to_simple_dict(
+            include_categories=True,
+            categories=categories_by_product.get(p.productid, [])
+        )
+        for p in products
+    ]
+
+
 # Keep the availability and other models for backward compatibility
 class ProductAvailability(Base):
     """Product availability/stock"""
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Stripe Webhook Worker
+Applies Stripe events stored by the webhook (see utils/webhook_inbox.py)
+
+Usage:
+    python process_webhooks.py                  # apply due events and exit
+    python process_webhooks.py --loop           # keep polling (separate worker process)
+    python process_webhooks.py --retry-failed   # put failed events back in the queue first
+
+Use it instead of the in-process worker with STRIPE_WEBHOOK_WORKER=false, or
+to catch up after an outage. On serverless deployments (Vercel) run it as a
+cron job: each webhook applies its event right away, but only this retries
+failed events when no further webhook arrives.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from database.connection import SessionLocal
+from models.order import StripeWebhookEvent
+from utils.webhook_inbox import process_pending_events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply stored Stripe webhook events")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new events")
+    parser.add_argument("--retry-failed", action="store_true", help="retry events that failed for good")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.retry_failed:
+            retried = db.query(StripeWebhookEvent).filter(
+                StripeWebhookEvent.status == 'failed'
+            ).update({"status": "pending", "attempts": 0, "next_attempt_at": None}, synchronize_session=False)
+            db.commit()
+            print(f"[OK] {retried} failed events queued again")
+
+        while True:
+            report = process_pending_events(db)
+            if any(report.values()) or not args.loop:
+                print(f"[OK] Stripe events: {report['processed']} applied, {report['failed']} failed")
+            if not args.loop:
+                break
+            time.sleep(settings.STRIPE_WEBHOOK_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
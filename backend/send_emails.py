@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Email Worker
+Sends emails queued in the outbox (see api/email/email_outbox.py)
+
+Usage:
+    python send_emails.py                  # send due emails and exit
+    python send_emails.py --loop           # keep polling (separate worker process)
+    python send_emails.py --retry-failed   # put failed emails back in the queue first
+    python send_emails.py --status         # only show counts per status
+
+Use it instead of the in-process worker with EMAIL_WORKER=false, or to
+catch up after an SMTP outage. On serverless deployments (Vercel) run it as a
+cron job: requests send the emails they queue right away, but only this
+retries temporary failures when no further email is queued.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+
+from config import settings
+from database.connection import SessionLocal
+from models.email import EmailOutbox
+from api.email.email_outbox import send_pending_emails
+from api.email.email_service import smtp_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send queued emails")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new emails")
+    parser.add_argument("--retry-failed", action="store_true", help="retry emails that failed for good")
+    parser.add_argument("--status", action="store_true", help="only show counts per status")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.status:
+            for status, count in db.query(EmailOutbox.status, func.count(EmailOutbox.email_id)).group_by(EmailOutbox.status):
+                print(f"  {status:<10} {count}")
+            return
+
+        if args.retry_failed:
+            retried = db.query(EmailOutbox).filter(
+                EmailOutbox.status == 'failed'
+            ).update({"status": "pending", "attempts": 0, "next_attempt_at": None}, synchronize_session=False)
+            db.commit()
+            print(f"[OK] {retried} failed emails queued again")
+
+        while True:
+            report = send_pending_emails(db)
+            if any(report.values()) or not args.loop:
+                print(f"[OK] Emails: {report['sent']} sent, {report['retry']} to retry, {report['failed']} failed")
+            if not args.loop:
+                break
+            time.sleep(settings.EMAIL_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close()
+        smtp_pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ import os
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from api.email.email_service import test_email_connection, send_email, is_email_configured
+from api.email.email_service import test_email_connection, send_email_now, is_email_configured
 from config import settings
 
 
@@ -72,7 +72,8 @@ def main():
     
     print(f"   Sending to: {test_email}")
     
-    success = send_email(
+    # Directly, not through the outbox, to see the result here
+    success = send_email_now(
         to_email=test_email,
         subject="RINOS Bikes - Email System Test",
         html_content="""
@@ -0,0 +1,34 @@
+"""
+Shared fixtures
+
+Tests run against a throwaway SQLite database with all tables of the models;
+nothing connects to Postgres. The test_*.py scripts in the backend root are
+manual checks against a running server and are not collected (pytest.ini).
+"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database.connection import Base
+import models  # noqa: F401 - registers all tables on Base.metadata
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
@@ -0,0 +1,100 @@
+"""Async routes: the synchronous session never runs on the event loop"""
+
+import asyncio
+import inspect
+import json
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from api.main import app
+from api.routers import payments
+from database.connection import get_db
+from models.order import WebOrder
+from utils import payment_status
+from utils.payment_gateway import FakeGateway, set_gateway
+
+# `async def` routes that get a Session; each hands its database work to the
+# threadpool (run_in_threadpool) and only awaits the gateway on the loop.
+# Every other route with a Session has to be a plain `def`.
+ASYNC_ROUTES_WITH_SESSION = {
+    ("POST", "/api/payments/create-payment-intent"),
+    ("GET", "/api/payments/status/{payment_intent_id}"),
+    ("POST", "/api/payments/webhook"),
+    ("POST", "/api/payments/refund"),
+}
+
+
+def test_only_known_async_routes_get_a_session():
+    found = set()
+    for route in app.routes:
+        if not isinstance(route, APIRoute) or not inspect.iscoroutinefunction(route.endpoint):
+            continue
+        parameters = inspect.signature(route.endpoint).parameters.values()
+        if any(parameter.annotation is Session for parameter in parameters):
+            found.update((method, route.path) for method in route.methods)
+
+    assert found == ASYNC_ROUTES_WITH_SESSION
+
+
+@pytest.fixture
+def queries_on_loop(engine):
+    """One flag per SQL statement: True if it ran on a thread with a running event loop"""
+    flags = []
+
+    def record(*args):
+        try:
+            asyncio.get_running_loop()
+            flags.append(True)
+        except RuntimeError:
+            flags.append(False)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield flags
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    gateway = FakeGateway()
+    set_gateway(gateway)
+    payment_status._cache.clear()
+    api = FastAPI()
+    api.include_router(payments.router)
+    api.dependency_overrides[get_db] = lambda: db
+    yield TestClient(api), gateway
+    set_gateway(None)
+    payment_status._cache.clear()
+
+
+def test_payment_routes_query_off_the_event_loop(db, client, queries_on_loop, monkeypatch):
+    client, gateway = client
+    order = WebOrder(ordernr="AT-1001-2025", orderamount=Decimal("1200.00"), currency="EUR")
+    db.add(order)
+    db.commit()
+    queries_on_loop.clear()
+
+    created = client.post("/payments/create-payment-intent", json={
+        "order_id": order.web_order_id, "return_url": "https://rinosbike.at/order/1"
+    })
+    assert created.status_code == 200, created.text
+    session_id = created.json()["payment_intent_id"]
+
+    gateway.pay(session_id)
+    assert client.get(f"/payments/status/{session_id}").json()["status"] == "succeeded"
+
+    stripe_event = {"id": "evt_1", "type": "checkout.session.completed", "created": 1,
+                    "data": {"object": {"id": session_id, "object": "checkout.session",
+                                        "metadata": {"order_id": str(order.web_order_id)}}}}
+    monkeypatch.setattr(payments.stripe.Webhook, "construct_event", lambda *args: stripe_event)
+    monkeypatch.setattr(payments, "SessionLocal", lambda: db)
+    webhook = client.post("/payments/webhook", content=json.dumps(stripe_event),
+                          headers={"stripe-signature": "t=1,v1=test"})
+    assert webhook.status_code == 200
+
+    assert queries_on_loop and not any(queries_on_loop)
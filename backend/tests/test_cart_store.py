@@ -0,0 +1,104 @@
+"""Guest cart store with the in-memory backend and write-behind"""
+
+from decimal import Decimal
+
+import pytest
+
+from models import CartItem, ShoppingCart
+from utils.cart_store import MAX_LINE_QUANTITY, GuestCartStore, MemoryCartBackend
+
+
+@pytest.fixture
+def store():
+    return GuestCartStore(MemoryCartBackend(), ttl_seconds=3600)
+
+
+def _db_lines(db):
+    db.expire_all()
+    return {item.articlenr: item.quantity for item in db.query(CartItem).all()}
+
+
+def test_add_item_merges_lines_and_caps_quantity(store, db):
+    store.add_item(db, "guest-1", 1, "RB-1", 2, Decimal("1190.00"))
+    cart = store.add_item(db, "guest-1", 1, "RB-1", 99, Decimal("1190.00"))
+
+    assert len(cart.items) == 1
+    assert cart.items[0].quantity == MAX_LINE_QUANTITY
+
+
+def test_mutations_stay_in_the_store_until_flushed(store, db):
+    store.add_item(db, "guest-1", 1, "RB-1", 2, Decimal("1190.00"))
+
+    assert db.query(ShoppingCart).count() == 0
+    assert store.get(db, "guest-1", create=False).items[0].articlenr == "RB-1"
+
+
+def test_new_lines_have_temporary_ids(store, db):
+    cart = store.add_item(db, "guest-1", 1, "RB-1", 1, Decimal("10.00"))
+
+    assert cart.cart_id < 0 and cart.items[0].cart_item_id < 0
+    assert store.find_session(cart.items[0].cart_item_id) == "guest-1"
+
+
+def test_flush_writes_the_cart_and_adopts_database_ids(store, db):
+    temporary_id = store.add_item(db, "guest-1", 1, "RB-1", 2, Decimal("10.00")).items[0].cart_item_id
+    store.add_item(db, "guest-1", 2, "RB-2", 1, Decimal("5.50"))
+
+    cart_id = store.flush(db, "guest-1")
+
+    db_cart = db.query(ShoppingCart).one()
+    assert db_cart.cart_id == cart_id and db_cart.guest_session_id == "guest-1"
+    assert _db_lines(db) == {"RB-1": 2, "RB-2": 1}
+
+    cart = store.get(db, "guest-1")
+    db_ids = {item.articlenr: item.cart_item_id for item in db.query(CartItem).all()}
+    assert cart.cart_id == cart_id
+    assert {item.articlenr: item.cart_item_id for item in cart.items} == db_ids
+
+    # A client still holding the temporary id reaches the same line
+    assert store.find_session(temporary_id) == "guest-1"
+    store.set_quantity(db, "guest-1", temporary_id, 5)
+    store.flush(db, "guest-1")
+    assert _db_lines(db) == {"RB-1": 5, "RB-2": 1}
+
+
+def test_flush_removes_deleted_lines(store, db):
+    store.add_item(db, "guest-1", 1, "RB-1", 2, Decimal("10.00"))
+    store.add_item(db, "guest-1", 2, "RB-2", 1, Decimal("5.50"))
+    store.flush(db, "guest-1")
+    line = store.get(db, "guest-1").find_article("RB-1")
+
+    store.set_quantity(db, "guest-1", line.cart_item_id, 0)
+    store.flush(db, "guest-1")
+    assert _db_lines(db) == {"RB-2": 1}
+
+    store.clear(db, "guest-1")
+    store.flush(db, "guest-1")
+    assert _db_lines(db) == {}
+
+
+def test_set_quantity_of_unknown_line_returns_none(store, db):
+    store.add_item(db, "guest-1", 1, "RB-1", 1, Decimal("10.00"))
+
+    assert store.set_quantity(db, "guest-1", 123456, 3) is None
+
+
+def test_cold_cart_is_loaded_from_the_database(store, db, session_factory):
+    store.add_item(db, "guest-1", 1, "RB-1", 3, Decimal("10.00"))
+    store.flush(db, "guest-1")
+
+    other_instance = GuestCartStore(MemoryCartBackend(), ttl_seconds=3600)
+    cart = other_instance.get(session_factory(), "guest-1", create=False)
+
+    assert [(item.articlenr, item.quantity) for item in cart.items] == [("RB-1", 3)]
+    assert cart.items[0].price_at_addition == Decimal("10.00")
+    assert other_instance.get(db, "guest-2", create=False) is None
+
+
+def test_flush_dirty_writes_every_changed_cart_once(store, db, session_factory):
+    store.add_item(db, "guest-1", 1, "RB-1", 1, Decimal("10.00"))
+    store.add_item(db, "guest-2", 1, "RB-1", 2, Decimal("10.00"))
+
+    assert store.flush_dirty(session_factory) == 2
+    assert store.flush_dirty(session_factory) == 0
+    assert db.query(ShoppingCart).count() == 2
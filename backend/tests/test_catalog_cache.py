@@ -0,0 +1,145 @@
+"""Catalog snapshot: variation matrices, category tree and filter price range"""
+
+from decimal import Decimal
+
+import pytest
+
+from models.product import (
+    Category, Product, VariationCombinationData, VariationData, product_category_association
+)
+from utils.catalog_cache import VariationMatrix, build_category_tree, load_catalog_snapshot
+
+
+@pytest.fixture
+def catalog(db):
+    db.add_all([
+        Category(categoryid=1, category="Fahrräder", categorypath="Fahrräder"),
+        Category(categoryid=2, category="Gravel Bikes", categorypath="Fahrräder - Gravel Bikes"),
+        Category(categoryid=3, category="Zubehör", categorypath="Zubehör"),
+        Product(productid=1, articlenr="F1", isfatherarticle=True, articlename="Sandman",
+                priceEUR=Decimal("1190.00"), manufacturer="RINOS", productgroup="Bikes"),
+        Product(productid=2, articlenr="F1-S", fatherarticle="F1", isfatherarticle=False,
+                articlename="Sandman S", priceEUR=Decimal("1190.00"), colour="Schwarz", size="S"),
+        Product(productid=3, articlenr="F1-M", fatherarticle="F1", isfatherarticle=False,
+                articlename="Sandman M", priceEUR=Decimal("1190.00"), colour="Rot", size="M"),
+        Product(productid=4, articlenr="F2", isfatherarticle=True, articlename="Gaia",
+                priceEUR=Decimal("999.99"), manufacturer="RINOS", productgroup="Bikes"),
+        Product(productid=5, articlenr="X1", isfatherarticle=True, articlename="Flasche",
+                priceEUR=None, manufacturer="Other", productgroup="Teile"),
+    ])
+    db.flush()
+    db.execute(product_category_association.insert(), [
+        {"articlecategoryid": 1, "productid": 1, "categoryid": 2},
+        {"articlecategoryid": 2, "productid": 2, "categoryid": 2},
+        {"articlecategoryid": 3, "productid": 4, "categoryid": 1},
+    ])
+    db.add_all([
+        VariationData(fatherarticle="F1", variation="Größe", variationsortnr=2,
+                      variationvalue="M", variationvaluesortnr=2),
+        VariationData(fatherarticle="F1", variation="Größe", variationsortnr=2,
+                      variationvalue="S", variationvaluesortnr=1),
+        VariationData(fatherarticle="F1", variation="Farbe", variationsortnr=1,
+                      variationvalue="Schwarz", variationvaluesortnr=1),
+        VariationData(fatherarticle="F1", variation="Farbe", variationsortnr=1,
+                      variationvalue="Rot", variationvaluesortnr=2),
+        VariationCombinationData(variationcombinationid=1, fatherarticle="F1", articlenr="F1-M",
+                                 variation1="Farbe", variationvalue1="Rot",
+                                 variation2="Größe", variationvalue2="M"),
+        VariationCombinationData(variationcombinationid=2, fatherarticle="F1", articlenr="F1-S",
+                                 variation1="Farbe", variationvalue1="Schwarz",
+                                 variation2="Größe", variationvalue2="S"),
+    ])
+    db.commit()
+    return load_catalog_snapshot(db)
+
+
+def _category(categoryid, name, path):
+    return {"categoryid": categoryid, "category": name, "categorypath": path, "categoryimageurl": None}
+
+
+# ============================================================================
+# VARIATION MATRIX
+# ============================================================================
+
+def test_variation_options_follow_variationdata_order(catalog):
+    matrix = catalog.variation_matrix("F1")
+
+    assert list(matrix.variation_options) == ["Farbe", "Größe"]
+    assert matrix.variation_options["Farbe"] == ["Schwarz", "Rot"]
+    assert matrix.variation_options["Größe"] == ["S", "M"]
+
+
+def test_variation_lookup_ignores_selection_order(catalog):
+    matrix = catalog.variation_matrix("F1")
+
+    assert matrix.find_articlenr({"Farbe": "Rot", "Größe": "M"}) == "F1-M"
+    assert matrix.find_articlenr({"Größe": "S", "Farbe": "Schwarz"}) == "F1-S"
+    assert matrix.find_articlenr({"Farbe": "Rot", "Größe": "S"}) is None
+    assert matrix.find_articlenr({"Farbe": "Rot"}) is None
+
+
+def test_variations_grouped_by_child_attributes(catalog):
+    matrix = catalog.variation_matrix("F1")
+
+    assert [v["articlenr"] for v in matrix.variations] == ["F1-S", "F1-M"]
+    assert [v["articlenr"] for v in matrix.grouped_by_attribute["colour"]["Rot"]] == ["F1-M"]
+    assert set(matrix.grouped_by_attribute["size"]) == {"S", "M"}
+
+
+def test_values_without_definition_keep_order_of_appearance():
+    combinations = [
+        {"articlenr": f"A-{value}", "variation1": "Größe", "variationvalue1": value,
+         "variation2": None, "variationvalue2": None, "variation3": None, "variationvalue3": None}
+        for value in ("XL", "L", "S")
+    ]
+    definitions = [{"variation": "Größe", "variationvalue": "S"}]
+
+    matrix = VariationMatrix("A", [], definitions, combinations)
+
+    assert matrix.variation_options == {"Größe": ["S", "XL", "L"]}
+
+
+# ============================================================================
+# CATEGORY TREE
+# ============================================================================
+
+def test_category_tree_nests_by_path(catalog):
+    roots = {node["category"]: node for node in catalog.category_tree}
+
+    assert set(roots) == {"Fahrräder", "Zubehör"}
+    bikes = roots["Fahrräder"]
+    assert [child["category"] for child in bikes["children"]] == ["Gravel Bikes"]
+    gravel = bikes["children"][0]
+    assert (gravel["level"], gravel["product_count"], gravel["father_count"]) == (2, 2, 1)
+    assert (bikes["product_count"], bikes["father_count"]) == (1, 1)
+
+
+def test_category_tree_finds_parent_by_path_suffix():
+    categories = [
+        _category(1, "Rennräder", "Shop - Fahrräder - Rennräder"),
+        _category(2, "Aero", "Fahrräder - Rennräder - Aero"),
+        _category(3, "Waisenkind", "Unbekannt - Waisenkind"),
+        _category(4, "0", "0"),
+    ]
+
+    tree = build_category_tree(categories, {2: 5}, {})
+
+    assert [node["category"] for node in tree] == ["Waisenkind", "Rennräder"]
+    assert tree[1]["children"][0]["category"] == "Aero"
+    assert tree[1]["children"][0]["product_count"] == 5
+
+
+# ============================================================================
+# FILTERS
+# ============================================================================
+
+def test_filter_price_range_uses_country_prices(catalog):
+    assert catalog.available_filters("DE")["price_range"] == {"min": 999.99, "max": 1190.0}
+    # netto 840.33 * 1.20, 1000.00 * 1.20
+    assert catalog.available_filters("at")["price_range"] == {"min": 1008.4, "max": 1200.0}
+
+
+def test_filter_price_range_matches_facets(catalog):
+    facets = catalog.facet_counts(catalog.fathers, {}, country="IT")["facets"]
+
+    assert catalog.available_filters("IT")["price_range"] == facets["price_range"]
@@ -0,0 +1,168 @@
+"""Checkout: server-side prices, stock reservations and order line snapshots"""
+
+from decimal import Decimal
+from itertools import count
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routers import web_orders
+from database.connection import get_db
+from models.order import StockReservation, WebOrderItem
+from models.product import InventoryData, Product
+from utils.checkout import (
+    CheckoutError, NotStocked, OutOfStock, collect_quantities, create_order, release_reservations
+)
+from utils.order_numbers import ensure_order_number_counters
+
+
+@pytest.fixture
+def shop(db):
+    db.add_all([
+        Product(productid=1, articlenr="RB-1", articlename="Sandman", priceEUR=Decimal("1190.00")),
+        Product(productid=2, articlenr="RB-2", articlename="Flasche", priceEUR=Decimal("11.90")),
+        Product(productid=3, articlenr="RB-3", articlename="Ohne Preis", priceEUR=None),
+        Product(productid=4, articlenr="RB-4", articlename="Ohne Lager", priceEUR=Decimal("5.95")),
+        InventoryData(inventoryid=1, articlenr="RB-1", locationid=1, quantity=2),
+        InventoryData(inventoryid=2, articlenr="RB-1", locationid=2, quantity=1),
+        InventoryData(inventoryid=3, articlenr="RB-2", locationid=1, quantity=50),
+    ])
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def client(engine, shop):
+    ensure_order_number_counters(engine)
+    app = FastAPI()
+    app.include_router(web_orders.router)
+    app.dependency_overrides[get_db] = lambda: shop
+    return TestClient(app)
+
+
+def checkout_payload(country):
+    """Order as frontend/app/checkout/page.tsx posts it"""
+    return {
+        "customer_info": {
+            "customer_frontname": "Anna",
+            "customer_surname": "Muster",
+            "customer_email": "anna@example.com",
+            "customer_telephone": "",
+            "customer_adress": "Hauptstraße 1",
+            "customer_postalcode": "1010",
+            "customer_city": "Wien",
+            "customer_country": country,
+        },
+        "cart_items": [
+            {"articlenr": "RB-1", "articlename": "Sandman", "quantity": 1, "price_at_addition": 1200},
+        ],
+        "subtotal": 1200,
+        "tax_amount": 228,
+        "shipping": 0,
+        "total_amount": 1428,
+        "payment_method": "stripe",
+    }
+
+
+@pytest.fixture
+def ordernr():
+    numbers = count(1001)
+    return lambda db: f"AT-{next(numbers)}-2025"
+
+
+def test_collect_quantities_adds_up_duplicate_lines():
+    lines = [{"articlenr": "RB-1", "quantity": 1}, {"articlenr": "RB-2", "quantity": "2"},
+             {"articlenr": "RB-1", "quantity": 2}]
+
+    assert collect_quantities(lines) == {"RB-1": 3, "RB-2": 2}
+
+
+@pytest.mark.parametrize("line", [
+    {"articlenr": "RB-1", "quantity": 0},
+    {"articlenr": "RB-1", "quantity": "zwei"},
+    {"articlenr": "", "quantity": 1},
+])
+def test_collect_quantities_rejects_bad_lines(line):
+    with pytest.raises(CheckoutError):
+        collect_quantities([line])
+
+
+def test_order_uses_server_prices_of_the_country(shop, ordernr):
+    cart = [{"articlenr": "RB-1", "quantity": 1, "price_at_addition": 1.00},
+            {"articlenr": "RB-2", "quantity": 2, "price_at_addition": 0.01}]
+
+    order, lines, _ = create_order(shop, ordernr, cart, "AT")
+
+    assert order.ordernr == "AT-1001-2025"
+    assert order.orderamount == Decimal("1224.00")
+    assert [(line["articlenr"], line["unit_price"]) for line in lines] == [
+        ("RB-1", Decimal("1200.00")), ("RB-2", Decimal("12.00"))
+    ]
+    assert shop.query(StockReservation).filter_by(web_order_id=order.web_order_id).count() == 2
+
+
+def test_unknown_or_unpriced_articles_are_rejected(shop, ordernr):
+    for articlenr in ("RB-404", "RB-3"):
+        with pytest.raises(CheckoutError):
+            create_order(shop, ordernr, [{"articlenr": articlenr, "quantity": 1}], "AT")
+
+
+def test_reservations_count_against_stock_until_released(shop, ordernr):
+    order, _, _ = create_order(shop, ordernr, [{"articlenr": "RB-1", "quantity": 2}], "AT")
+
+    with pytest.raises(OutOfStock) as error:
+        create_order(shop, ordernr, [{"articlenr": "RB-1", "quantity": 2}], "AT")
+    assert error.value.shortages == [{"articlenr": "RB-1", "requested": 2, "available": 1}]
+
+    release_reservations(shop, order.web_order_id)
+    shop.commit()
+    create_order(shop, ordernr, [{"articlenr": "RB-1", "quantity": 3}], "AT")
+
+
+def test_order_lines_are_a_snapshot_without_product_foreign_key(shop, ordernr):
+    order, _, _ = create_order(shop, ordernr, [{"articlenr": "RB-2", "quantity": 1}], "DE")
+
+    # The ERP sync runs TRUNCATE productdata CASCADE - order lines must not be reached by it
+    assert not WebOrderItem.__table__.c.product_id.foreign_keys
+    shop.query(Product).delete()
+    shop.commit()
+
+    line = shop.query(WebOrderItem).filter_by(web_order_id=order.web_order_id).one()
+    assert (line.articlenr, line.articlename, line.unit_price) == ("RB-2", "Flasche", Decimal("11.90"))
+
+
+@pytest.mark.parametrize("country", ["Österreich", "Deutschland", "Schweiz", "AT", "de"])
+def test_checkout_form_payload_creates_an_order(client, country):
+    response = client.post("/web-orders/create", json=checkout_payload(country))
+
+    assert response.status_code == 200, response.text
+    # Charged the gross price the cart showed (AT), whatever the delivery country
+    assert response.json()["orderamount"] == 1200.00
+    assert response.json()["items"][0]["unit_price"] == 1200.00
+
+
+def test_unknown_country_is_rejected(client):
+    response = client.post("/web-orders/create", json=checkout_payload("Atlantis"))
+
+    assert response.status_code == 400
+    assert "Atlantis" in response.json()["detail"]
+
+
+def test_articles_without_inventory_rows_are_not_orderable(shop, ordernr):
+    cart = [{"articlenr": "RB-4", "quantity": 1}, {"articlenr": "RB-2", "quantity": 1}]
+
+    with pytest.raises(NotStocked) as error:
+        create_order(shop, ordernr, cart, "AT")
+    assert error.value.shortages == [{"articlenr": "RB-4", "requested": None, "available": 0}]
+    assert shop.query(StockReservation).count() == 0
+
+
+def test_unstocked_article_gets_a_409_with_a_clear_message(client):
+    payload = checkout_payload("Österreich")
+    payload["cart_items"] = [{"articlenr": "RB-4", "quantity": 1, "price_at_addition": 6}]
+
+    response = client.post("/web-orders/create", json=payload)
+
+    assert response.status_code == 409
+    assert "no inventory record" in response.json()["detail"]["message"]
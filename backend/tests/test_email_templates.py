@@ -0,0 +1,180 @@
+"""Email templates: German and English variants, locale fallback and escaping"""
+
+import re
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from api.email import email_notifications, email_templates
+from api.email.template_engine import (
+    LOCALES, TEMPLATE_NAMES, normalize_locale, render_email, render_emails, render_subject
+)
+
+ORDER = {
+    "order_number": "AT-1001-2025", "order_date": datetime(2025, 3, 14, 9, 30),
+    "customer_name": "Max Mustermann",
+    "items": [
+        {"articlenr": "RB-1", "articlename": "RINOS Sandman 1.0", "quantity": 2, "price": Decimal("1299.00")},
+        {"articlenr": "RB-2", "articlename": "RINOS Odin 2.0", "quantity": 1, "price": Decimal("2499.50")},
+    ],
+    "subtotal": Decimal("4248.75"), "vat_amount": Decimal("849.75"),
+    "total_amount": Decimal("5098.50"), "currency": "EUR",
+    "billing_address": "Hauptstraße 1", "billing_city": "Wien",
+    "billing_postalcode": "1010", "billing_country": "AT", "payment_method": "Kreditkarte",
+}
+
+SAMPLES = {
+    "order_confirmation": ORDER,
+    "payment_receipt": {
+        "order_number": "AT-1001-2025", "customer_name": "Max Mustermann",
+        "payment_date": datetime(2025, 3, 14, 9, 31), "amount": Decimal("5098.50"),
+        "currency": "EUR", "payment_method": "Kreditkarte",
+        "receipt_url": "https://pay.stripe.com/receipts/abc123",
+    },
+    "shipping_notification": {
+        "order_number": "AT-1001-2025", "customer_name": "Max Mustermann",
+        "tracking_number": "00340434161234567890", "carrier": "DHL", "estimated_delivery": "18.03.2025",
+    },
+    "email_verification": {
+        "user_name": "Max", "verification_url": "https://rinosbike.at/verify-email?token=abc123",
+    },
+    "password_reset": {
+        "user_name": "Max", "reset_url": "https://rinosbike.at/reset-password?token=abc123",
+    },
+}
+
+HEADINGS = {
+    "de": {
+        "order_confirmation": "Vielen Dank für Ihre Bestellung!",
+        "payment_receipt": "Zahlung erfolgreich!",
+        "shipping_notification": "Ihre Bestellung wurde versendet!",
+        "email_verification": "Willkommen bei RINOS Bikes!",
+        "password_reset": "Passwort zurücksetzen",
+    },
+    "en": {
+        "order_confirmation": "Thank you for your order!",
+        "payment_receipt": "Payment successful!",
+        "shipping_notification": "Your order has shipped!",
+        "email_verification": "Welcome to RINOS Bikes!",
+        "password_reset": "Reset your password",
+    },
+}
+
+
+def same_text(a: str, b: str) -> bool:
+    """Equal up to whitespace between tags and lines"""
+    normalize = lambda html: re.sub(r"\s+", " ", re.sub(r">\s+<", "><", html)).strip()
+    return normalize(a) == normalize(b)
+
+
+def test_samples_cover_every_template():
+    assert set(SAMPLES) == set(TEMPLATE_NAMES)
+
+
+@pytest.mark.parametrize("locale", LOCALES)
+@pytest.mark.parametrize("name", TEMPLATE_NAMES)
+def test_every_template_renders_in_both_languages(name, locale):
+    html = render_email(name, SAMPLES[name], locale)
+    other = "en" if locale == "de" else "de"
+
+    assert html.startswith("<!DOCTYPE html>")
+    assert f'<html lang="{locale}">' in html
+    assert HEADINGS[locale][name] in html
+    assert HEADINGS[other][name] not in html
+    assert "{{" not in html and "{%" not in html
+
+
+@pytest.mark.parametrize("name", TEMPLATE_NAMES)
+def test_german_emails_match_the_previous_templates(name):
+    legacy = getattr(email_templates, f"get_{name}_template")
+    assert same_text(legacy(SAMPLES[name]), render_email(name, SAMPLES[name], "de"))
+
+
+@pytest.mark.parametrize("locale, order_date", [("de", "14.03.2025 09:30"), ("en", "14/03/2025 09:30")])
+def test_order_lines_and_totals_are_formatted(locale, order_date):
+    html = render_email("order_confirmation", ORDER, locale)
+
+    for item in ORDER["items"]:
+        assert item["articlename"] in html and item["articlenr"] in html
+    assert "1,299.00 EUR" in html
+    assert "5,098.50 EUR" in html
+    assert order_date in html
+
+
+@pytest.mark.parametrize("locale, expected", [
+    ("de", "de"), ("en", "en"), ("en-GB", "en"), ("de_AT", "de"), ("EN", "en"),
+    ("fr", "de"), ("", "de"), (None, "de"),
+])
+def test_locale_normalization(locale, expected):
+    assert normalize_locale(locale) == expected
+
+
+def test_unknown_language_gets_the_german_email():
+    data = {**SAMPLES["password_reset"], "locale": "fr"}
+
+    assert render_email("password_reset", data) == render_email("password_reset", SAMPLES["password_reset"], "de")
+    assert render_subject("password_reset", data) == "Passwort zurücksetzen - RINOS Bikes"
+
+
+def test_locale_argument_wins_over_data():
+    html = render_email("email_verification", {**SAMPLES["email_verification"], "locale": "de"}, "en")
+    assert HEADINGS["en"]["email_verification"] in html
+
+
+def test_subjects_are_localized():
+    assert render_subject("order_confirmation", ORDER, "de") == "Bestellbestätigung - Bestellung AT-1001-2025"
+    assert render_subject("order_confirmation", ORDER, "en") == "Order confirmation - Order AT-1001-2025"
+
+
+def test_customer_input_is_escaped():
+    data = {**ORDER, "customer_name": "<script>alert(1)</script>",
+            "items": [{**ORDER["items"][0], "articlename": 'Bike "Pro" & <b>Co</b>'}]}
+
+    html = render_email("order_confirmation", data, "de")
+
+    assert "<script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+    assert "Bike &#34;Pro&#34; &amp; &lt;b&gt;Co&lt;/b&gt;" in html
+
+
+def test_unknown_template_is_an_error():
+    with pytest.raises(ValueError):
+        render_email("newsletter", {}, "de")
+
+
+def test_batch_renders_each_recipient_in_their_language():
+    recipients = [
+        {"user_name": "Anna", "locale": "en"},
+        {"user_name": "Bernd", "locale": "de-AT"},
+        {"user_name": "Chloé", "locale": "fr"},
+    ]
+    common = {"reset_url": "https://rinosbike.at/reset-password?token=abc123"}
+
+    rendered = render_emails("password_reset", recipients, common=common)
+
+    assert rendered == [
+        render_email("password_reset", {**common, "user_name": "Anna"}, "en"),
+        render_email("password_reset", {**common, "user_name": "Bernd"}, "de"),
+        render_email("password_reset", {**common, "user_name": "Chloé"}, "de"),
+    ]
+
+
+@pytest.mark.parametrize("language_preference, heading, subject", [
+    ("en", HEADINGS["en"]["password_reset"], "Reset your password - RINOS Bikes"),
+    ("de", HEADINGS["de"]["password_reset"], "Passwort zurücksetzen - RINOS Bikes"),
+    (None, HEADINGS["de"]["password_reset"], "Passwort zurücksetzen - RINOS Bikes"),
+])
+def test_user_emails_use_the_language_preference(monkeypatch, language_preference, heading, subject):
+    sent = []
+    monkeypatch.setattr(email_notifications, "send_email",
+                        lambda to_email, subject, html_content: sent.append((subject, html_content)) or True)
+    user = SimpleNamespace(first_name="Max", email="max@example.com", language_preference=language_preference)
+
+    assert email_notifications.send_password_reset_from_user(user, "abc123")
+
+    [(sent_subject, html)] = sent
+    assert sent_subject == subject
+    assert heading in html
+    assert "https://rinosbike.at/reset-password?token=abc123" in html
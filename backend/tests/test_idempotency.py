@@ -0,0 +1,134 @@
+"""Idempotency-Key handling"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from api.utils.idempotency import run_idempotent, run_idempotent_async
+from models.order import IdempotencyKey
+
+
+class Counter:
+    """fn for run_idempotent that counts its executions"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"order_id": self.calls}
+
+
+def test_without_key_every_request_runs(db):
+    fn = Counter()
+
+    run_idempotent(db, "orders", None, {"a": 1}, fn)
+    run_idempotent(db, "orders", None, {"a": 1}, fn)
+
+    assert fn.calls == 2
+
+
+def test_repeat_gets_the_stored_response(db, session_factory):
+    fn = Counter()
+
+    first = run_idempotent(db, "orders", "key-1", {"a": 1, "b": [1, 2]}, fn)
+    # Key order of the body doesn't matter; another session (instance) sees the key
+    repeat = run_idempotent(session_factory(), "orders", "key-1", {"b": [1, 2], "a": 1}, fn)
+
+    assert first == ({"order_id": 1}, False)
+    assert repeat == ({"order_id": 1}, True)
+    assert fn.calls == 1
+
+
+def test_keys_are_per_scope(db):
+    fn = Counter()
+
+    run_idempotent(db, "orders", "key-1", {"a": 1}, fn)
+    run_idempotent(db, "payments", "key-1", {"a": 1}, fn)
+
+    assert fn.calls == 2
+
+
+def test_same_key_with_another_body_is_rejected(db):
+    run_idempotent(db, "orders", "key-1", {"a": 1}, Counter())
+
+    with pytest.raises(HTTPException) as error:
+        run_idempotent(db, "orders", "key-1", {"a": 2}, Counter())
+    assert error.value.status_code == 422
+
+
+def test_too_long_key_is_rejected(db):
+    with pytest.raises(HTTPException) as error:
+        run_idempotent(db, "orders", "k" * 256, {}, Counter())
+    assert error.value.status_code == 400
+
+
+def test_failed_request_releases_the_key(db):
+    def fail():
+        raise RuntimeError("Stripe down")
+
+    with pytest.raises(RuntimeError):
+        run_idempotent(db, "orders", "key-1", {"a": 1}, fail)
+    assert db.query(IdempotencyKey).count() == 0
+
+    assert run_idempotent(db, "orders", "key-1", {"a": 1}, Counter()) == ({"order_id": 1}, False)
+
+
+def test_concurrent_duplicates_collapse_onto_one_execution(session_factory):
+    started, finish = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return {"order_id": 7}
+
+    def request(_):
+        db = session_factory()
+        try:
+            return run_idempotent(db, "orders", "key-1", {"a": 1}, slow)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(request, 0)
+        assert started.wait(5)
+        duplicates = [pool.submit(request, n) for n in range(1, 4)]
+        finish.set()
+        results = [leader.result()] + [d.result() for d in duplicates]
+
+    assert len(calls) == 1
+    assert results[0] == ({"order_id": 7}, False)
+    assert all(result == ({"order_id": 7}, True) for result in results[1:])
+
+
+def test_async_duplicates_collapse_and_errors_release(db):
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"session": "cs_1"}
+
+    async def fail():
+        raise RuntimeError("Stripe down")
+
+    async def scenario():
+        results = await asyncio.gather(*[
+            run_idempotent_async(db, "payments", "key-1", {"order_id": 1}, create) for _ in range(3)
+        ])
+        with pytest.raises(RuntimeError):
+            await run_idempotent_async(db, "payments", "key-2", {"order_id": 2}, fail)
+        retried = await run_idempotent_async(db, "payments", "key-2", {"order_id": 2}, create)
+        return results, retried
+
+    results, retried = asyncio.run(scenario())
+
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+    assert all(body == {"session": "cs_1"} for body, _ in results)
+    assert retried == ({"session": "cs_1"}, False)
+    assert len(calls) == 2
@@ -0,0 +1,49 @@
+"""Atomic order number counters"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.order_numbers import ensure_order_number_counters, next_order_number
+
+
+@pytest.fixture
+def counters(engine, db):
+    # The seed is Postgres-only SQL; on SQLite it's skipped with a warning
+    ensure_order_number_counters(engine)
+    return db
+
+
+def test_counter_starts_at_first_number_and_increments(counters):
+    numbers = [next_order_number(counters, "AT", 2025, first_number=1001) for _ in range(3)]
+
+    assert numbers == [1001, 1002, 1003]
+
+
+def test_counters_are_per_prefix_and_year(counters):
+    next_order_number(counters, "AT", 2025, first_number=1001)
+
+    assert next_order_number(counters, "AT", 2026, first_number=1001) == 1001
+    assert next_order_number(counters, "WEB", 2025) == 1
+    assert next_order_number(counters, "AT", 2025, shop_id="other") == 1
+
+
+def test_counter_is_independent_of_the_callers_transaction(counters):
+    next_order_number(counters, "AT", 2025, first_number=1001)
+    counters.rollback()
+
+    assert next_order_number(counters, "AT", 2025, first_number=1001) == 1002
+
+
+def test_concurrent_checkouts_get_distinct_numbers(counters, session_factory):
+    def take(_):
+        db = session_factory()
+        try:
+            return next_order_number(db, "AT", 2025, first_number=1001)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        numbers = list(pool.map(take, range(20)))
+
+    assert sorted(numbers) == list(range(1001, 1021))
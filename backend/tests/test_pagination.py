@@ -0,0 +1,134 @@
+"""Cursor encoding and keyset pagination"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, MetaData, Numeric, Table, Text
+
+from api.routers import products
+from database.connection import get_db
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+
+
+# ============================================================================
+# CURSORS
+# ============================================================================
+
+def test_cursor_round_trip_keeps_types():
+    values = [False, "Bikes", Decimal("1190.00"), datetime(2025, 3, 14, 9, 30), date(2025, 3, 14), None, 42]
+
+    decoded = decode_cursor(encode_cursor(values), len(values))
+
+    assert decoded == values
+    assert [type(v) for v in decoded] == [type(v) for v in values]
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(["ä/ö+ü?" * 5, 1])
+
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    "e30",                      # {} - not a list
+    encode_cursor([1, 2])[:-3],  # truncated
+    base64.urlsafe_b64encode(json.dumps([{"x": 1}]).encode()).decode(),  # unknown value type
+    base64.urlsafe_b64encode(json.dumps([{"d": "abc"}]).encode()).decode(),  # broken Decimal
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 1)
+
+
+def test_cursor_of_another_listing_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor([1, 2]), 3)
+
+
+def test_cursor_types_are_checked_exactly():
+    types = [(bool,), (str,), (Decimal, int)]
+
+    assert decode_cursor(encode_cursor([True, "a", 0]), 3, types) == [True, "a", 0]
+    for values in ([True, 1, 0], [1, "a", 0], [True, "a", "0"], [True, "a", 1.5]):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(encode_cursor(values), 3, types)
+
+
+# ============================================================================
+# KEYSET PAGES
+# ============================================================================
+
+items = Table(
+    "pagination_items", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("name", Text),
+    Column("price", Numeric(10, 2)),
+)
+
+
+@pytest.fixture
+def item_db(db):
+    items.create(db.get_bind())
+    prices = [Decimal("5.00"), None, Decimal("1.00"), Decimal("5.00"), None, Decimal("3.00"), Decimal("1.00")]
+    db.execute(items.insert(), [{"id": i + 1, "name": f"item {i + 1}", "price": p} for i, p in enumerate(prices)])
+    db.commit()
+    return db
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_match_offset_order(item_db, descending):
+    keys = [(items.c.price, descending), (items.c.id, descending)]
+    query = item_db.query(items)
+
+    everything, _ = keyset_page(query, keys, None, 100)
+    pages, cursor = [], None
+    while True:
+        rows, cursor = keyset_page(query, keys, cursor, 2)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            break
+
+    assert [row_id for page in pages for row_id in page] == [row.id for row in everything]
+    assert all(len(page) == 2 for page in pages[:-1])
+    # NULLS LAST in both directions
+    assert [row.id for row in everything][-2:] == ([5, 2] if descending else [2, 5])
+
+
+def test_last_page_has_no_cursor(item_db):
+    keys = [(items.c.id, False)]
+
+    rows, cursor = keyset_page(item_db.query(items), keys, None, 7)
+
+    assert len(rows) == 7 and cursor is None
+
+
+@pytest.mark.parametrize("values", [["cheap", 1], [Decimal("1.00"), "2"], [Decimal("1.00"), True], [1.5, 2]])
+def test_sql_keyset_rejects_cursor_values_of_the_wrong_type(item_db, values):
+    keys = [(items.c.price, False), (items.c.id, False)]
+
+    with pytest.raises(InvalidCursor):
+        keyset_page(item_db.query(items), keys, encode_cursor(values), 2)
+
+
+def test_sql_keyset_accepts_null_sort_values(item_db):
+    keys = [(items.c.price, False), (items.c.id, False)]
+
+    rows, _ = keyset_page(item_db.query(items), keys, encode_cursor([None, 2]), 10)
+
+    assert [row.id for row in rows] == [5]
+
+
+def test_search_with_a_tampered_cursor_is_a_bad_request(db):
+    app = FastAPI()
+    app.include_router(products.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    response = TestClient(app).get("/search/query", params={"q": "sand", "cursor": encode_cursor(["yes", "x", 1])})
+
+    assert response.status_code == 400
@@ -0,0 +1,171 @@
+"""Payment gateways: Stripe form encoding and error mapping, fake gateway"""
+
+import asyncio
+from urllib.parse import parse_qsl
+
+import httpx
+import pytest
+import stripe
+
+from utils.payment_gateway import (
+    FakeGateway, PaymentGateway, PaymentGatewayError, PaymentGatewayUnavailable, StripeGateway, encode_form
+)
+
+
+def test_encode_form_flattens_nested_params():
+    params = {
+        "mode": "payment",
+        "line_items": [{"price_data": {"unit_amount": 120000}, "quantity": 1}],
+        "metadata": {"order_id": 7},
+        "expand": ["payment_intent"],
+        "allow_promotion_codes": False,
+        "customer_email": None,
+    }
+
+    assert encode_form(params) == [
+        ("mode", "payment"),
+        ("line_items[0][price_data][unit_amount]", "120000"),
+        ("line_items[0][quantity]", "1"),
+        ("metadata[order_id]", "7"),
+        ("expand[0]", "payment_intent"),
+        ("allow_promotion_codes", "false"),
+    ]
+
+
+def test_incomplete_gateway_cannot_be_created():
+    class HalfGateway(PaymentGateway):
+        async def create_checkout_session(self, params, idempotency_key=None, timeout=None):
+            return {}
+
+    with pytest.raises(TypeError):
+        HalfGateway(1)
+
+
+# ============================================================================
+# STRIPE
+# ============================================================================
+
+def _stripe(handler, **kwargs):
+    return StripeGateway("sk_test_123", "https://stripe.invalid", timeout=5, max_concurrency=2,
+                         transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_stripe_posts_form_with_idempotency_key():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"id": "cs_1", "object": "checkout.session"})
+
+    gateway = _stripe(handler)
+    session = asyncio.run(gateway.create_checkout_session(
+        {"metadata": {"order_id": 7}}, idempotency_key="order-7"
+    ))
+
+    assert session["id"] == "cs_1"
+    request = requests[0]
+    assert (request.method, request.url.path) == ("POST", "/v1/checkout/sessions")
+    assert request.headers["Idempotency-Key"] == "order-7"
+    assert request.headers["Content-Type"] == "application/x-www-form-urlencoded"
+    assert parse_qsl(request.content.decode()) == [("metadata[order_id]", "7")]
+
+
+def test_stripe_get_expands_related_objects():
+    def handler(request):
+        assert request.url.path == "/v1/payment_intents/pi_1"
+        assert request.url.params["expand[0]"] == "latest_charge"
+        return httpx.Response(200, json={"id": "pi_1"})
+
+    assert asyncio.run(_stripe(handler).retrieve_payment_intent("pi_1")) == {"id": "pi_1"}
+
+
+def test_stripe_calls_pin_the_api_version():
+    versions = []
+
+    def handler(request):
+        versions.append(request.headers.get("Stripe-Version"))
+        return httpx.Response(200, json={"id": "pi_1"})
+
+    asyncio.run(_stripe(handler).retrieve_payment_intent("pi_1"))
+    asyncio.run(_stripe(handler, api_version="2023-10-16").retrieve_payment_intent("pi_1"))
+
+    assert versions == [stripe.api_version, "2023-10-16"]
+
+
+def test_stripe_gateway_can_be_used_from_several_event_loops():
+    clients = []
+
+    def handler(request):
+        return httpx.Response(200, json={"id": "pi_1"})
+
+    gateway = _stripe(handler)
+
+    async def call_twice():
+        # Concurrent calls make the semaphore bind to this loop
+        await asyncio.gather(*(gateway.retrieve_payment_intent("pi_1") for _ in range(4)))
+        clients.append(gateway._client)
+
+    asyncio.run(call_twice())
+    asyncio.run(call_twice())
+
+    assert clients[0] is not clients[1]
+
+
+@pytest.mark.parametrize("status_code, error", [
+    (400, PaymentGatewayError),
+    (404, PaymentGatewayError),
+    (429, PaymentGatewayUnavailable),
+    (503, PaymentGatewayUnavailable),
+])
+def test_stripe_errors_are_mapped(status_code, error):
+    def handler(request):
+        return httpx.Response(status_code, json={"error": {"message": "No such payment_intent"}})
+
+    with pytest.raises(error, match="No such payment_intent") as raised:
+        asyncio.run(_stripe(handler).retrieve_payment_intent("pi_1"))
+    if error is PaymentGatewayError:
+        assert not isinstance(raised.value, PaymentGatewayUnavailable)
+
+
+def test_stripe_timeouts_and_network_errors_are_unavailable():
+    def timeout(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    def refused(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    for handler in (timeout, refused):
+        with pytest.raises(PaymentGatewayUnavailable):
+            asyncio.run(_stripe(handler).retrieve_checkout_session("cs_1"))
+
+
+# ============================================================================
+# FAKE
+# ============================================================================
+
+def test_fake_gateway_checkout_payment_and_refund():
+    gateway = FakeGateway()
+
+    async def scenario():
+        session = await gateway.create_checkout_session({
+            "line_items": [{"price_data": {"unit_amount": 5000}, "quantity": 2}],
+            "success_url": "https://rinosbike.at/order/1?session_id={CHECKOUT_SESSION_ID}",
+        }, idempotency_key="order-1")
+        repeat = await gateway.create_checkout_session({}, idempotency_key="order-1")
+        gateway.pay(session["id"])
+        paid = await gateway.retrieve_checkout_session(session["id"])
+        refund = await gateway.create_refund({"payment_intent": session["payment_intent"]})
+        return session, repeat, paid, refund
+
+    session, repeat, paid, refund = asyncio.run(scenario())
+
+    assert repeat["id"] == session["id"]
+    assert session["url"].endswith(f"session_id={session['id']}")
+    assert paid["payment_status"] == "paid"
+    assert paid["payment_intent"]["status"] == "succeeded"
+    assert (refund["amount"], refund["status"]) == (10000, "succeeded")
+
+
+def test_fake_gateway_unknown_ids_are_rejected():
+    with pytest.raises(PaymentGatewayError):
+        asyncio.run(FakeGateway().retrieve_payment_intent("pi_unknown"))
@@ -0,0 +1,173 @@
+"""Payment status polls: local state first, one gateway call per burst"""
+
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from config import settings
+from models.order import StripePaymentIntent, WebOrder
+from utils import payment_status
+from utils.payment_gateway import FakeGateway, PaymentGatewayUnavailable, set_gateway
+from utils.payment_status import PaymentNotFound, cache_status, forget_status, get_payment_status
+
+
+class CountingGateway(FakeGateway):
+    def __init__(self):
+        super().__init__(latency_ms=20)
+        self.lookups = 0
+        self.unavailable = False
+
+    async def retrieve_checkout_session(self, session_id, timeout=None):
+        self.lookups += 1
+        if self.unavailable:
+            raise PaymentGatewayUnavailable("Stripe timed out")
+        return await super().retrieve_checkout_session(session_id, timeout)
+
+
+@pytest.fixture
+def gateway():
+    gateway = CountingGateway()
+    set_gateway(gateway)
+    payment_status._cache.clear()
+    yield gateway
+    set_gateway(None)
+    payment_status._cache.clear()
+
+
+@pytest.fixture
+def session_id(db, gateway):
+    order = WebOrder(ordernr="AT-1001-2025", orderamount=Decimal("1200.00"))
+    db.add(order)
+    db.flush()
+    session = asyncio.run(gateway.create_checkout_session({
+        "line_items": [{"price_data": {"unit_amount": 120000}, "quantity": 1}],
+        "metadata": {"order_id": order.web_order_id},
+    }))
+    db.add(StripePaymentIntent(web_order_id=order.web_order_id, stripe_payment_intent_id=session["id"],
+                               amount=Decimal("1200.00"), status="open"))
+    db.commit()
+    return session["id"]
+
+
+def _stored_status(db, stripe_id):
+    db.expire_all()
+    return db.query(StripePaymentIntent).filter_by(stripe_payment_intent_id=stripe_id).one()
+
+
+def test_open_payment_is_looked_up_and_cached(db, gateway, session_id):
+    first = asyncio.run(get_payment_status(db, session_id))
+    second = asyncio.run(get_payment_status(db, session_id))
+
+    assert first["status"] == second["status"] == "requires_payment_method"
+    assert gateway.lookups == 1
+
+
+def test_no_transaction_is_open_while_the_gateway_is_asked(db, gateway, session_id, monkeypatch):
+    in_transaction = []
+    lookup = gateway.retrieve_checkout_session
+
+    async def observing_lookup(session_id, timeout=None):
+        in_transaction.append(db.in_transaction())
+        return await lookup(session_id, timeout)
+
+    monkeypatch.setattr(gateway, "retrieve_checkout_session", observing_lookup)
+
+    asyncio.run(get_payment_status(db, session_id))
+
+    assert in_transaction == [False]
+    assert not db.in_transaction()
+
+
+def test_paid_payment_is_stored_and_then_answered_locally(db, gateway, session_id, monkeypatch):
+    gateway.pay(session_id)
+
+    body = asyncio.run(get_payment_status(db, session_id))
+    assert body["status"] == "succeeded"
+    assert body["receipt_url"].endswith(session_id)
+    assert _stored_status(db, session_id).payment_method == "pm_fake"
+
+    # A final status in the database needs no gateway call, even with a cold cache
+    payment_status._cache.clear()
+    monkeypatch.setattr(settings, "PAYMENT_STATUS_CACHE_SECONDS", 0)
+    assert asyncio.run(get_payment_status(db, session_id))["status"] == "succeeded"
+    assert gateway.lookups == 1
+
+
+def test_unchanged_status_is_not_written(db, gateway, session_id, monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENT_STATUS_CACHE_SECONDS", 0)
+    asyncio.run(get_payment_status(db, session_id))
+    updated_at = _stored_status(db, session_id).updated_at
+
+    asyncio.run(get_payment_status(db, session_id))
+
+    assert gateway.lookups == 2
+    assert _stored_status(db, session_id).updated_at == updated_at
+
+
+def test_concurrent_polls_share_one_lookup(db, gateway, session_id, session_factory):
+    async def burst():
+        sessions = [session_factory() for _ in range(5)]
+        try:
+            return await asyncio.gather(*[get_payment_status(s, session_id) for s in sessions])
+        finally:
+            for s in sessions:
+                s.close()
+
+    results = asyncio.run(burst())
+
+    assert gateway.lookups == 1
+    assert {body["status"] for body in results} == {"requires_payment_method"}
+
+
+def test_unreachable_gateway_answers_with_the_stored_status(db, gateway, session_id):
+    gateway.unavailable = True
+
+    assert asyncio.run(get_payment_status(db, session_id))["status"] == "open"
+    assert payment_status.get_cached_status(session_id) is None
+
+
+def test_unknown_payment_raises(db, gateway):
+    with pytest.raises(PaymentNotFound):
+        asyncio.run(get_payment_status(db, "pi_unknown"))
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+def _body(stripe_id, status="succeeded"):
+    return {"payment_intent_id": stripe_id, "status": status}
+
+
+def test_cache_is_bounded_least_recently_used_first(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENT_STATUS_CACHE_MAX_ENTRIES", 2)
+    cache_status(_body("pi_1"))
+    cache_status(_body("pi_2"))
+    payment_status.get_cached_status("pi_1")
+
+    cache_status(_body("pi_3"))
+
+    assert set(payment_status._cache) == {"pi_1", "pi_3"}
+
+
+def test_final_statuses_expire(gateway, monkeypatch):
+    cache_status(_body("pi_1"))
+    cache_status(_body("pi_2", "processing"))
+    assert payment_status.get_cached_status("pi_1") is not None
+
+    monkeypatch.setattr(settings, "PAYMENT_STATUS_FINAL_CACHE_SECONDS", 0)
+    monkeypatch.setattr(settings, "PAYMENT_STATUS_CACHE_SECONDS", 0)
+
+    assert payment_status.get_cached_status("pi_1") is None
+    assert payment_status.get_cached_status("pi_2") is None
+    assert not payment_status._cache
+
+
+def test_forget_status_drops_entries(gateway):
+    cache_status(_body("cs_1"))
+    cache_status(_body("pi_1"))
+
+    forget_status("cs_1", "pi_1", "pi_unknown")
+
+    assert not payment_status._cache
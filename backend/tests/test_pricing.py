@@ -0,0 +1,56 @@
+"""Integer price engine against the Decimal conversion path"""
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from utils.pricing import (
+    VAT_RATES, convert_price_by_country, convert_prices_by_country, localize_cents,
+    localize_cents_array, localize_prices, to_cents
+)
+
+
+def _sample_cents():
+    rng = random.Random(2025)
+    return list(range(0, 2000)) + [rng.randrange(0, 10_000_000) for _ in range(2000)]
+
+
+@pytest.mark.parametrize("country", sorted(VAT_RATES))
+def test_localize_cents_matches_decimal_path(country):
+    for cents in _sample_cents():
+        expected = convert_price_by_country(Decimal(cents).scaleb(-2), country)
+        assert localize_cents(cents, country) == int(expected.scaleb(2)), (cents, country)
+
+
+@pytest.mark.parametrize("country", ["AT", "CH", "PL"])
+def test_localize_prices_matches_decimal_path_for_every_input_type(country):
+    prices = [Decimal("1190.00"), Decimal("999.99"), 1190, 0, 12.5, 0.1, 1e-2, Decimal("12.345"), 0.005]
+
+    assert localize_prices(prices, country) == [convert_price_by_country(p, country) for p in prices]
+
+
+def test_known_prices():
+    assert convert_prices_by_country([Decimal("1190.00"), 1190, None], "AT") == [
+        Decimal("1200.00"), Decimal("1200.00"), Decimal("0.00")
+    ]
+    assert localize_prices([Decimal("1190.00")], "de") == [Decimal("1190.00")]
+
+
+def test_sub_cent_prices_fall_back_to_decimal():
+    assert to_cents(Decimal("12.345")) is None
+    assert to_cents(0.1) == 10 and to_cents(7) == 700 and to_cents(None) == 0
+
+
+def test_invalid_country_is_rejected():
+    with pytest.raises(ValueError):
+        localize_prices([Decimal("1.00")], "XX")
+
+
+def test_numpy_array_matches_scalar_engine():
+    np = pytest.importorskip("numpy")
+    cents = _sample_cents()
+
+    result = localize_cents_array(np.array(cents), "IT")
+
+    assert result.tolist() == [localize_cents(c, "IT") for c in cents]
@@ -0,0 +1,239 @@
+"""Pooled SMTP sending, error classification and the outbox, against a fake SMTP server"""
+
+import smtplib
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.email import email_outbox, email_service
+from api.email.email_outbox import drain_email_outbox, send_pending_batch
+from api.routers import auth
+from api.email.email_service import SMTPConnectionPool, build_message, is_permanent_error
+from config import settings
+from database.connection import get_db
+from models import WebUser
+from models.email import EmailOutbox
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in; `failures` maps a recipient to the error(s) its send raises"""
+
+    instances = []
+    failures = {}
+    login_error = None
+
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+        self.closed = False
+        FakeSMTP.instances.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        if FakeSMTP.login_error:
+            raise FakeSMTP.login_error
+
+    def send_message(self, message):
+        errors = FakeSMTP.failures.get(message["To"])
+        if errors:
+            raise errors.pop(0)
+        self.sent.append(message["To"])
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeSMTP.instances, FakeSMTP.failures, FakeSMTP.login_error = [], {}, None
+    monkeypatch.setattr(email_service.smtplib, "SMTP", FakeSMTP)
+    return SMTPConnectionPool(size=2)
+
+
+def _messages(*recipients):
+    return [build_message(to, "Betreff", "<p>Hallo</p>") for to in recipients]
+
+
+def test_connection_is_reused_across_batches(pool):
+    assert pool.send(_messages("a@example.com", "b@example.com")) == [None, None]
+    assert pool.send(_messages("c@example.com")) == [None]
+
+    assert len(FakeSMTP.instances) == 1
+    assert FakeSMTP.instances[0].sent == ["a@example.com", "b@example.com", "c@example.com"]
+
+
+def test_refused_recipient_fails_only_its_message_permanently(pool):
+    refused = smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")})
+    FakeSMTP.failures = {"bad@example.com": [refused]}
+
+    results = pool.send(_messages("a@example.com", "bad@example.com", "c@example.com"))
+
+    assert results == [None, refused, None]
+    assert is_permanent_error(results[1])
+    assert FakeSMTP.instances[0].sent == ["a@example.com", "c@example.com"]
+
+
+@pytest.mark.parametrize("error, permanent", [
+    (smtplib.SMTPDataError(451, b"Try again later"), False),
+    (smtplib.SMTPDataError(554, b"Message rejected"), True),
+    (smtplib.SMTPSenderRefused(553, b"Sender not allowed", "noreply@rinosbike.at"), True),
+])
+def test_message_errors_are_classified_by_smtp_code(pool, error, permanent):
+    FakeSMTP.failures = {"a@example.com": [error]}
+
+    results = pool.send(_messages("a@example.com", "b@example.com"))
+
+    assert results == [error, None]
+    assert is_permanent_error(error) is permanent
+
+
+def test_dropped_connection_is_reopened_once(pool):
+    FakeSMTP.failures = {"a@example.com": [smtplib.SMTPServerDisconnected("timeout")]}
+
+    assert pool.send(_messages("a@example.com")) == [None]
+    assert len(FakeSMTP.instances) == 2
+    assert FakeSMTP.instances[1].sent == ["a@example.com"]
+
+
+def test_connection_dropped_twice_fails_the_message(pool):
+    dropped = [smtplib.SMTPServerDisconnected("gone"), smtplib.SMTPServerDisconnected("gone again")]
+    FakeSMTP.failures = {"a@example.com": dropped[:]}
+
+    results = pool.send(_messages("a@example.com", "b@example.com"))
+
+    assert isinstance(results[0], smtplib.SMTPServerDisconnected) and results[1] is None
+    assert not is_permanent_error(results[0])
+
+
+def test_login_failure_fails_the_whole_batch(pool):
+    FakeSMTP.login_error = smtplib.SMTPAuthenticationError(535, b"Authentication failed")
+
+    results = pool.send(_messages("a@example.com", "b@example.com"))
+
+    assert results == [FakeSMTP.login_error] * 2
+    assert is_permanent_error(results[0])
+    assert pool._idle == []
+
+
+def test_network_error_is_temporary(pool, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise ConnectionRefusedError("connection refused")
+
+    monkeypatch.setattr(email_service.smtplib, "SMTP", unreachable)
+
+    results = pool.send(_messages("a@example.com"))
+
+    assert isinstance(results[0], ConnectionRefusedError)
+    assert not is_permanent_error(results[0])
+
+
+def test_used_up_and_idle_connections_are_closed(pool, monkeypatch):
+    monkeypatch.setattr(settings, "SMTP_MAX_MESSAGES_PER_CONNECTION", 2)
+    pool.send(_messages("a@example.com", "b@example.com"))
+    assert FakeSMTP.instances[0].closed and pool._idle == []
+
+    monkeypatch.setattr(settings, "SMTP_IDLE_SECONDS", 0)
+    pool.send(_messages("c@example.com"))
+    pool.send(_messages("d@example.com"))
+    assert len(FakeSMTP.instances) == 3 and FakeSMTP.instances[1].closed
+
+
+# ============================================================================
+# OUTBOX
+# ============================================================================
+
+@pytest.fixture
+def outbox(db, pool, monkeypatch):
+    monkeypatch.setattr(email_outbox, "smtp_pool", pool)
+
+    def add(to_email, **columns):
+        email = EmailOutbox(to_email=to_email, subject="Betreff", html_content="<p>Hallo</p>",
+                            status=columns.pop("status", "pending"), attempts=columns.pop("attempts", 0),
+                            **columns)
+        db.add(email)
+        db.commit()
+        return email
+    return add
+
+
+def _statuses(db):
+    db.expire_all()
+    return {e.to_email: (e.status, e.attempts) for e in db.query(EmailOutbox)}
+
+
+def test_batch_records_sent_retry_and_failed(db, outbox):
+    FakeSMTP.failures = {
+        "later@example.com": [smtplib.SMTPDataError(451, b"Try again later")],
+        "bad@example.com": [smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")})],
+    }
+    for to in ("a@example.com", "later@example.com", "bad@example.com"):
+        outbox(to)
+
+    assert send_pending_batch(db) == {"sent": 1, "retry": 1, "failed": 1}
+    assert _statuses(db) == {"a@example.com": ("sent", 1), "later@example.com": ("pending", 1),
+                             "bad@example.com": ("failed", 1)}
+    # The retry isn't due yet
+    assert send_pending_batch(db) == {"sent": 0, "retry": 0, "failed": 0}
+
+
+def test_claim_is_committed_before_smtp_runs(db, session_factory, outbox, monkeypatch):
+    outbox("a@example.com")
+    seen = []
+
+    class ObservingPool:
+        def send(self, messages):
+            # Another connection sees the claim: no transaction is open during SMTP
+            other = session_factory()
+            seen.append(other.query(EmailOutbox.status, EmailOutbox.next_attempt_at).one())
+            other.close()
+            return [None] * len(messages)
+
+    monkeypatch.setattr(email_outbox, "smtp_pool", ObservingPool())
+
+    assert send_pending_batch(db)["sent"] == 1
+    assert seen[0][0] == "sending" and seen[0][1] > datetime.utcnow()
+
+
+def test_emails_of_a_dead_worker_are_sent_after_the_lease(db, outbox):
+    outbox("stuck@example.com", status="sending", attempts=1,
+           next_attempt_at=datetime.utcnow() - timedelta(seconds=1))
+    outbox("busy@example.com", status="sending", attempts=1,
+           next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+
+    assert send_pending_batch(db) == {"sent": 1, "retry": 0, "failed": 0}
+    assert _statuses(db) == {"stuck@example.com": ("sent", 2), "busy@example.com": ("sending", 1)}
+
+
+def test_request_sends_its_queued_email_after_the_answer(db, engine, session_factory, outbox, monkeypatch):
+    # No worker thread runs here, as on a serverless instance
+    monkeypatch.setattr(email_outbox, "engine", engine)
+    monkeypatch.setattr(auth, "SessionLocal", session_factory)
+    monkeypatch.setattr(email_service.EmailConfig, "SEND_EMAILS", True)
+    monkeypatch.setattr(email_service.EmailConfig, "SMTP_USERNAME", "shop")
+    monkeypatch.setattr(email_service.EmailConfig, "SMTP_PASSWORD", "secret")
+    db.add(WebUser(email="anna@example.com", password_hash="x", is_active=True, email_verified=True))
+    db.commit()
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    response = TestClient(app).post("/auth/password-reset", json={"email": "anna@example.com"})
+
+    assert response.status_code == 200
+    assert _statuses(db) == {"anna@example.com": ("sent", 1)}
+    assert FakeSMTP.instances[0].sent == ["anna@example.com"]
+
+
+def test_drain_logs_errors_and_keeps_the_emails(db, session_factory, outbox, monkeypatch):
+    outbox("a@example.com")
+
+    def broken(messages):
+        raise RuntimeError("pool gone")
+
+    monkeypatch.setattr(email_outbox.smtp_pool, "send", broken)
+
+    assert drain_email_outbox(session_factory) == {"sent": 0, "retry": 0, "failed": 0}
+    assert _statuses(db)["a@example.com"][0] == "sending"
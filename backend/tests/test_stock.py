@@ -0,0 +1,125 @@
+"""Stock service: grouped inventory sums, reservations and the short-TTL cache"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from config import settings
+from models.order import StockReservation, WebOrder
+from models.product import InventoryData
+from utils import stock
+from utils.stock import add_availability, get_stock, invalidate_stock_cache, load_stock
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    invalidate_stock_cache()
+    yield
+    invalidate_stock_cache()
+
+
+@pytest.fixture
+def statements(engine):
+    """SQL statements sent to the database"""
+    sent = []
+
+    def record(conn, cursor, statement, *args):
+        sent.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield sent
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def inventory(db):
+    rows = [("RB-1", 3), ("RB-1", 4), ("RB-2", 12), ("RB-3", 0), ("RB-4", 1), ("RB-5", 2)]
+    db.add_all([
+        InventoryData(inventoryid=i, articlenr=articlenr, locationid=i, quantity=quantity)
+        for i, (articlenr, quantity) in enumerate(rows, start=1)
+    ])
+    db.commit()
+    return db
+
+
+def _reserve(db, articlenr, quantity, status="held", expires_in_minutes=30, synced=False):
+    order = WebOrder(ordernr=f"AT-{articlenr}-{quantity}", orderamount=Decimal("1.00"), synced_to_erp=synced)
+    db.add(order)
+    db.flush()
+    db.add(StockReservation(
+        web_order_id=order.web_order_id, articlenr=articlenr, quantity=quantity, status=status,
+        expires_at=datetime.utcnow() + timedelta(minutes=expires_in_minutes) if status == "held" else None
+    ))
+    db.commit()
+
+
+def test_locations_are_summed_and_unknown_articles_are_zero(inventory):
+    assert load_stock(inventory, ["RB-1", "RB-2", "RB-3", "RB-404"]) == {
+        "RB-1": 7, "RB-2": 12, "RB-3": 0, "RB-404": 0
+    }
+
+
+def test_one_grouped_query_per_batch(inventory, statements, monkeypatch):
+    monkeypatch.setattr(stock, "_BATCH_SIZE", 2)
+
+    result = load_stock(inventory, ["RB-1", "RB-2", "RB-3", "RB-4", "RB-5"])
+
+    assert result == {"RB-1": 7, "RB-2": 12, "RB-3": 0, "RB-4": 1, "RB-5": 2}
+    inventory_queries = [s for s in statements if "FROM inventorydata" in s]
+    assert len(inventory_queries) == 3
+    assert all("GROUP BY" in s for s in inventory_queries)
+
+
+def test_only_active_reservations_are_subtracted(inventory):
+    _reserve(inventory, "RB-1", 2)                                 # held
+    _reserve(inventory, "RB-1", 1, expires_in_minutes=-1)          # held, expired
+    _reserve(inventory, "RB-2", 5, status="committed")             # paid, not at the ERP yet
+    _reserve(inventory, "RB-2", 4, status="committed", synced=True)  # already in inventorydata
+    _reserve(inventory, "RB-4", 3)                                 # more than on hand
+
+    assert load_stock(inventory, ["RB-1", "RB-2", "RB-4"]) == {"RB-1": 5, "RB-2": 7, "RB-4": 0}
+
+
+def test_cached_stock_needs_no_query_until_it_expires(inventory, statements, monkeypatch):
+    get_stock(inventory, ["RB-1", "RB-2"])
+    statements.clear()
+
+    assert get_stock(inventory, ["RB-2", "RB-1"]) == {"RB-1": 7, "RB-2": 12}
+    assert statements == []
+
+    monkeypatch.setattr(settings, "STOCK_CACHE_SECONDS", 0)
+    get_stock(inventory, ["RB-1"])
+    assert statements
+
+
+def test_only_missing_articles_are_loaded(inventory, statements):
+    get_stock(inventory, ["RB-1"])
+    statements.clear()
+
+    get_stock(inventory, ["RB-1", "RB-2"])
+
+    inventory_query = next(s for s in statements if "FROM inventorydata" in s)
+    assert inventory_query.count("?") == 1
+
+
+def test_invalidation_shows_new_reservations(inventory):
+    assert get_stock(inventory, ["RB-1"]) == {"RB-1": 7}
+    _reserve(inventory, "RB-1", 2)
+    assert get_stock(inventory, ["RB-1"]) == {"RB-1": 7}
+
+    invalidate_stock_cache(["RB-1"])
+
+    assert get_stock(inventory, ["RB-1"]) == {"RB-1": 5}
+
+
+def test_father_availability_includes_its_variations(inventory):
+    products = [{"articlenr": "RB-1"}, {"articlenr": "RB-3"}, {"articlenr": "RB-5"}]
+    children = {"RB-1": [{"articlenr": "RB-2"}], "RB-3": [{"articlenr": "RB-4"}]}
+
+    add_availability(inventory, products, children)
+
+    assert [(p["availability"]["status"], p["availability"]["total_stock"]) for p in products] == [
+        ("in_stock", 19), ("low_stock", 1), ("low_stock", 2)
+    ]
@@ -0,0 +1,182 @@
+"""Stripe webhook inbox: idempotent handlers that never unpay an order"""
+
+import json
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.routers import payments
+from database.connection import get_db
+from models.order import StockReservation, StripePaymentIntent, StripeWebhookEvent, WebOrder
+from utils import webhook_inbox
+from utils.webhook_inbox import (
+    drain_webhook_events, handle_checkout_completed, handle_payment_failed,
+    handle_payment_succeeded, process_pending_events, store_event
+)
+
+
+@pytest.fixture
+def order(db):
+    order = WebOrder(ordernr="AT-1001-2025", orderamount=Decimal("1200.00"), payment_status="pending")
+    db.add(order)
+    db.flush()
+    db.add_all([
+        StripePaymentIntent(web_order_id=order.web_order_id, stripe_payment_intent_id="pi_1",
+                            amount=Decimal("1200.00"), status="requires_payment_method"),
+        StripePaymentIntent(web_order_id=order.web_order_id, stripe_payment_intent_id="cs_1",
+                            amount=Decimal("1200.00"), status="open"),
+        StockReservation(web_order_id=order.web_order_id, articlenr="RB-1", quantity=1, status="held"),
+    ])
+    db.commit()
+    return order
+
+
+@pytest.fixture
+def receipts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(webhook_inbox, "send_receipts", sent.extend)
+    return sent
+
+
+def _reservation_status(db, order):
+    db.expire_all()
+    return [r.status for r in db.query(StockReservation).filter_by(web_order_id=order.web_order_id)]
+
+
+def _event(event_id, event_type, obj, created=1):
+    event = {"id": event_id, "type": event_type, "created": created, "data": {"object": obj}}
+    return event, json.dumps(event).encode("utf-8")
+
+
+# ============================================================================
+# HANDLERS
+# ============================================================================
+
+def test_payment_succeeded_marks_paid_once(db, order):
+    assert len(handle_payment_succeeded(db, {"id": "pi_1"})) == 1
+    assert handle_payment_succeeded(db, {"id": "pi_1"}) == []
+    db.commit()
+
+    assert order.payment_status == "paid"
+    assert _reservation_status(db, order) == ["committed"]
+
+
+def test_failed_payment_after_success_keeps_the_order_paid(db, order):
+    handle_payment_succeeded(db, {"id": "pi_1"})
+    handle_payment_failed(db, {"id": "pi_1"})
+    db.commit()
+
+    assert order.payment_status == "paid"
+    assert _reservation_status(db, order) == ["committed"]
+
+
+def test_late_failure_after_checkout_completed_keeps_the_order_paid(db, order):
+    session = {"id": "cs_1", "payment_intent": "pi_1", "payment_status": "paid", "status": "complete",
+               "metadata": {"order_id": str(order.web_order_id)}}
+
+    assert len(handle_checkout_completed(db, session)) == 1
+    assert handle_checkout_completed(db, session) == []
+    handle_payment_failed(db, {"id": "pi_1"})
+    db.commit()
+
+    assert order.payment_status == "paid"
+    assert db.query(StripePaymentIntent).filter_by(stripe_payment_intent_id="cs_1").one().status == "succeeded"
+    assert _reservation_status(db, order) == ["committed"]
+
+
+def test_failed_payment_of_unpaid_order_releases_stock(db, order):
+    handle_payment_failed(db, {"id": "pi_1"})
+    db.commit()
+
+    assert order.payment_status == "failed"
+    assert _reservation_status(db, order) == []
+
+
+def test_events_for_unknown_payments_are_ignored(db, order):
+    assert handle_payment_succeeded(db, {"id": "pi_unknown"}) == []
+    assert handle_checkout_completed(db, {"id": "cs_x", "metadata": {"order_id": "999"}}) == []
+    assert handle_checkout_completed(db, {"id": "cs_x"}) == []
+
+
+# ============================================================================
+# INBOX
+# ============================================================================
+
+def test_stripe_retries_are_stored_once(db):
+    event, payload = _event("evt_1", "payment_intent.succeeded", {"id": "pi_1"})
+
+    assert store_event(db, event, payload) is True
+    assert store_event(db, event, payload) is False
+    assert db.query(StripeWebhookEvent).count() == 1
+
+
+def test_out_of_order_events_never_unpay(db, order, receipts):
+    for event_id, event_type, created in [("evt_2", "payment_intent.payment_failed", 2),
+                                          ("evt_1", "payment_intent.succeeded", 1),
+                                          ("evt_3", "payment_intent.payment_failed", 3)]:
+        store_event(db, *_event(event_id, event_type, {"id": "pi_1", "object": "payment_intent"}, created))
+
+    assert process_pending_events(db) == {"processed": 3, "failed": 0}
+    db.expire_all()
+    assert order.payment_status == "paid"
+    assert len(receipts) == 1
+
+
+def test_failing_event_is_retried_later(db, order, monkeypatch):
+    def broken(db, obj):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(webhook_inbox.EVENT_HANDLERS, "payment_intent.succeeded", broken)
+    store_event(db, *_event("evt_1", "payment_intent.succeeded", {"id": "pi_1"}))
+
+    assert process_pending_events(db) == {"processed": 0, "failed": 1}
+    event_row = db.query(StripeWebhookEvent).one()
+    assert (event_row.status, event_row.attempts, event_row.last_error) == ("pending", 1, "boom")
+    assert event_row.next_attempt_at is not None
+    # Not due yet
+    assert process_pending_events(db) == {"processed": 0, "failed": 0}
+
+
+def test_failing_handler_changes_are_undone_but_the_attempt_is_kept(db, order, monkeypatch):
+    def half_done(db, obj):
+        handle_payment_succeeded(db, obj)
+        raise RuntimeError("receipt lookup failed")
+
+    monkeypatch.setitem(webhook_inbox.EVENT_HANDLERS, "payment_intent.succeeded", half_done)
+    store_event(db, *_event("evt_1", "payment_intent.succeeded", {"id": "pi_1"}))
+
+    assert process_pending_events(db) == {"processed": 0, "failed": 1}
+    db.expire_all()
+    assert order.payment_status == "pending"
+    assert _reservation_status(db, order) == ["held"]
+    assert db.query(StripeWebhookEvent).one().attempts == 1
+
+
+def test_webhook_applies_its_event_after_the_answer(db, session_factory, order, receipts, monkeypatch):
+    # No worker thread runs here, as on a serverless instance
+    event, payload = _event("evt_1", "payment_intent.succeeded", {"id": "pi_1", "object": "payment_intent"})
+    monkeypatch.setattr(payments.stripe.Webhook, "construct_event", lambda *args: event)
+    monkeypatch.setattr(payments, "SessionLocal", session_factory)
+    app = FastAPI()
+    app.include_router(payments.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    response = TestClient(app).post("/payments/webhook", content=payload,
+                                    headers={"stripe-signature": "t=1,v1=test"})
+
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.query(StripeWebhookEvent).one().status == "processed"
+    assert order.payment_status == "paid"
+    assert len(receipts) == 1
+
+
+def test_drain_logs_errors_and_keeps_the_events(session_factory, monkeypatch):
+    def broken(db, max_events):
+        raise RuntimeError("database gone")
+
+    monkeypatch.setattr(webhook_inbox, "process_pending_events", broken)
+
+    assert drain_webhook_events(session_factory) == {"processed": 0, "failed": 0}
@@ -0,0 +1,104 @@
+"""
+Cart unique keys
+Unique indexes the cart upserts conflict on (migrations/006_add_cart_unique_keys.sql)
+
+/cart/add and /cart/merge (api/routers/cart.py) insert carts and lines with
+INSERT ... ON CONFLICT (guest_session_id | user_id | cart_id, articlenr),
+which Postgres rejects unless these unique indexes exist. Databases created
+before migration 006 may hold duplicate carts or lines, so the API merges them
+and builds the indexes on startup when one is missing.
+"""
+
+from sqlalchemy import text
+
+
+CART_UNIQUE_INDEXES = (
+    "uq_shopping_carts_guest_session_id",
+    "uq_shopping_carts_user_id",
+    "uq_cart_items_cart_articlenr",
+)
+
+# Same statements as migrations/006_add_cart_unique_keys.sql: merge duplicate
+# carts and lines first, otherwise the unique indexes can't be built
+MERGE_DUPLICATE_CARTS_SQL = (
+    """
+    UPDATE cart_items ci
+    SET cart_id = d.keep_id
+    FROM (
+        SELECT cart_id, MIN(cart_id) OVER (PARTITION BY guest_session_id) AS keep_id
+        FROM shopping_carts
+        WHERE guest_session_id IS NOT NULL
+    ) d
+    WHERE ci.cart_id = d.cart_id AND d.cart_id <> d.keep_id
+    """,
+    """
+    UPDATE cart_items ci
+    SET cart_id = d.keep_id
+    FROM (
+        SELECT cart_id, MIN(cart_id) OVER (PARTITION BY user_id) AS keep_id
+        FROM shopping_carts
+        WHERE user_id IS NOT NULL
+    ) d
+    WHERE ci.cart_id = d.cart_id AND d.cart_id <> d.keep_id
+    """,
+    """
+    DELETE FROM shopping_carts c
+    USING shopping_carts keep
+    WHERE c.guest_session_id = keep.guest_session_id AND c.cart_id > keep.cart_id
+    """,
+    """
+    DELETE FROM shopping_carts c
+    USING shopping_carts keep
+    WHERE c.user_id = keep.user_id AND c.cart_id > keep.cart_id
+    """,
+    """
+    UPDATE cart_items ci
+    SET quantity = LEAST(d.total_quantity, 100)
+    FROM (
+        SELECT MIN(cart_item_id) AS keep_id, SUM(quantity) AS total_quantity
+        FROM cart_items
+        GROUP BY cart_id, articlenr
+        HAVING COUNT(*) > 1
+    ) d
+    WHERE ci.cart_item_id = d.keep_id
+    """,
+    """
+    DELETE FROM cart_items ci
+    USING cart_items keep
+    WHERE ci.cart_id = keep.cart_id
+      AND ci.articlenr = keep.articlenr
+      AND ci.cart_item_id > keep.cart_item_id
+    """,
+)
+
+CREATE_CART_UNIQUE_INDEXES_SQL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_carts_guest_session_id ON shopping_carts(guest_session_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_shopping_carts_user_id ON shopping_carts(user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_cart_articlenr ON cart_items(cart_id, articlenr)",
+)
+
+
+def ensure_cart_unique_keys(engine) -> None:
+    """
+    Merge duplicate carts / lines and add the unique indexes if any is missing
+    (called on startup)
+
+    /cart/add, /cart/merge and the guest cart writer upsert with
+    ON CONFLICT (guest_session_id | user_id | cart_id, articlenr), which
+    Postgres rejects without these indexes.
+    """
+    if engine.dialect.name != "postgresql":
+        # Other databases (tests) get the indexes from the models' __table_args__
+        return
+
+    with engine.begin() as conn:
+        existing = set(conn.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE tablename IN ('shopping_carts', 'cart_items')
+        """)).scalars())
+        if existing.issuperset(CART_UNIQUE_INDEXES):
+            return
+        # Keep concurrent cart writes out while duplicates are merged
+        conn.execute(text("LOCK TABLE shopping_carts, cart_items IN SHARE ROW EXCLUSIVE MODE"))
+        for statement in MERGE_DUPLICATE_CARTS_SQL + CREATE_CART_UNIQUE_INDEXES_SQL:
+            conn.execute(text(statement))
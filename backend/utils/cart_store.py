@@ -0,0 +1,584 @@
+"""
+Guest cart store
+Keeps guest carts hot in memory (or Redis) and writes them behind to the database
+
+Anonymous visitors browse, add and remove items far more often than they check
+out. Their carts (ShoppingCart.guest_session_id) are served from this store:
+reads and mutations only touch the backend, changed carts are marked dirty and
+a background writer copies them to shopping_carts / cart_items every
+CART_STORE_FLUSH_SECONDS.
+
+Backends (CART_STORE_URL):
+    - ""            store disabled, guest carts use the database directly (default)
+    - "redis://..." any Redis-protocol server, shared by all workers; the only
+                    setting for more than one process (replicas, serverless
+                    instances of the Vercel entry point /api/index.py). Needs
+                    the optional `redis` package
+    - "memory://"   process-local dict, only for a single uvicorn worker and tests;
+                    other instances wouldn't see the carts
+
+Consistency:
+    - The store is authoritative for a guest cart while it is hot. A cold cart
+      is loaded from the database once (one query) on first access.
+    - flush() writes a cart synchronously; /cart/merge and checkout call it
+      before they read the cart from the database.
+    - Lines and carts that were never written have negative temporary ids, so
+      they can't collide with cart_items.cart_item_id. Once written, the hot
+      cart takes over the database ids; a client still holding a temporary id
+      is resolved through the cart's aliases. Lines loaded from the database
+      keep their ids. /cart/items/{cart_item_id} finds the cart through an id
+      index.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Numeric, bindparam, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import ShoppingCart, CartItem
+
+
+MAX_LINE_QUANTITY = 100
+
+
+# ============================================================================
+# CART OBJECTS
+# ============================================================================
+
+class GuestCartLine:
+    """One line of a guest cart (same attributes as CartItem)"""
+
+    __slots__ = ("cart_item_id", "cart_id", "product_id", "articlenr", "quantity",
+                 "price_at_addition", "added_at")
+
+    def __init__(self, cart_item_id, cart_id, product_id, articlenr, quantity,
+                 price_at_addition, added_at):
+        self.cart_item_id = cart_item_id
+        self.cart_id = cart_id
+        self.product_id = product_id
+        self.articlenr = articlenr
+        self.quantity = quantity
+        self.price_at_addition = price_at_addition  # Decimal (gross EUR)
+        self.added_at = added_at
+
+    def to_json(self) -> dict:
+        return {
+            "cart_item_id": self.cart_item_id,
+            "product_id": self.product_id,
+            "articlenr": self.articlenr,
+            "quantity": self.quantity,
+            "price_at_addition": str(self.price_at_addition),
+            "added_at": self.added_at.isoformat(),
+        }
+
+
+class GuestCart:
+    """A guest cart as kept in the store (same attributes as ShoppingCart)"""
+
+    user_id = None
+
+    def __init__(self, guest_session_id, cart_id, created_at, updated_at, items=None):
+        self.guest_session_id = guest_session_id
+        self.cart_id = cart_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.items: List[GuestCartLine] = items or []
+        self.aliases: Dict[int, int] = {}  # temporary line id -> database id
+
+    def find_item(self, cart_item_id: int) -> Optional[GuestCartLine]:
+        cart_item_id = self.aliases.get(cart_item_id, cart_item_id)
+        return next((item for item in self.items if item.cart_item_id == cart_item_id), None)
+
+    def find_article(self, articlenr: str) -> Optional[GuestCartLine]:
+        return next((item for item in self.items if item.articlenr == articlenr), None)
+
+    def dumps(self) -> str:
+        return json.dumps({
+            "guest_session_id": self.guest_session_id,
+            "cart_id": self.cart_id,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "items": [item.to_json() for item in self.items],
+            "aliases": [[old, new] for old, new in self.aliases.items()],
+        })
+
+    @classmethod
+    def loads(cls, value: str) -> "GuestCart":
+        data = json.loads(value)
+        cart = cls(
+            guest_session_id=data["guest_session_id"],
+            cart_id=data["cart_id"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            updated_at=datetime.fromisoformat(data["updated_at"]),
+        )
+        cart.items = [
+            GuestCartLine(
+                cart_item_id=item["cart_item_id"],
+                cart_id=cart.cart_id,
+                product_id=item["product_id"],
+                articlenr=item["articlenr"],
+                quantity=item["quantity"],
+                price_at_addition=Decimal(item["price_at_addition"]),
+                added_at=datetime.fromisoformat(item["added_at"]),
+            )
+            for item in data["items"]
+        ]
+        cart.aliases = {old: new for old, new in data.get("aliases", [])}
+        return cart
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class MemoryCartBackend:
+    """Process-local key/value backend with expiry"""
+
+    def __init__(self):
+        self._values = {}  # key -> (value, expires_at)
+        self._dirty = set()
+        self._counter = 0
+        self._lock = threading.RLock()  # update() callbacks may call next_id()
+
+    def _get(self, key):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def update(self, key: str, fn: Callable, ttl: int):
+        """Atomically replace a value: fn(old) -> (new, result); new=None keeps nothing"""
+        with self._lock:
+            new, result = fn(self._get(key))
+            if new is None:
+                self._values.pop(key, None)
+            else:
+                self._values[key] = (new, time.monotonic() + ttl)
+            return result
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def mark_dirty(self, member: str) -> None:
+        with self._lock:
+            self._dirty.add(member)
+
+    def unmark_dirty(self, member: str) -> None:
+        with self._lock:
+            self._dirty.discard(member)
+
+    def take_dirty(self, count: int) -> List[str]:
+        with self._lock:
+            taken = [self._dirty.pop() for _ in range(min(count, len(self._dirty)))]
+            # Drop expired entries while we hold the lock anyway
+            now = time.monotonic()
+            for key in [k for k, (_, expires_at) in self._values.items() if expires_at <= now]:
+                del self._values[key]
+            return taken
+
+
+class RedisCartBackend:
+    """
+    Redis-protocol backend
+
+    Takes a redis-py compatible client, so a local stand-in (e.g. fakeredis or
+    a throwaway redis-server) works for tests.
+    """
+
+    def __init__(self, client, prefix: str = "rinos:cart:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCartBackend":
+        import redis  # Optional dependency, only needed for this backend
+        return cls(redis.Redis.from_url(url, decode_responses=True))
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def update(self, key: str, fn: Callable, ttl: int):
+        """Optimistic WATCH/MULTI transaction, retried when the key changed meanwhile"""
+        from redis.exceptions import WatchError
+
+        full_key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(full_key)
+                    new, result = fn(pipe.get(full_key))
+                    pipe.multi()
+                    if new is None:
+                        pipe.delete(full_key)
+                    else:
+                        pipe.set(full_key, new, ex=ttl)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+
+    def next_id(self) -> int:
+        return int(self.client.incr(self.prefix + "seq"))
+
+    def mark_dirty(self, member: str) -> None:
+        self.client.sadd(self.prefix + "dirty", member)
+
+    def unmark_dirty(self, member: str) -> None:
+        self.client.srem(self.prefix + "dirty", member)
+
+    def take_dirty(self, count: int) -> List[str]:
+        return self.client.spop(self.prefix + "dirty", count) or []
+
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class GuestCartStore:
+    """Guest carts on top of a backend, with write-behind to the database"""
+
+    def __init__(self, backend, ttl_seconds: int):
+        self.backend = backend
+        self.ttl = ttl_seconds
+        # Serializes database writes of this process, so an older snapshot
+        # can't overwrite a newer one
+        self._write_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def get(self, db: Session, guest_session_id: str, create: bool = True) -> Optional[GuestCart]:
+        """
+        Hot cart of a guest session, loaded from the database on a miss
+
+        With create=False, returns None if the session has no cart anywhere.
+        """
+        value = self.backend.get(f"guest:{guest_session_id}")
+        if value is not None:
+            return GuestCart.loads(value)
+
+        cart = self._load_from_db(db, guest_session_id)
+        if cart is None:
+            if not create:
+                return None
+            now = datetime.utcnow()
+            cart = GuestCart(guest_session_id, -self.backend.next_id(), now, now)
+
+        # Another request may have loaded it meanwhile - keep that copy
+        cart = self.backend.update(
+            f"guest:{guest_session_id}",
+            lambda old: (old, GuestCart.loads(old)) if old is not None else (cart.dumps(), cart),
+            self.ttl
+        )
+        self._index(cart)
+        return cart
+
+    def find_session(self, cart_item_id: int) -> Optional[str]:
+        """Guest session whose hot cart contains the line, if any"""
+        return self.backend.get(f"item:{cart_item_id}")
+
+    def _index(self, cart: GuestCart) -> None:
+        for item in cart.items:
+            self.backend.set(f"item:{item.cart_item_id}", cart.guest_session_id, self.ttl)
+
+    def _load_from_db(self, db: Session, guest_session_id: str) -> Optional[GuestCart]:
+        rows = db.query(ShoppingCart, CartItem).outerjoin(
+            CartItem, CartItem.cart_id == ShoppingCart.cart_id
+        ).filter(
+            ShoppingCart.guest_session_id == guest_session_id
+        ).order_by(CartItem.cart_item_id).all()
+
+        if not rows:
+            return None
+
+        db_cart = rows[0][0]
+        now = datetime.utcnow()
+        cart = GuestCart(
+            guest_session_id=guest_session_id,
+            cart_id=db_cart.cart_id,
+            created_at=db_cart.created_at or now,
+            updated_at=db_cart.updated_at or now,
+        )
+        cart.items = [
+            GuestCartLine(
+                cart_item_id=item.cart_item_id,
+                cart_id=cart.cart_id,
+                product_id=item.product_id,
+                articlenr=item.articlenr,
+                quantity=item.quantity,
+                price_at_addition=item.price_at_addition or Decimal("0"),
+                added_at=item.added_at or now,
+            )
+            for _, item in rows if item is not None
+        ]
+        return cart
+
+    # ------------------------------------------------------------------
+    # Mutations (all mark the cart dirty)
+    # ------------------------------------------------------------------
+
+    def mutate(self, db: Session, guest_session_id: str, fn: Callable[[GuestCart], None]) -> GuestCart:
+        """Apply fn to the cart atomically and schedule the write-behind"""
+        self.get(db, guest_session_id)
+
+        def apply(old):
+            cart = GuestCart.loads(old) if old is not None else self._load_from_db(db, guest_session_id)
+            if cart is None:
+                now = datetime.utcnow()
+                cart = GuestCart(guest_session_id, -self.backend.next_id(), now, now)
+            fn(cart)
+            cart.updated_at = datetime.utcnow()
+            return cart.dumps(), cart
+
+        cart = self.backend.update(f"guest:{guest_session_id}", apply, self.ttl)
+        self._index(cart)
+        self.backend.mark_dirty(guest_session_id)
+        return cart
+
+    def add_item(self, db: Session, guest_session_id: str, product_id: int, articlenr: str,
+                 quantity: int, price: Optional[Decimal]) -> GuestCart:
+        """Add a line or increase its quantity (max 100)"""
+        new_item_id = -self.backend.next_id()
+        price = price if price is not None else Decimal("0")
+
+        def add(cart):
+            item = cart.find_article(articlenr)
+            if item:
+                item.quantity = min(item.quantity + quantity, MAX_LINE_QUANTITY)
+            else:
+                cart.items.append(GuestCartLine(
+                    new_item_id, cart.cart_id, product_id, articlenr,
+                    min(quantity, MAX_LINE_QUANTITY), price, datetime.utcnow()
+                ))
+
+        return self.mutate(db, guest_session_id, add)
+
+    def set_quantity(self, db: Session, guest_session_id: str, cart_item_id: int,
+                     quantity: int) -> Optional[GuestCart]:
+        """Change a line's quantity, 0 removes it. None if the line doesn't exist."""
+        found = []
+
+        def update(cart):
+            item = cart.find_item(cart_item_id)
+            found.append(item is not None)
+            if item is None:
+                return
+            if quantity <= 0:
+                cart.items.remove(item)
+            else:
+                item.quantity = min(quantity, MAX_LINE_QUANTITY)
+
+        cart = self.mutate(db, guest_session_id, update)
+        return cart if found[-1] else None
+
+    def clear(self, db: Session, guest_session_id: str) -> GuestCart:
+        return self.mutate(db, guest_session_id, lambda cart: cart.items.clear())
+
+    def drop(self, guest_session_id: str) -> None:
+        """Forget a hot cart (after it was flushed and merged)"""
+        self.backend.unmark_dirty(guest_session_id)
+        self.backend.delete(f"guest:{guest_session_id}")
+
+    # ------------------------------------------------------------------
+    # Write-behind
+    # ------------------------------------------------------------------
+
+    def flush(self, db: Session, guest_session_id: str) -> Optional[int]:
+        """
+        Write a hot cart to the database now and commit
+
+        Returns the database cart_id, or None if the cart isn't hot.
+        """
+        self.backend.unmark_dirty(guest_session_id)
+        value = self.backend.get(f"guest:{guest_session_id}")
+        if value is None:
+            return None
+        try:
+            with self._write_lock:
+                cart_id, line_ids = self._write(db, GuestCart.loads(value))
+                db.commit()
+        except Exception:
+            db.rollback()
+            self.backend.mark_dirty(guest_session_id)
+            raise
+        self._adopt_ids(guest_session_id, cart_id, line_ids)
+        return cart_id
+
+    def flush_dirty(self, session_factory, batch_size: int = 100) -> int:
+        """Write all dirty carts, returns how many were written"""
+        written = 0
+        while True:
+            guest_session_ids = self.backend.take_dirty(batch_size)
+            if not guest_session_ids:
+                return written
+            db = session_factory()
+            try:
+                for guest_session_id in guest_session_ids:
+                    try:
+                        if self.flush(db, guest_session_id) is not None:
+                            written += 1
+                    except Exception as e:
+                        print(f"[WARNING] Could not write guest cart {guest_session_id}: {e}")
+            finally:
+                db.close()
+            if len(guest_session_ids) < batch_size:
+                return written
+
+    def _adopt_ids(self, guest_session_id: str, cart_id: int, line_ids: Dict[str, int]) -> None:
+        """Replace the temporary ids of the hot cart with the written database ids"""
+        def adopt(old):
+            if old is None:
+                return None, None
+            cart = GuestCart.loads(old)
+            changed = cart.cart_id != cart_id
+            cart.cart_id = cart_id
+            for item in cart.items:
+                item.cart_id = cart_id
+                # Lines are keyed by articlenr in the database; a line added
+                # after the snapshot keeps its temporary id until the next write
+                new_id = line_ids.get(item.articlenr)
+                if new_id is not None and item.cart_item_id < 0:
+                    cart.aliases[item.cart_item_id] = new_id
+                    item.cart_item_id = new_id
+                    changed = True
+            return (cart.dumps() if changed else old), cart
+
+        cart = self.backend.update(f"guest:{guest_session_id}", adopt, self.ttl)
+        if cart is not None:
+            self._index(cart)
+
+    def _write(self, db: Session, cart: GuestCart):
+        """
+        Sync one cart to shopping_carts / cart_items (lines keyed by articlenr)
+
+        Returns (cart_id, {articlenr: cart_item_id}) of the written rows.
+        """
+        cart_id = db.execute(text("""
+            INSERT INTO shopping_carts (guest_session_id, shop_id, created_at, updated_at)
+            VALUES (:guest_session_id, 1, :created_at, :updated_at)
+            ON CONFLICT (guest_session_id) DO UPDATE
+            SET updated_at = EXCLUDED.updated_at
+            RETURNING cart_id
+        """), {
+            "guest_session_id": cart.guest_session_id,
+            "created_at": cart.created_at,
+            "updated_at": cart.updated_at
+        }).scalar()
+
+        if cart.items:
+            db.execute(text("""
+                INSERT INTO cart_items (cart_id, product_id, articlenr, quantity, shop_id, price_at_addition, added_at)
+                VALUES (:cart_id, :product_id, :articlenr, :quantity, 1, :price_at_addition, :added_at)
+                ON CONFLICT (cart_id, articlenr) DO UPDATE
+                SET quantity = EXCLUDED.quantity
+            """).bindparams(bindparam("price_at_addition", type_=Numeric(10, 2))), [
+                {
+                    "cart_id": cart_id,
+                    "product_id": item.product_id,
+                    "articlenr": item.articlenr,
+                    "quantity": item.quantity,
+                    "price_at_addition": item.price_at_addition,
+                    "added_at": item.added_at
+                }
+                for item in cart.items
+            ])
+            db.execute(
+                text("DELETE FROM cart_items WHERE cart_id = :cart_id AND articlenr NOT IN :articlenrs")
+                .bindparams(bindparam("articlenrs", expanding=True)),
+                {"cart_id": cart_id, "articlenrs": [item.articlenr for item in cart.items]}
+            )
+            line_ids = dict(db.execute(
+                text("SELECT articlenr, cart_item_id FROM cart_items WHERE cart_id = :cart_id"),
+                {"cart_id": cart_id}
+            ).all())
+        else:
+            db.execute(text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {"cart_id": cart_id})
+            line_ids = {}
+
+        return cart_id, line_ids
+
+
+# ============================================================================
+# PROCESS-WIDE STORE AND WRITER
+# ============================================================================
+
+_store: Optional[GuestCartStore] = None
+_store_loaded = False
+_store_lock = threading.Lock()
+_writer_stop = threading.Event()
+
+
+def get_cart_store() -> Optional[GuestCartStore]:
+    """The configured guest cart store, or None if CART_STORE_URL is empty"""
+    global _store, _store_loaded
+
+    if _store_loaded:
+        return _store
+
+    with _store_lock:
+        if not _store_loaded:
+            url = settings.CART_STORE_URL
+            if url.startswith("redis"):
+                _store = GuestCartStore(RedisCartBackend.from_url(url), settings.CART_STORE_TTL_SECONDS)
+            elif url:
+                _store = GuestCartStore(MemoryCartBackend(), settings.CART_STORE_TTL_SECONDS)
+            _store_loaded = True
+        return _store
+
+
+def start_cart_writer(session_factory) -> Optional[threading.Thread]:
+    """Start the background thread that writes dirty guest carts (called on startup)"""
+    store = get_cart_store()
+    if store is None:
+        return None
+
+    def run():
+        while not _writer_stop.wait(settings.CART_STORE_FLUSH_SECONDS):
+            try:
+                store.flush_dirty(session_factory)
+            except Exception as e:
+                print(f"[WARNING] Guest cart write-behind failed: {e}")
+
+    _writer_stop.clear()
+    thread = threading.Thread(target=run, name="guest-cart-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_cart_writer(session_factory) -> None:
+    """Stop the writer and write what is still dirty (called on shutdown)"""
+    _writer_stop.set()
+    store = get_cart_store()
+    if store is not None:
+        written = store.flush_dirty(session_factory)
+        print(f"[OK] Guest carts written on shutdown: {written}")
@@ -0,0 +1,672 @@
+"""
+Catalog snapshot cache
+Keeps a versioned, read-only copy of the product catalog in memory
+
+The catalog only changes when the ERP sync scripts run or when an admin saves
+a product. Storefront reads are served from the snapshot instead of querying
+productdata, category, variationdata and variationcombinationdata per request.
+
+Invalidation:
+    - bump_catalog_version(db) inside the transaction that changes products
+      (admin edits) or at the end of an ERP sync (see sync_*.py scripts)
+    - invalidate_catalog_cache() drops the snapshot of the current process
+    - Every worker re-checks the catalog_version row at most every
+      CATALOG_VERSION_CHECK_SECONDS and reloads when it changed
+"""
+
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session, noload
+
+from config import settings
+from models.product import (
+    Product, Category, VariationData, VariationCombinationData,
+    product_category_association
+)
+from utils.pricing import VAT_RATES, localize_prices
+
+
+# Facet name -> product field, for /meta/filters and /meta/facets
+FACET_FIELDS = (
+    ("manufacturers", "manufacturer"),
+    ("product_groups", "productgroup"),
+    ("colours", "colour"),
+    ("sizes", "size"),
+    ("types", "type"),
+)
+
+# Facets that ignore their own filter, so the other values stay selectable
+_FACET_OWN_FILTER = {"manufacturers": "manufacturer", "product_groups": "productgroup"}
+
+# Fields returned by Product.to_simple_dict() (listing shape)
+SIMPLE_PRODUCT_FIELDS = (
+    "productid", "articlenr", "articlename", "shortdescription", "price",
+    "manufacturer", "productgroup", "is_father_article", "primary_image",
+    "colour", "size", "component", "type",
+)
+
+
+# ============================================================================
+# SNAPSHOT
+# ============================================================================
+
+class CatalogSnapshot:
+    """
+    Immutable in-memory view of the catalog
+
+    Product records have the shape of Product.to_dict(include_categories=True).
+    Records are shared between requests - use simple_dict() / product_dict()
+    to get a copy that can be modified.
+    """
+
+    def __init__(self, version, products, raw_prices, categories, category_links,
+                 variation_definitions, variation_combinations):
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # Products
+        self.products = products
+        self.raw_prices = raw_prices  # productid -> Decimal priceEUR (None if NULL)
+        self.by_articlenr = {p["articlenr"]: p for p in products}
+        self.by_productid = {p["productid"]: p for p in products}
+
+        # Localized gross price of every product per country, in cents (NULL prices left out).
+        # Rebuilt with the snapshot, i.e. after every ERP sync / admin price change.
+        priced = [(pid, price) for pid, price in raw_prices.items() if price is not None]
+        self.country_prices = {
+            country: {
+                pid: int(localized.scaleb(2))
+                for (pid, _), localized in zip(priced, localize_prices([price for _, price in priced], country))
+            }
+            for country in VAT_RATES
+        }
+
+        self.children_by_father = defaultdict(list)
+        for p in products:
+            if p["father_article"]:
+                self.children_by_father[p["father_article"]].append(p)
+
+        # Default listing order: product group, then price (NULLs last like Postgres)
+        self.listing_order = sorted(products, key=self.listing_key)
+        self.fathers = [p for p in self.listing_order if p["is_father_article"]]
+        self.newest_fathers = sorted(self.fathers, key=lambda p: p["productid"], reverse=True)
+
+        # Manufacturers of father articles with counts, ordered by name
+        manufacturer_counts = defaultdict(int)
+        for p in self.fathers:
+            if p["manufacturer"] is not None:
+                manufacturer_counts[p["manufacturer"]] += 1
+        self.manufacturer_counts = sorted(manufacturer_counts.items())
+
+        self._filters = self._build_filters()
+
+        # Facet values per product; fathers also carry the colours/sizes/types of their children
+        self.facet_values = {}
+        for p in products:
+            values = {facet: {p[field]} if p[field] else set() for facet, field in FACET_FIELDS}
+            if p["is_father_article"]:
+                for child in self.children_by_father.get(p["articlenr"], []):
+                    for facet, field in FACET_FIELDS[2:]:
+                        if child[field]:
+                            values[facet].add(child[field])
+            self.facet_values[p["productid"]] = values
+
+        # Categories
+        self.categories = categories  # list of category dicts ordered by name
+        self.categories_by_id = {c["categoryid"]: c for c in categories}
+        self.category_product_ids = defaultdict(list)
+        for productid, categoryid in category_links:
+            if productid in self.by_productid and categoryid in self.categories_by_id:
+                self.category_product_ids[categoryid].append(productid)
+
+        # Category summary, computed once per catalog version
+        self.category_father_counts = {
+            categoryid: sum(1 for pid in set(pids) if self.by_productid[pid]["is_father_article"])
+            for categoryid, pids in self.category_product_ids.items()
+        }
+        self.category_tree = build_category_tree(
+            categories, self.category_counts(), self.category_father_counts
+        )
+
+        # Variations (keyed by father articlenr)
+        self.variation_definitions = variation_definitions
+        self.variation_combinations = variation_combinations
+
+        father_articles = (
+            {p["articlenr"] for p in self.fathers}
+            | set(self.children_by_father)
+            | set(variation_combinations)
+        )
+        self.variation_matrices = {
+            father: self._build_variation_matrix(father)
+            for father in father_articles if father
+        }
+
+    def _build_variation_matrix(self, father_articlenr):
+        return VariationMatrix(
+            father_articlenr,
+            self.children_by_father.get(father_articlenr, []),
+            self.variation_definitions.get(father_articlenr, []),
+            self.variation_combinations.get(father_articlenr, []),
+        )
+
+    def _build_filters(self):
+        def distinct(records, field):
+            return sorted({p[field] for p in records if p[field]})
+
+        return {
+            "manufacturers": distinct(self.fathers, "manufacturer"),
+            "product_groups": distinct(self.fathers, "productgroup"),
+            "colours": distinct(self.products, "colour"),
+            "sizes": distinct(self.products, "size"),
+            "types": distinct(self.products, "type")
+        }
+
+    # Types of the listing_key() values, to validate decoded cursors
+    LISTING_KEY_TYPES = ((bool,), (str,), (bool,), (Decimal, int), (int,))
+
+    def listing_key(self, record):
+        """Sort key of listing_order (also used as the pagination cursor)"""
+        price = self.raw_prices.get(record["productid"])
+        group = record["productgroup"]
+        return (
+            group is None, group or "",
+            price is None, price if price is not None else 0,
+            record["productid"],
+        )
+
+    # ------------------------------------------------------------------
+    # Serialization helpers (always return fresh dicts)
+    # ------------------------------------------------------------------
+
+    def simple_dict(self, record, include_categories=True):
+        """Listing shape (same as Product.to_simple_dict)"""
+        data = {field: record[field] for field in SIMPLE_PRODUCT_FIELDS}
+        if include_categories:
+            data["categories"] = list(record["categories"])
+        return data
+
+    def product_dict(self, record, include_categories=True):
+        """Detail shape (same as Product.to_dict)"""
+        data = dict(record)
+        data["images"] = list(record["images"])
+        if include_categories:
+            data["categories"] = list(record["categories"])
+        else:
+            data.pop("categories", None)
+        return data
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get_product(self, articlenr: str) -> Optional[dict]:
+        return self.by_articlenr.get(articlenr)
+
+    def localized_price(self, productid: int, country: str) -> Optional[Decimal]:
+        """Gross price for a country (same as convert_price_by_country), None if the price is NULL"""
+        cents = self.country_prices[country.upper()].get(productid)
+        return Decimal(cents).scaleb(-2) if cents is not None else None
+
+    def products_in_category(self, categoryid: int, only_fathers: bool = True) -> list:
+        """Products linked to a category, in productid order"""
+        records = [self.by_productid[pid] for pid in sorted(set(self.category_product_ids.get(categoryid, [])))]
+        if only_fathers:
+            records = [p for p in records if p["is_father_article"]]
+        return records
+
+    def variation_matrix(self, father_articlenr: str) -> "VariationMatrix":
+        """Precomputed variant picker data (empty matrix for unknown fathers)"""
+        matrix = self.variation_matrices.get(father_articlenr)
+        if matrix is None:
+            matrix = self._build_variation_matrix(father_articlenr)
+        return matrix
+
+    def find_category(self, name: str) -> Optional[dict]:
+        """First category whose name contains `name` (case-insensitive, like ILIKE '%name%')"""
+        needle = name.lower()
+        for cat in self.categories:
+            if cat["category"] and needle in cat["category"].lower():
+                return cat
+        return None
+
+    def available_filters(self, country: str = "AT") -> dict:
+        """
+        Filter options for /meta/filters (copy)
+
+        The price range covers the father articles' gross prices of `country`,
+        the same prices the min_price / max_price listing filter compares.
+        """
+        filters = {key: list(values) for key, values in self._filters.items()}
+        prices = self.country_prices[country.upper()]
+        father_prices = [
+            prices[p["productid"]] for p in self.fathers if p["productid"] in prices
+        ]
+        filters["price_range"] = {
+            "min": float(Decimal(min(father_prices)).scaleb(-2)) if father_prices else 0,
+            "max": float(Decimal(max(father_prices)).scaleb(-2)) if father_prices else 0
+        }
+        return filters
+
+    # ------------------------------------------------------------------
+    # Filtering and facets
+    # ------------------------------------------------------------------
+
+    def filter_checks(self, productgroup=None, manufacturer=None, category_product_ids=None,
+                      min_price=None, max_price=None, country=None) -> dict:
+        """
+        Listing filters as predicates, keyed by filter name
+
+        Same semantics as the former SQL filters: ILIKE '%value%' on
+        productgroup / manufacturer and a price range (NULL prices excluded).
+        With a country, the range applies to that country's gross prices,
+        otherwise to priceEUR.
+        """
+        prices, to_unit = self._price_table(country)
+        checks = {}
+        if productgroup:
+            productgroup_term = productgroup.lower()
+            checks["productgroup"] = lambda p: productgroup_term in (p["productgroup"] or "").lower()
+        if manufacturer:
+            manufacturer_term = manufacturer.lower()
+            checks["manufacturer"] = lambda p: manufacturer_term in (p["manufacturer"] or "").lower()
+        if min_price is not None or max_price is not None:
+            low = to_unit(min_price) if min_price is not None else None
+            high = to_unit(max_price) if max_price is not None else None
+
+            def price_in_range(p):
+                price = prices.get(p["productid"])
+                if price is None:
+                    return False
+                if low is not None and price < low:
+                    return False
+                if high is not None and price > high:
+                    return False
+                return True
+            checks["price"] = price_in_range
+        if category_product_ids is not None:
+            checks["category"] = lambda p: p["productid"] in category_product_ids
+        return checks
+
+    def _price_table(self, country=None):
+        """
+        Prices used for filtering as (productid -> price, converter for bounds)
+
+        priceEUR as is, or a country's localized prices in cents.
+        """
+        if country is None:
+            return self.raw_prices, lambda bound: bound
+        return self.country_prices[country.upper()], lambda bound: Decimal(str(bound)).scaleb(2)
+
+    def facet_counts(self, records, checks: dict, country=None) -> dict:
+        """
+        Per-value product counts for every facet in one pass over `records`
+
+        A facet ignores its own filter (manufacturer counts are computed as if no
+        manufacturer was selected) and the price range ignores the price filter.
+        The price range is in `country` gross prices if given, else priceEUR.
+        """
+        prices, _ = self._price_table(country)
+        counts = {facet: defaultdict(int) for facet, _ in FACET_FIELDS}
+        total = 0
+        min_price = max_price = None
+
+        for p in records:
+            failed = [name for name, check in checks.items() if not check(p)]
+            if len(failed) > 1:
+                continue
+
+            if not failed:
+                total += 1
+            values = self.facet_values[p["productid"]]
+            for facet, _ in FACET_FIELDS:
+                if not failed or failed[0] == _FACET_OWN_FILTER.get(facet):
+                    for value in values[facet]:
+                        counts[facet][value] += 1
+
+            price = prices.get(p["productid"])
+            if price is not None and (not failed or failed[0] == "price"):
+                min_price = price if min_price is None else min(min_price, price)
+                max_price = price if max_price is None else max(max_price, price)
+
+        facets = {
+            facet: [{"value": value, "count": count} for value, count in sorted(counts[facet].items())]
+            for facet, _ in FACET_FIELDS
+        }
+        if country is not None:
+            min_price = Decimal(min_price).scaleb(-2) if min_price is not None else None
+            max_price = Decimal(max_price).scaleb(-2) if max_price is not None else None
+        facets["price_range"] = {
+            "min": float(min_price) if min_price else 0,
+            "max": float(max_price) if max_price else 0
+        }
+        return {"total": total, "facets": facets}
+
+    def category_counts(self) -> dict:
+        """categoryid -> number of linked products (fathers and children)"""
+        return {cid: len(pids) for cid, pids in self.category_product_ids.items()}
+
+
+# ============================================================================
+# CATEGORY TREE
+# ============================================================================
+
+CATEGORY_PATH_SEPARATOR = " - "  # e.g. "Fahrräder - Rennräder - Gravel Bikes"
+
+
+def build_category_tree(categories, product_counts, father_counts) -> list:
+    """
+    Nested category nodes parsed from categorypath
+
+    Same rules as frontend/lib/categoryTree.ts buildCategoryTree(): shallow
+    paths first, parent looked up by name, then by path suffix, and nodes
+    without a known parent become roots. Nodes are shared - treat as read-only.
+    """
+    def path_parts(cat):
+        return [part.strip() for part in (cat["categorypath"] or "").split(CATEGORY_PATH_SEPARATOR) if part.strip()]
+
+    valid = [cat for cat in categories if cat["category"] and cat["category"] != "0"]
+    tree = []
+    nodes_by_name = {}
+
+    # sorted() is stable, so categories keep their name order within a level
+    for cat in sorted(valid, key=lambda c: len(path_parts(c))):
+        parts = path_parts(cat)
+        node = {
+            "categoryid": cat["categoryid"],
+            "category": cat["category"],
+            "categorypath": cat["categorypath"],
+            "categoryimageurl": cat["categoryimageurl"],
+            "product_count": product_counts.get(cat["categoryid"], 0),
+            "father_count": father_counts.get(cat["categoryid"], 0),
+            "level": len(parts),
+            "children": []
+        }
+
+        parent = None
+        if len(parts) > 1:
+            parent = nodes_by_name.get(parts[-2])
+            if parent is None:
+                parent_path = CATEGORY_PATH_SEPARATOR.join(parts[:-1])
+                parent = next(
+                    (n for n in nodes_by_name.values() if (n["categorypath"] or "").endswith(parent_path)),
+                    None
+                )
+
+        if parent is not None:
+            parent["children"].append(node)
+        else:
+            tree.append(node)
+        nodes_by_name[cat["category"]] = node
+
+    return tree
+
+
+# ============================================================================
+# VARIATION MATRIX
+# ============================================================================
+
+VARIATION_ATTRIBUTES = ("colour", "size", "type", "component")
+
+
+def _selection_key(pairs) -> str:
+    """Stable lookup key for a set of (type, value) pairs, e.g. 'Farbe=Blau|Größe=M'"""
+    return "|".join(f"{t}={v}" for t, v in sorted(pairs, key=lambda pair: pair[0]))
+
+
+class VariationMatrix:
+    """
+    Precomputed variant picker data for one father article
+
+    Built once per snapshot, so /{articlenr}/variations does not re-serialize
+    every child per attribute on each request. Treat all attributes as read-only.
+    """
+
+    def __init__(self, father_articlenr, children, definitions, combinations):
+        self.father_articlenr = father_articlenr
+
+        # Child products in listing shape
+        self.variations = [
+            {field: child[field] for field in SIMPLE_PRODUCT_FIELDS}
+            for child in children
+        ]
+
+        # Sort positions from variationdata (variationsortnr / variationvaluesortnr)
+        type_rank = {}
+        value_rank = {}
+        for position, vd in enumerate(definitions):
+            if not vd["variation"]:
+                continue
+            type_rank.setdefault(vd["variation"], position)
+            if vd["variationvalue"]:
+                value_rank.setdefault((vd["variation"], vd["variationvalue"]), position)
+
+        # Combinations and option values actually used by children
+        self.variation_combinations = []
+        self.combination_lookup = {}
+        seen_values = {}
+        for vc in combinations:
+            pairs = []
+            for i in (1, 2, 3):
+                variation_type = vc[f"variation{i}"]
+                variation_value = vc[f"variationvalue{i}"]
+                if not variation_type:
+                    continue
+                pairs.append({"type": variation_type, "value": variation_value})
+                if variation_value:
+                    # dicts as ordered sets (first appearance wins)
+                    seen_values.setdefault(variation_type, {})[variation_value] = None
+
+            self.variation_combinations.append({
+                "articlenr": vc["articlenr"] or "",
+                "variations": pairs
+            })
+            if vc["articlenr"]:
+                self.combination_lookup[_selection_key(
+                    (pair["type"], pair["value"]) for pair in pairs if pair["value"]
+                )] = vc["articlenr"]
+
+        # Ordered option lists: variationdata order first, unknown values in order of appearance
+        unranked = len(definitions)
+
+        def ordered(items, rank):
+            return [
+                item for _, _, item in sorted(
+                    (rank(item), appearance, item) for appearance, item in enumerate(items)
+                )
+            ]
+
+        self.variation_options = {
+            t: ordered(seen_values[t], lambda v, t=t: value_rank.get((t, v), unranked))
+            for t in ordered(seen_values, lambda t: type_rank.get(t, unranked))
+        }
+
+        # Children grouped by product attribute values
+        self.grouped_by_attribute = {}
+        for child, child_dict in zip(children, self.variations):
+            for attr in VARIATION_ATTRIBUTES:
+                val = child[attr]
+                if val:
+                    self.grouped_by_attribute.setdefault(attr, {}).setdefault(val, []).append(child_dict)
+
+    def find_articlenr(self, selection: dict) -> Optional[str]:
+        """Child article for a full selection like {"Farbe": "Blau", "Größe": "M"}"""
+        return self.combination_lookup.get(_selection_key(selection.items()))
+
+
+# ============================================================================
+# LOADING
+# ============================================================================
+
+def load_catalog_snapshot(db: Session, version=None) -> CatalogSnapshot:
+    """
+    Build a snapshot with one query per catalog table
+
+    Args:
+        db: Database session
+        version: catalog_version value the snapshot belongs to
+
+    Returns:
+        CatalogSnapshot
+    """
+    products = db.query(Product).options(noload(Product.categories)).order_by(Product.productid).all()
+
+    categories = db.query(Category).order_by(Category.category).all()
+    category_dicts = [c.to_dict() for c in categories]
+    categories_by_id = {c["categoryid"]: c for c in category_dicts}
+
+    category_links = db.query(
+        product_category_association.c.productid,
+        product_category_association.c.categoryid
+    ).order_by(
+        product_category_association.c.productid,
+        product_category_association.c.categoryid
+    ).all()
+
+    categories_by_product = defaultdict(list)
+    for productid, categoryid in category_links:
+        if categoryid in categories_by_id:
+            categories_by_product[productid].append(categories_by_id[categoryid])
+
+    records = []
+    raw_prices = {}
+    for p in products:
+        record = p.to_dict(include_categories=False)
+        record["categories"] = categories_by_product.get(p.productid, [])
+        records.append(record)
+        raw_prices[p.productid] = p.priceEUR
+
+    variation_definitions = defaultdict(list)
+    for vd in db.query(VariationData).order_by(
+        VariationData.fatherarticle,
+        VariationData.variationsortnr.asc().nullslast(),
+        VariationData.variationvaluesortnr.asc().nullslast()
+    ).all():
+        variation_definitions[vd.fatherarticle].append(vd.to_dict())
+
+    variation_combinations = defaultdict(list)
+    for vc in db.query(VariationCombinationData).order_by(
+        VariationCombinationData.variationcombinationid
+    ).all():
+        variation_combinations[vc.fatherarticle].append({
+            "articlenr": vc.articlenr,
+            "variation1": vc.variation1,
+            "variationvalue1": vc.variationvalue1,
+            "variation2": vc.variation2,
+            "variationvalue2": vc.variationvalue2,
+            "variation3": vc.variation3,
+            "variationvalue3": vc.variationvalue3,
+        })
+
+    return CatalogSnapshot(
+        version=version,
+        products=records,
+        raw_prices=raw_prices,
+        categories=category_dicts,
+        category_links=category_links,
+        variation_definitions=dict(variation_definitions),
+        variation_combinations=dict(variation_combinations),
+    )
+
+
+# ============================================================================
+# VERSION COUNTER
+# ============================================================================
+
+def read_catalog_version(db: Session):
+    """
+    Read the shared catalog version
+
+    Returns None if the catalog_version table does not exist yet
+    (migration 003 not applied) - the snapshot then falls back to
+    CATALOG_CACHE_MAX_AGE_SECONDS.
+    """
+    try:
+        with db.begin_nested():
+            return db.execute(text("SELECT version FROM catalog_version WHERE id = 1")).scalar()
+    except Exception as e:
+        print(f"[WARNING] Could not read catalog_version: {e}")
+        return None
+
+
+def bump_catalog_version(db: Session) -> None:
+    """
+    Increment the shared catalog version inside the caller's transaction
+
+    Call before db.commit() of any change to products, categories or variations.
+    """
+    try:
+        with db.begin_nested():
+            db.execute(text("""
+                INSERT INTO catalog_version (id, version, updated_at)
+                VALUES (1, 1, NOW())
+                ON CONFLICT (id) DO UPDATE
+                SET version = catalog_version.version + 1, updated_at = NOW()
+            """))
+    except Exception as e:
+        print(f"[WARNING] Could not bump catalog_version: {e}")
+
+
+# ============================================================================
+# PROCESS-WIDE CACHE
+# ============================================================================
+
+_snapshot: Optional[CatalogSnapshot] = None
+_last_version_check = 0.0
+_lock = threading.Lock()
+
+
+def _is_fresh(snapshot: Optional[CatalogSnapshot], now: float) -> bool:
+    return (
+        snapshot is not None
+        and now - _last_version_check < settings.CATALOG_VERSION_CHECK_SECONDS
+        and now - snapshot.loaded_at < settings.CATALOG_CACHE_MAX_AGE_SECONDS
+    )
+
+
+def get_catalog_snapshot(db: Session) -> CatalogSnapshot:
+    """
+    Get the current catalog snapshot, loading it on first use or after a version change
+
+    Args:
+        db: Database session (only used when the version must be checked or the
+            snapshot reloaded)
+    """
+    global _snapshot, _last_version_check
+
+    snapshot = _snapshot
+    if _is_fresh(snapshot, time.monotonic()):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        now = time.monotonic()
+        if _is_fresh(snapshot, now):
+            return snapshot
+
+        version = read_catalog_version(db)
+        expired = snapshot is not None and now - snapshot.loaded_at >= settings.CATALOG_CACHE_MAX_AGE_SECONDS
+
+        if snapshot is None or expired or snapshot.version != version:
+            started = time.perf_counter()
+            snapshot = load_catalog_snapshot(db, version)
+            print(
+                f"[OK] Catalog snapshot loaded: version={version}, "
+                f"{len(snapshot.products)} products in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            _snapshot = snapshot
+
+        _last_version_check = time.monotonic()
+        return snapshot
+
+
+def invalidate_catalog_cache() -> None:
+    """Drop the snapshot of this process (next read reloads it)"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -0,0 +1,268 @@
+"""
+Checkout pipeline
+Turns a cart into a web order with server-side prices and reserved stock
+
+create_order() runs in one short transaction:
+    1. re-price all lines with one product query (client prices are ignored;
+       gross prices of PRICE_COUNTRY, the same the customer saw in the cart)
+    2. take the order number (own tiny transaction, see utils/order_numbers.py)
+    3. lock the inventorydata rows of the ordered articles (FOR UPDATE, sorted
+       by articlenr so concurrent checkouts can't deadlock), subtract active
+       reservations and refuse the order if anything is short; articles
+       without inventory rows are refused too (NotStocked)
+    4. insert the order, then its lines and reservations as bulk inserts
+    5. commit - the inventory row locks are held only for steps 3-5
+
+Reservations are 'held' for STOCK_RESERVATION_MINUTES. Payment success commits
+them, payment failure or refund releases them. Held reservations that expire
+stop counting immediately (see utils/stock.py) and are deleted by the cleanup
+(utils/cleanup.py). inventorydata itself is never changed - it belongs to the
+ERP sync.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.connection import Base
+from models.order import WebOrder, WebOrderItem, StockReservation
+from models.product import Product, InventoryData
+from utils.pricing import localize_prices
+from utils.stock import load_reserved, invalidate_stock_cache
+
+
+# Largest quantity of one article per order (same cap as the cart)
+MAX_QUANTITY = 100
+
+# Country whose gross prices the shop shows: the product and cart endpoints
+# default to AT and the storefront never passes another one. The checkout page
+# keeps that gross price for every delivery country ("FIXED PRICE STRATEGY" in
+# frontend/app/checkout/page.tsx), so orders are priced in it as well.
+PRICE_COUNTRY = "AT"
+
+
+class CheckoutError(ValueError):
+    """Cart can't be ordered (unknown article, bad quantity)"""
+
+
+class OutOfStock(CheckoutError):
+    """Not enough orderable stock; shortages is [{articlenr, requested, available}]"""
+
+    def __init__(self, shortages: List[dict]):
+        self.shortages = shortages
+        super().__init__("Not enough stock for " + ", ".join(s["articlenr"] for s in shortages))
+
+
+class NotStocked(OutOfStock):
+    """
+    Articles without any inventorydata row
+
+    Untracked articles are not orderable: the shop shows them as out of stock
+    (utils/stock.py), and without an inventory row there is nothing to lock,
+    so concurrent orders for them couldn't be serialized.
+    """
+
+    def __init__(self, articlenrs: List[str]):
+        self.shortages = [{"articlenr": a, "requested": None, "available": 0} for a in articlenrs]
+        CheckoutError.__init__(
+            self, "Not stocked (no inventory record) and can't be ordered: " + ", ".join(articlenrs)
+        )
+
+
+def ensure_checkout_tables(engine) -> None:
+    """Create web_order_items and stock_reservations if missing (called on startup)"""
+    Base.metadata.create_all(
+        bind=engine, tables=[WebOrderItem.__table__, StockReservation.__table__]
+    )
+
+
+# ============================================================================
+# PRICING
+# ============================================================================
+
+def collect_quantities(cart_items: List[dict]) -> Dict[str, int]:
+    """{articlenr: quantity} from client cart lines (duplicate lines are added up)"""
+    quantities = {}
+    for item in cart_items:
+        articlenr = item.get('articlenr')
+        try:
+            quantity = int(item.get('quantity', 0))
+        except (TypeError, ValueError):
+            raise CheckoutError(f"Invalid quantity for {articlenr}")
+        if not articlenr or quantity < 1:
+            raise CheckoutError(f"Invalid cart line: {articlenr} x {item.get('quantity')}")
+        quantities[articlenr] = quantities.get(articlenr, 0) + quantity
+
+    for articlenr, quantity in quantities.items():
+        if quantity > MAX_QUANTITY:
+            raise CheckoutError(f"At most {MAX_QUANTITY} of {articlenr} per order")
+    return quantities
+
+
+def price_lines(db: Session, quantities: Dict[str, int], country: str = PRICE_COUNTRY) -> List[dict]:
+    """
+    Order lines with current gross prices of the country
+
+    One query for all articles; prices are localized in one batch.
+    """
+    products = {
+        row.articlenr: row for row in db.query(
+            Product.productid, Product.articlenr, Product.articlename, Product.priceEUR
+        ).filter(Product.articlenr.in_(list(quantities))).all()
+    }
+
+    missing = [a for a in quantities if a not in products or products[a].priceEUR is None]
+    if missing:
+        raise CheckoutError(f"Unknown articles: {', '.join(missing)}")
+
+    articlenrs = list(quantities)
+    unit_prices = localize_prices([products[a].priceEUR for a in articlenrs], country)
+    return [
+        {
+            "product_id": products[articlenr].productid,
+            "articlenr": articlenr,
+            "articlename": products[articlenr].articlename,
+            "quantity": quantities[articlenr],
+            "unit_price": unit_price,
+            "line_total": unit_price * quantities[articlenr],
+        }
+        for articlenr, unit_price in zip(articlenrs, unit_prices)
+    ]
+
+
+# ============================================================================
+# RESERVATIONS
+# ============================================================================
+
+def lock_available_stock(db: Session, quantities: Dict[str, int], now: datetime) -> Dict[str, int]:
+    """
+    Lock the inventory rows of the articles and return their orderable stock
+
+    The locks are held until the caller's transaction ends, so nobody else
+    can reserve the same articles in between.
+
+    Raises:
+        NotStocked: An article has no inventory row (nothing to lock)
+    """
+    articlenrs = sorted(quantities)
+    on_hand = {}
+    rows = db.query(InventoryData.articlenr, InventoryData.quantity).filter(
+        InventoryData.articlenr.in_(articlenrs)
+    ).order_by(InventoryData.articlenr, InventoryData.inventoryid).with_for_update().all()
+    for articlenr, quantity in rows:
+        on_hand[articlenr] = on_hand.get(articlenr, 0) + (quantity or 0)
+
+    untracked = [articlenr for articlenr in articlenrs if articlenr not in on_hand]
+    if untracked:
+        raise NotStocked(untracked)
+
+    reserved = load_reserved(db, articlenrs, now)
+    return {articlenr: on_hand[articlenr] - reserved[articlenr] for articlenr in articlenrs}
+
+
+def commit_reservations(db: Session, web_order_id: int) -> int:
+    """Order paid: keep its stock until the order reaches the ERP (caller commits)"""
+    return db.query(StockReservation).filter(
+        StockReservation.web_order_id == web_order_id,
+        StockReservation.status == 'held'
+    ).update({"status": "committed", "expires_at": None}, synchronize_session=False)
+
+
+def release_reservations(db: Session, web_order_id: int) -> int:
+    """Payment failed or refunded: give the order's stock back (caller commits)"""
+    articlenrs = [
+        row[0] for row in db.query(StockReservation.articlenr).filter(
+            StockReservation.web_order_id == web_order_id
+        ).all()
+    ]
+    if not articlenrs:
+        return 0
+    released = db.query(StockReservation).filter(
+        StockReservation.web_order_id == web_order_id
+    ).delete(synchronize_session=False)
+    invalidate_stock_cache(articlenrs)
+    return released
+
+
+# ============================================================================
+# ORDER
+# ============================================================================
+
+def create_order(db: Session, ordernr_factory, cart_items: List[dict],
+                 country: str = PRICE_COUNTRY, user_id: Optional[int] = None, now: Optional[datetime] = None):
+    """
+    Create a web order with its lines and stock reservations, and commit
+
+    Args:
+        db: Database session
+        ordernr_factory: Callable(db) -> new order number
+        cart_items: Client cart lines ({articlenr, quantity}; prices are ignored)
+        country: Country the prices are localized to (default: the shop's
+            PRICE_COUNTRY - not the delivery country, see above)
+        user_id: Web user, None for guests
+        now: Reference time (default: now, naive UTC)
+
+    Returns:
+        (web_order, lines, reserved_until)
+
+    Raises:
+        CheckoutError: Unknown article or invalid quantity
+        OutOfStock: Not enough stock for one or more articles
+        NotStocked: An article has no inventory row at all
+    """
+    now = now or datetime.utcnow()
+    quantities = collect_quantities(cart_items)
+    lines = price_lines(db, quantities, country)
+    total_amount = sum((line["line_total"] for line in lines), Decimal("0.00"))
+    ordernr = ordernr_factory(db)
+    reserved_until = now + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+
+    try:
+        available = lock_available_stock(db, quantities, now)
+        shortages = [
+            {"articlenr": a, "requested": quantities[a], "available": max(available[a], 0)}
+            for a in sorted(quantities) if available[a] < quantities[a]
+        ]
+        if shortages:
+            raise OutOfStock(shortages)
+
+        web_order = WebOrder(
+            ordernr=ordernr,
+            shop_id=1,  # rinosbikeat shop
+            user_id=user_id,
+            customer_id=None,  # Will be linked later if customer exists
+            orderamount=total_amount,
+            currency='EUR',
+            payment_status='pending',
+            synced_to_erp=False,
+            created_at=now,
+            updated_at=now
+        )
+        db.add(web_order)
+        db.flush()
+
+        db.execute(insert(WebOrderItem), [
+            dict(line, web_order_id=web_order.web_order_id, created_at=now) for line in lines
+        ])
+        db.execute(insert(StockReservation), [
+            {
+                "web_order_id": web_order.web_order_id,
+                "articlenr": line["articlenr"],
+                "quantity": line["quantity"],
+                "status": "held",
+                "expires_at": reserved_until,
+                "created_at": now,
+            }
+            for line in lines
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidate_stock_cache(quantities)
+    return web_order, lines, reserved_until
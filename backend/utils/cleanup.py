@@ -0,0 +1,248 @@
+"""
+Expired data cleanup
+Deletes abandoned guest carts, expired tokens, inactive sessions, stock
+reservations that no longer hold stock, expired idempotency keys, old applied
+Stripe webhook events and old sent emails
+
+Without cleanup shopping_carts, cart_items, email_verification_tokens,
+password_reset_tokens, user_sessions, stock_reservations, idempotency_keys,
+stripe_webhook_events and email_outbox only grow, and their indexes with them.
+
+Rows are deleted in batches of CLEANUP_BATCH_SIZE, each in its own short
+transaction, so a run never holds many locks or builds a huge transaction.
+Rows locked by a request are skipped (FOR UPDATE SKIP LOCKED) and picked up by
+the next run, so several API instances can run the cleanup at the same time.
+
+Run it:
+    - from the command line: python cleanup_expired.py [--dry-run] [--vacuum]
+    - in the API process: CLEANUP_INTERVAL_MINUTES > 0 starts a background thread
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import exists, func, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import ShoppingCart, CartItem, StockReservation, WebOrder, IdempotencyKey, StripeWebhookEvent
+from models.email import EmailOutbox
+from models.user import EmailVerificationToken, PasswordResetToken, UserSession
+
+
+# Tables touched by the cleanup (for size reports and VACUUM)
+CLEANUP_TABLES = (
+    "shopping_carts", "cart_items", "email_verification_tokens",
+    "password_reset_tokens", "user_sessions", "stock_reservations",
+    "idempotency_keys", "stripe_webhook_events", "email_outbox",
+)
+
+
+# ============================================================================
+# CONDITIONS
+# ============================================================================
+
+def cleanup_rules(now: datetime) -> list:
+    """
+    What gets deleted, as (name, model, primary key, condition, dependent rows)
+
+    Dependent rows are (model, foreign key column) deleted before the parent.
+    """
+    cart_last_used = func.coalesce(ShoppingCart.updated_at, ShoppingCart.created_at)
+    cart_is_empty = ~exists().where(CartItem.cart_id == ShoppingCart.cart_id)
+    used_token_cutoff = now - timedelta(days=1)
+
+    return [
+        (
+            "guest_carts",
+            ShoppingCart,
+            ShoppingCart.cart_id,
+            ShoppingCart.user_id.is_(None) & (
+                (cart_last_used < now - timedelta(days=settings.CLEANUP_GUEST_CART_DAYS))
+                | (cart_is_empty & (cart_last_used < now - timedelta(hours=settings.CLEANUP_EMPTY_CART_HOURS)))
+            ),
+            [(CartItem, CartItem.cart_id)],
+        ),
+        (
+            "email_verification_tokens",
+            EmailVerificationToken,
+            EmailVerificationToken.token_id,
+            (EmailVerificationToken.expires_at < now)
+            | (EmailVerificationToken.used.is_(True) & (EmailVerificationToken.created_at < used_token_cutoff)),
+            [],
+        ),
+        (
+            "password_reset_tokens",
+            PasswordResetToken,
+            PasswordResetToken.token_id,
+            (PasswordResetToken.expires_at < now)
+            | (PasswordResetToken.used.is_(True) & (PasswordResetToken.created_at < used_token_cutoff)),
+            [],
+        ),
+        (
+            "user_sessions",
+            UserSession,
+            UserSession.session_id,
+            (UserSession.expires_at < now) | UserSession.is_active.is_(False),
+            [],
+        ),
+        (
+            # Expired holds, and paid orders' stock once the ERP has the order
+            "stock_reservations",
+            StockReservation,
+            StockReservation.reservation_id,
+            ((StockReservation.status == 'held') & (StockReservation.expires_at < now))
+            | ((StockReservation.status == 'committed') & exists().where(
+                (WebOrder.web_order_id == StockReservation.web_order_id) & WebOrder.synced_to_erp.is_(True)
+            )),
+            [],
+        ),
+        (
+            "idempotency_keys",
+            IdempotencyKey,
+            IdempotencyKey.idempotency_key_id,
+            IdempotencyKey.expires_at < now,
+            [],
+        ),
+        (
+            # Failed events stay for inspection (process_webhooks.py --retry-failed)
+            "stripe_webhook_events",
+            StripeWebhookEvent,
+            StripeWebhookEvent.webhook_event_id,
+            (StripeWebhookEvent.status == 'processed')
+            & (StripeWebhookEvent.processed_at < now - timedelta(days=settings.CLEANUP_WEBHOOK_EVENT_DAYS)),
+            [],
+        ),
+        (
+            # Failed emails stay for inspection (send_emails.py --retry-failed)
+            "sent_emails",
+            EmailOutbox,
+            EmailOutbox.email_id,
+            (EmailOutbox.status == 'sent')
+            & (EmailOutbox.sent_at < now - timedelta(days=settings.CLEANUP_SENT_EMAIL_DAYS)),
+            [],
+        ),
+    ]
+
+
+# ============================================================================
+# DELETION
+# ============================================================================
+
+def delete_in_batches(db: Session, model, primary_key, condition, dependents=(),
+                      batch_size: int = 1000, max_batches: int = 100) -> int:
+    """
+    Delete rows matching condition, batch_size rows per transaction
+
+    Returns the number of deleted rows (dependent rows not included).
+    """
+    removed = 0
+    for _ in range(max_batches):
+        ids = [
+            row[0] for row in db.query(primary_key).filter(condition)
+            .order_by(primary_key).limit(batch_size)
+            .with_for_update(skip_locked=True).all()
+        ]
+        if not ids:
+            break
+
+        for dependent_model, foreign_key in dependents:
+            db.query(dependent_model).filter(foreign_key.in_(ids)).delete(synchronize_session=False)
+        removed += db.query(model).filter(primary_key.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+
+        if len(ids) < batch_size:
+            break
+    return removed
+
+
+def run_cleanup(db: Session, now: Optional[datetime] = None, dry_run: bool = False,
+                batch_size: Optional[int] = None, max_batches: int = 100) -> dict:
+    """
+    Delete all expired rows
+
+    Args:
+        db: Database session
+        now: Reference time (default: now, naive UTC like the rest of the schema)
+        dry_run: Only count what would be deleted
+        batch_size: Rows per transaction (default CLEANUP_BATCH_SIZE)
+        max_batches: Upper bound of batches per table and run
+
+    Returns:
+        {name: rows deleted (or matching, with dry_run)}
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.CLEANUP_BATCH_SIZE
+
+    report = {}
+    for name, model, primary_key, condition, dependents in cleanup_rules(now):
+        try:
+            if dry_run:
+                report[name] = db.query(func.count(primary_key)).filter(condition).scalar()
+            else:
+                report[name] = delete_in_batches(
+                    db, model, primary_key, condition, dependents, batch_size, max_batches
+                )
+        except Exception as e:
+            # A missing table (migration not applied) shouldn't stop the others
+            db.rollback()
+            print(f"[WARNING] Cleanup of {name} failed: {e}")
+            report[name] = None
+    return report
+
+
+def table_sizes(db: Session) -> dict:
+    """Total size (table + indexes) in bytes per cleaned table (Postgres)"""
+    sizes = {}
+    for table in CLEANUP_TABLES:
+        try:
+            with db.begin_nested():
+                sizes[table] = db.execute(
+                    text("SELECT pg_total_relation_size(to_regclass(:table))"), {"table": table}
+                ).scalar()
+        except Exception:
+            sizes[table] = None
+    return sizes
+
+
+def vacuum_tables(engine) -> None:
+    """VACUUM (ANALYZE) the cleaned tables so freed space is reused (Postgres)"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in CLEANUP_TABLES:
+            conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+
+
+# ============================================================================
+# PERIODIC TASK
+# ============================================================================
+
+_cleanup_stop = threading.Event()
+
+
+def start_cleanup_task(session_factory) -> Optional[threading.Thread]:
+    """Run the cleanup every CLEANUP_INTERVAL_MINUTES in a background thread (0 = off)"""
+    interval = settings.CLEANUP_INTERVAL_MINUTES * 60
+    if interval <= 0:
+        return None
+
+    def run():
+        while not _cleanup_stop.wait(interval):
+            db = session_factory()
+            try:
+                report = run_cleanup(db)
+                if any(report.values()):
+                    print(f"[OK] Cleanup removed: {report}")
+            except Exception as e:
+                print(f"[WARNING] Cleanup failed: {e}")
+            finally:
+                db.close()
+
+    _cleanup_stop.clear()
+    thread = threading.Thread(target=run, name="cleanup", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_cleanup_task() -> None:
+    _cleanup_stop.set()
@@ -0,0 +1,88 @@
+"""
+Order number counters
+Atomic per-shop, per-year numbering for web orders (see migrations/005_create_order_number_counters.sql)
+
+Each (shop, prefix, year) has one row in order_number_counters. The next number
+is taken with a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING, which
+locks only that row - O(1) and collision-free under concurrent checkouts.
+
+The counter runs in its own short transaction (like a Postgres sequence), so
+checkouts don't queue behind each other's open transactions. A checkout that
+rolls back leaves a gap in the numbering, never a duplicate.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+DEFAULT_SHOP_ID = "rinosbikeat"
+
+CREATE_COUNTERS_SQL = """
+    CREATE TABLE IF NOT EXISTS order_number_counters (
+        shop_id TEXT NOT NULL DEFAULT 'rinosbikeat',
+        prefix TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        last_number INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (shop_id, prefix, year)
+    )
+"""
+
+# Continue after the highest existing number of every prefix and year
+# (GREATEST keeps counters that are already ahead):
+#     AT-NNNN-YYYY     web checkout (api/routers/web_orders.py)
+#     WEB-YYYY-NNNNN   generate_order_number in models/orders.py
+SEED_WEB_ORDER_COUNTERS_SQL = """
+    INSERT INTO order_number_counters (shop_id, prefix, year, last_number)
+    SELECT 'rinosbikeat', 'AT',
+           CAST(split_part(ordernr, '-', 3) AS INTEGER),
+           MAX(CAST(split_part(ordernr, '-', 2) AS INTEGER))
+    FROM web_orders
+    WHERE ordernr ~ '^AT-[0-9]+-[0-9]{4}$'
+    GROUP BY split_part(ordernr, '-', 3)
+    UNION ALL
+    SELECT 'rinosbikeat', 'WEB',
+           CAST(split_part(ordernr, '-', 2) AS INTEGER),
+           MAX(CAST(split_part(ordernr, '-', 3) AS INTEGER))
+    FROM web_orders
+    WHERE ordernr ~ '^WEB-[0-9]{4}-[0-9]+$'
+    GROUP BY split_part(ordernr, '-', 2)
+    ON CONFLICT (shop_id, prefix, year) DO UPDATE
+    SET last_number = GREATEST(order_number_counters.last_number, EXCLUDED.last_number)
+"""
+
+
+def ensure_order_number_counters(engine) -> None:
+    """Create and seed order_number_counters if missing (called on startup)"""
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_COUNTERS_SQL))
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(SEED_WEB_ORDER_COUNTERS_SQL))
+    except Exception as e:
+        # Postgres-only SQL; a fresh database simply starts at the first number
+        print(f"[WARNING] Could not seed order number counters: {e}")
+
+
+def next_order_number(db: Session, prefix: str, year: int, first_number: int = 1,
+                      shop_id: str = DEFAULT_SHOP_ID) -> int:
+    """
+    Next number for (shop_id, prefix, year), starting at first_number
+
+    Committed immediately on a separate connection, independent of `db`'s
+    transaction.
+    """
+    with db.get_bind().begin() as conn:
+        return conn.execute(text("""
+            INSERT INTO order_number_counters (shop_id, prefix, year, last_number, updated_at)
+            VALUES (:shop_id, :prefix, :year, :first_number, CURRENT_TIMESTAMP)
+            ON CONFLICT (shop_id, prefix, year) DO UPDATE
+            SET last_number = order_number_counters.last_number + 1,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING last_number
+        """), {
+            "shop_id": shop_id,
+            "prefix": prefix,
+            "year": year,
+            "first_number": first_number
+        }).scalar()
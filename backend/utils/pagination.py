@@ -0,0 +1,195 @@
+"""
+Keyset (cursor) pagination helpers
+
+List endpoints accept an optional `cursor` next to skip/page. Every response
+carries `next_cursor` (None on the last page); passing it back continues right
+after the last row of the previous page, using WHERE (sort key, primary key) > (...)
+instead of OFFSET. Deep pages and infinite scroll cost the same as page 1.
+
+Cursors are opaque to clients: url-safe base64 of the JSON encoded sort values.
+Ordering is always NULLS LAST (in both directions) with the primary key as the
+final tie breaker, so every row has exactly one position.
+
+In cursor mode totals come from cached_count() - exact when the cache is cold,
+otherwise up to PAGINATION_COUNT_CACHE_SECONDS old.
+"""
+
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Hashable, Optional, Sequence
+
+from sqlalchemy import and_, false, literal, or_
+
+from config import settings
+
+
+class InvalidCursor(ValueError):
+    """Cursor could not be decoded (tampered, truncated or from another listing)"""
+
+
+# ============================================================================
+# CURSOR ENCODING
+# ============================================================================
+
+def _encode_value(value):
+    if isinstance(value, Decimal):
+        return {"d": str(value)}
+    if isinstance(value, datetime):
+        return {"t": value.isoformat()}
+    if isinstance(value, date):
+        return {"day": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "d" in value:
+            return Decimal(value["d"])
+        if "t" in value:
+            return datetime.fromisoformat(value["t"])
+        if "day" in value:
+            return date.fromisoformat(value["day"])
+        raise InvalidCursor("Unknown cursor value")
+    return value
+
+
+def encode_cursor(values) -> str:
+    """Opaque cursor for the sort values of the last row on a page"""
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int, types: Optional[Sequence[tuple]] = None) -> list:
+    """
+    Sort values from a cursor, raises InvalidCursor if it does not fit `length` keys
+
+    `types` (one tuple of accepted types per key, None = any) rejects values
+    of another type (a string where the listing has ints): compared in Python,
+    e.g. with bisect, they fail with a TypeError, bound into SQL the database
+    rejects them. Types are matched exactly, so True is no int.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != length:
+            raise InvalidCursor("Cursor does not match this listing")
+        values = [_decode_value(v) for v in values]
+    except InvalidCursor:
+        raise
+    except Exception as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if types is not None and any(
+        accepted is not None and type(v) not in accepted for v, accepted in zip(values, types)
+    ):
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+# ============================================================================
+# SQL KEYSET
+# ============================================================================
+# `keys` is a list of (column, descending) pairs, e.g.
+#     [(WebOrder.created_at, True), (WebOrder.web_order_id, True)]
+# The last key must be unique and NOT NULL (primary key).
+
+def keyset_order(keys) -> list:
+    """ORDER BY clauses matching keyset_filter()"""
+    return [
+        column.desc().nullslast() if descending else column.asc().nullslast()
+        for column, descending in keys
+    ]
+
+
+def keyset_filter(keys, values):
+    """WHERE clause selecting the rows that sort after `values`"""
+    clauses = []
+    for i, ((column, descending), value) in enumerate(zip(keys, values)):
+        if value is None:
+            # NULLS LAST: nothing sorts after NULL in this column
+            continue
+        ties = [
+            col.is_(None) if val is None else col == val
+            for (col, _), val in zip(keys[:i], values[:i])
+        ]
+        # literal(): SQLAlchemy refuses < / > against bare True/False
+        bound = literal(value, column.type)
+        after = column < bound if descending else column > bound
+        clauses.append(and_(*ties, or_(after, column.is_(None))))
+    return or_(*clauses) if clauses else false()
+
+
+def key_types(keys) -> list:
+    """
+    Accepted cursor value types per key, from the column types
+
+    NULL is accepted for every key (NULLS LAST); columns without a Python type
+    accept anything.
+    """
+    types = []
+    for column, _ in keys:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            types.append(None)
+            continue
+        types.append((python_type, type(None)))
+    return types
+
+
+def row_cursor(row, keys) -> str:
+    """Cursor pointing right after `row`"""
+    return encode_cursor([getattr(row, column.key) for column, _ in keys])
+
+
+def keyset_page(query, keys, cursor: Optional[str], limit: int, offset: int = 0):
+    """
+    One page of `query` ordered by `keys`, starting after `cursor`
+
+    `offset` is only for the classic skip/page parameters (ignored with a cursor).
+    Returns (rows, next_cursor). next_cursor is None on the last page.
+    """
+    limit = max(limit, 0)
+    query = query.order_by(*keyset_order(keys))
+    if cursor:
+        query = query.filter(keyset_filter(keys, decode_cursor(cursor, len(keys), key_types(keys))))
+    elif offset > 0:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, row_cursor(rows[-1], keys) if rows else None
+
+
+# ============================================================================
+# CACHED TOTALS
+# ============================================================================
+
+_count_cache = {}  # key -> (expires_at, count)
+_count_lock = threading.Lock()
+_COUNT_CACHE_MAX_ENTRIES = 1024
+
+
+def cached_count(key: Hashable, count: Callable[[], int]) -> int:
+    """
+    Total for a filtered listing, recomputed at most every PAGINATION_COUNT_CACHE_SECONDS
+
+    `key` must identify the listing and all of its filters,
+    e.g. ("admin_orders", search, status, date_from, date_to).
+    """
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    total = count()
+    with _count_lock:
+        if len(_count_cache) >= _COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[key] = (now + settings.PAGINATION_COUNT_CACHE_SECONDS, total)
+    return total
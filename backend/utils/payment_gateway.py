@@ -0,0 +1,336 @@
+"""
+Payment gateway
+Non-blocking client for the payment provider's API
+
+The payment routes and the status service (utils/payment_status.py) call the
+provider through get_gateway() instead of the global stripe module:
+
+    - StripeGateway: Stripe's REST API over one shared httpx.AsyncClient, so
+      connections are kept alive between calls; every call has a timeout
+      (STRIPE_API_TIMEOUT_SECONDS, overridable per call) and at most
+      STRIPE_MAX_CONCURRENCY calls run at once - further callers wait for a
+      slot instead of opening more connections
+    - FakeGateway: in-memory sessions, payment intents and refunds with a
+      configurable latency (PAYMENT_GATEWAY_FAKE_LATENCY_MS) for load tests
+      and local development without Stripe
+
+PAYMENT_GATEWAY selects the implementation ("stripe" or "fake"). Calls are
+awaited on the event loop, so a request waiting for the provider doesn't hold
+a threadpool thread (or its DB connection). The semaphore and the httpx client
+belong to the loop that created them; a gateway used from another loop (a
+new serverless invocation, asyncio.run in scripts and tests) creates its own
+for that loop first.
+
+The stripe library is still used to verify webhook signatures. Every call
+sends its API version (Stripe-Version, STRIPE_API_VERSION or the library's),
+so responses have the shape the webhook handlers and status mapping expect
+instead of following the account's default version.
+"""
+
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import urlencode
+
+import httpx
+import stripe
+
+from config import settings
+
+
+class PaymentGatewayError(Exception):
+    """The provider rejected the call (invalid request, unknown id, card error)"""
+
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    """The provider couldn't be reached or failed (timeout, network, 429, 5xx)"""
+
+
+def encode_form(params, prefix: Optional[str] = None) -> list:
+    """Stripe's form encoding: {"a": {"b": [1]}} -> [("a[b][0]", "1")]"""
+    pairs = []
+    items = params.items() if isinstance(params, dict) else enumerate(params)
+    for key, value in items:
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if value is None:
+            continue
+        if isinstance(value, (dict, list, tuple)):
+            pairs.extend(encode_form(value, name))
+        elif isinstance(value, bool):
+            pairs.append((name, "true" if value else "false"))
+        else:
+            pairs.append((name, str(value)))
+    return pairs
+
+
+class PaymentGateway(ABC):
+    """Calls the routes need; every call is bounded by max_concurrency"""
+
+    name = ""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._slots = None
+
+    def _bind_loop(self) -> None:
+        """Create the loop-bound resources if this is another event loop than before"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._open()
+
+    def _open(self) -> None:
+        """Loop-bound resources (extended by gateways with connections)"""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    @abstractmethod
+    async def create_checkout_session(self, params: dict, idempotency_key: Optional[str] = None,
+                                      timeout: Optional[float] = None) -> dict:
+        """Create a Checkout Session (Stripe object as dict)"""
+
+    @abstractmethod
+    async def retrieve_checkout_session(self, session_id: str, timeout: Optional[float] = None) -> dict:
+        """Checkout Session with its PaymentIntent and latest charge expanded"""
+
+    @abstractmethod
+    async def retrieve_payment_intent(self, payment_intent_id: str, timeout: Optional[float] = None) -> dict:
+        """PaymentIntent with its latest charge expanded"""
+
+    @abstractmethod
+    async def create_refund(self, params: dict, idempotency_key: Optional[str] = None,
+                            timeout: Optional[float] = None) -> dict:
+        """Refund a PaymentIntent (all of it without params['amount'])"""
+
+    async def close(self) -> None:
+        """Release connections (no-op unless the gateway holds any)"""
+
+
+# ============================================================================
+# STRIPE
+# ============================================================================
+
+class StripeGateway(PaymentGateway):
+    name = "stripe"
+
+    def __init__(self, api_key: str, base_url: str, timeout: float, max_concurrency: int,
+                 api_version: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(max_concurrency)
+        self._client_options = dict(
+            base_url=base_url,
+            auth=(api_key, ""),
+            headers={"Stripe-Version": api_version or stripe.api_version},
+            timeout=timeout,
+            transport=transport,  # Tests: httpx.MockTransport
+            limits=httpx.Limits(
+                max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+            ),
+        )
+        self._client = None
+
+    def _open(self):
+        # Connections of an earlier loop can't be used (or closed) from this one
+        super()._open()
+        self._client = httpx.AsyncClient(**self._client_options)
+
+    async def _request(self, method: str, path: str, params: Optional[dict] = None,
+                       data: Optional[dict] = None, idempotency_key: Optional[str] = None,
+                       timeout: Optional[float] = None) -> dict:
+        headers = {}
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        if data:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        self._bind_loop()
+        try:
+            async with self._slots:
+                response = await self._client.request(
+                    method, path,
+                    params=encode_form(params) if params else None,
+                    content=urlencode(encode_form(data)) if data else None,
+                    headers=headers,
+                    timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+                )
+        except httpx.TimeoutException:
+            raise PaymentGatewayUnavailable(f"Stripe timed out ({method} {path})")
+        except httpx.TransportError as e:
+            raise PaymentGatewayUnavailable(f"Stripe not reachable: {e}")
+
+        if response.status_code < 400:
+            return response.json()
+        try:
+            message = response.json()["error"]["message"]
+        except Exception:
+            message = response.text[:200] or f"HTTP {response.status_code}"
+        if response.status_code == 429 or response.status_code >= 500:
+            raise PaymentGatewayUnavailable(message)
+        raise PaymentGatewayError(message)
+
+    async def create_checkout_session(self, params, idempotency_key=None, timeout=None):
+        return await self._request(
+            "POST", "/v1/checkout/sessions", data=params,
+            idempotency_key=idempotency_key, timeout=timeout
+        )
+
+    async def retrieve_checkout_session(self, session_id, timeout=None):
+        return await self._request(
+            "GET", f"/v1/checkout/sessions/{session_id}",
+            params={"expand": ["payment_intent.latest_charge"]}, timeout=timeout
+        )
+
+    async def retrieve_payment_intent(self, payment_intent_id, timeout=None):
+        return await self._request(
+            "GET", f"/v1/payment_intents/{payment_intent_id}",
+            params={"expand": ["latest_charge"]}, timeout=timeout
+        )
+
+    async def create_refund(self, params, idempotency_key=None, timeout=None):
+        return await self._request(
+            "POST", "/v1/refunds", data=params,
+            idempotency_key=idempotency_key, timeout=timeout
+        )
+
+    async def close(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
+# ============================================================================
+# FAKE
+# ============================================================================
+
+class FakeGateway(PaymentGateway):
+    """
+    In-memory stand-in for Stripe
+
+    Sessions stay 'open' until pay() is called; their checkout URL is the
+    success_url, so a load test can follow the redirect straight away.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: int = 0, max_concurrency: int = 10):
+        super().__init__(max_concurrency)
+        self.latency = latency_ms / 1000
+        self.sessions = {}
+        self.payment_intents = {}
+        self.refunds = {}
+        self._ids = itertools.count(1)
+        self._idempotent = {}  # idempotency key -> response
+
+    async def _call(self, fn, idempotency_key: Optional[str] = None) -> dict:
+        self._bind_loop()
+        async with self._slots:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if idempotency_key and idempotency_key in self._idempotent:
+                return self._idempotent[idempotency_key]
+            result = fn()
+            if idempotency_key:
+                self._idempotent[idempotency_key] = result
+            return result
+
+    def _create_session(self, params: dict) -> dict:
+        number = next(self._ids)
+        session_id = f"cs_fake_{number}"
+        amount = sum(
+            int(item["price_data"]["unit_amount"]) * int(item.get("quantity", 1))
+            for item in params.get("line_items", [])
+        )
+        self.payment_intents[f"pi_fake_{number}"] = {
+            "object": "payment_intent", "id": f"pi_fake_{number}", "status": "requires_payment_method",
+            "amount": amount, "payment_method": None, "latest_charge": None,
+        }
+        self.sessions[session_id] = {
+            "object": "checkout.session",
+            "id": session_id,
+            "status": "open",
+            "payment_status": "unpaid",
+            "payment_intent": f"pi_fake_{number}",
+            "amount_total": amount,
+            "metadata": params.get("metadata", {}),
+            "url": params.get("success_url", "").replace("{CHECKOUT_SESSION_ID}", session_id),
+        }
+        return self.sessions[session_id]
+
+    def pay(self, session_id: str) -> None:
+        """Complete a session as if the customer had paid"""
+        session = self.sessions[session_id]
+        session.update(status="complete", payment_status="paid")
+        self.payment_intents[session["payment_intent"]].update(
+            status="succeeded", payment_method="pm_fake",
+            latest_charge={"receipt_url": f"https://example.invalid/receipts/{session_id}"}
+        )
+
+    def _get(self, objects: dict, object_id: str) -> dict:
+        if object_id not in objects:
+            raise PaymentGatewayError(f"No such object: '{object_id}'")
+        return objects[object_id]
+
+    def _expanded_session(self, session_id: str) -> dict:
+        session = dict(self._get(self.sessions, session_id))
+        session["payment_intent"] = self.payment_intents[session["payment_intent"]]
+        return session
+
+    def _create_refund(self, params: dict) -> dict:
+        intent = self._get(self.payment_intents, params.get("payment_intent"))
+        refund_id = f"re_fake_{next(self._ids)}"
+        self.refunds[refund_id] = {
+            "object": "refund", "id": refund_id, "payment_intent": intent["id"],
+            "amount": params.get("amount") or intent["amount"], "currency": "eur",
+            "status": "succeeded", "reason": params.get("reason"),
+        }
+        return self.refunds[refund_id]
+
+    async def create_checkout_session(self, params, idempotency_key=None, timeout=None):
+        return await self._call(lambda: self._create_session(params), idempotency_key)
+
+    async def retrieve_checkout_session(self, session_id, timeout=None):
+        return await self._call(lambda: self._expanded_session(session_id))
+
+    async def retrieve_payment_intent(self, payment_intent_id, timeout=None):
+        return await self._call(lambda: self._get(self.payment_intents, payment_intent_id))
+
+    async def create_refund(self, params, idempotency_key=None, timeout=None):
+        return await self._call(lambda: self._create_refund(params), idempotency_key)
+
+
+# ============================================================================
+# SELECTION
+# ============================================================================
+
+_gateway: Optional[PaymentGateway] = None
+
+
+def get_gateway() -> PaymentGateway:
+    """The configured gateway (created on first use, shared by all requests)"""
+    global _gateway
+    if _gateway is None:
+        if settings.PAYMENT_GATEWAY == "fake":
+            _gateway = FakeGateway(
+                settings.PAYMENT_GATEWAY_FAKE_LATENCY_MS, settings.STRIPE_MAX_CONCURRENCY
+            )
+        else:
+            _gateway = StripeGateway(
+                settings.STRIPE_SECRET_KEY, settings.STRIPE_API_BASE,
+                settings.STRIPE_API_TIMEOUT_SECONDS, settings.STRIPE_MAX_CONCURRENCY,
+                api_version=settings.STRIPE_API_VERSION
+            )
+    return _gateway
+
+
+def set_gateway(gateway: Optional[PaymentGateway]) -> None:
+    """Use another gateway (tests, load tests); None = back to the configured one"""
+    global _gateway
+    _gateway = gateway
+
+
+async def close_gateway() -> None:
+    """Close the gateway's connections (called on shutdown)"""
+    global _gateway
+    if _gateway is not None:
+        await _gateway.close()
+        _gateway = None
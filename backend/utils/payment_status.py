@@ -0,0 +1,256 @@
+"""
+Payment status service
+Answers the frontend's payment status polls from local state
+
+GET /payments/status/{id} used to call Stripe (blocking) and commit on every
+poll. Now a status is looked up in this order:
+
+    1. in-process cache - final statuses for PAYMENT_STATUS_FINAL_CACHE_SECONDS,
+       others for PAYMENT_STATUS_CACHE_SECONDS; at most
+       PAYMENT_STATUS_CACHE_MAX_ENTRIES payments, least recently used first out
+    2. stripe_payment_intents - a final status (succeeded, canceled, ...)
+       never changes, so it is answered without asking Stripe
+    3. Stripe, through the non-blocking payment gateway
+       (utils/payment_gateway.py); concurrent polls for the same payment wait
+       for one request instead of sending their own
+
+The row is only written when Stripe reports something new (status, payment
+method, receipt). The webhook worker (utils/webhook_inbox.py) feeds the cache
+after every applied event, so a poll right after the payment sees the new
+status without a Stripe call.
+
+Rows hold either a PaymentIntent id (pi_...) or a Checkout Session id (cs_...,
+see create_checkout_session); both are resolved.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.order import StripePaymentIntent
+from utils.payment_gateway import get_gateway, PaymentGatewayUnavailable
+
+
+# Statuses Stripe never changes again (a refunded PaymentIntent stays "succeeded")
+FINAL_STATUSES = {"succeeded", "canceled", "expired"}
+
+
+class PaymentNotFound(LookupError):
+    """No stripe_payment_intents row for the id"""
+
+
+# ============================================================================
+# STRIPE OBJECTS
+# ============================================================================
+
+def _receipt_url(charge) -> Optional[str]:
+    return charge.get("receipt_url") if isinstance(charge, dict) else None
+
+
+def stripe_state(obj: dict) -> dict:
+    """
+    {status, payment_method, receipt_url} of a PaymentIntent or Checkout
+    Session (API response or webhook event object)
+    """
+    if obj.get("object") == "checkout.session":
+        intent = obj.get("payment_intent")
+        if isinstance(intent, dict):
+            return stripe_state(intent)
+        if obj.get("payment_status") == "paid":
+            state = "succeeded"
+        else:
+            state = "expired" if obj.get("status") == "expired" else obj.get("status")
+        return {"status": state, "payment_method": None, "receipt_url": None}
+
+    payment_method = obj.get("payment_method")
+    if isinstance(payment_method, dict):
+        payment_method = payment_method.get("id")
+    charges = (obj.get("charges") or {}).get("data") or []
+    return {
+        "status": obj.get("status"),
+        "payment_method": payment_method,
+        "receipt_url": _receipt_url(obj.get("latest_charge")) or (
+            _receipt_url(charges[0]) if charges else None
+        ),
+    }
+
+
+def apply_state(payment: StripePaymentIntent, state: dict) -> bool:
+    """Copy a Stripe state onto the row; False (row untouched) if nothing changed"""
+    changed = False
+    for field in ("status", "payment_method", "receipt_url"):
+        value = state.get(field)
+        # Stripe only drops the method/receipt in states we don't care about
+        if value is not None and getattr(payment, field) != value:
+            setattr(payment, field, value)
+            changed = True
+    if changed:
+        payment.updated_at = datetime.utcnow()
+    return changed
+
+
+def status_response(payment: StripePaymentIntent) -> dict:
+    """PaymentStatus body of a row"""
+    return {
+        "payment_intent_id": payment.stripe_payment_intent_id,
+        "status": payment.status,
+        "order_id": payment.web_order_id,
+        "amount": payment.amount,
+        "currency": payment.currency,
+        "payment_method": payment.payment_method,
+        "receipt_url": payment.receipt_url,
+        "created_at": payment.created_at,
+    }
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+_cache: "OrderedDict[str, tuple]" = OrderedDict()  # stripe id -> (status body, checked_at monotonic)
+_cache_lock = threading.Lock()
+
+
+def get_cached_status(stripe_id: str) -> Optional[dict]:
+    with _cache_lock:
+        entry = _cache.get(stripe_id)
+        if entry is None:
+            return None
+        body, checked_at = entry
+        max_age = (
+            settings.PAYMENT_STATUS_FINAL_CACHE_SECONDS if body["status"] in FINAL_STATUSES
+            else settings.PAYMENT_STATUS_CACHE_SECONDS
+        )
+        if time.monotonic() - checked_at >= max_age:
+            del _cache[stripe_id]
+            return None
+        _cache.move_to_end(stripe_id)
+    return body
+
+
+def cache_status(body: dict) -> dict:
+    with _cache_lock:
+        _cache[body["payment_intent_id"]] = (body, time.monotonic())
+        _cache.move_to_end(body["payment_intent_id"])
+        while len(_cache) > settings.PAYMENT_STATUS_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return body
+
+
+def forget_status(*stripe_ids: str) -> None:
+    """Drop cached statuses (refunds, manual changes), the next poll reloads the row"""
+    with _cache_lock:
+        for stripe_id in stripe_ids:
+            _cache.pop(stripe_id, None)
+
+
+def cache_payments(db: Session, stripe_ids: Iterable[str]) -> None:
+    """Cache the current rows of these ids (webhook worker, after its commit)"""
+    stripe_ids = [i for i in stripe_ids if i and isinstance(i, str)]
+    if not stripe_ids:
+        return
+    for payment in db.query(StripePaymentIntent).filter(
+        StripePaymentIntent.stripe_payment_intent_id.in_(stripe_ids)
+    ).all():
+        cache_status(status_response(payment))
+
+
+# ============================================================================
+# STRIPE LOOKUP
+# ============================================================================
+
+_inflight: Dict[str, asyncio.Future] = {}  # stripe id -> lookup in progress
+
+
+async def _fetch(stripe_id: str) -> dict:
+    gateway = get_gateway()
+    if stripe_id.startswith("cs_"):
+        return await gateway.retrieve_checkout_session(stripe_id)
+    return await gateway.retrieve_payment_intent(stripe_id)
+
+
+async def fetch_stripe_object(stripe_id: str) -> dict:
+    """GET the PaymentIntent / Checkout Session; concurrent callers share one request"""
+    future = _inflight.get(stripe_id)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[stripe_id] = future
+    try:
+        result = await _fetch(stripe_id)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # retrieved - no "never retrieved" warning without waiters
+        raise
+    finally:
+        _inflight.pop(stripe_id, None)
+
+
+# ============================================================================
+# LOOKUP
+# ============================================================================
+
+def _load_payment(db: Session, stripe_id: str) -> dict:
+    """Stored status; ends the transaction, so no connection is held while Stripe is asked"""
+    payment = db.query(StripePaymentIntent).filter(
+        StripePaymentIntent.stripe_payment_intent_id == stripe_id
+    ).first()
+    body = status_response(payment) if payment is not None else None
+    db.rollback()
+    if body is None:
+        raise PaymentNotFound(stripe_id)
+    return body
+
+
+def _store_state(db: Session, stripe_id: str, state: dict) -> dict:
+    """Write the Stripe state if it changed (own short transaction)"""
+    payment = db.query(StripePaymentIntent).filter(
+        StripePaymentIntent.stripe_payment_intent_id == stripe_id
+    ).first()
+    if payment is None:
+        db.rollback()
+        raise PaymentNotFound(stripe_id)
+    changed = apply_state(payment, state)
+    body = status_response(payment)
+    if changed:
+        db.commit()
+    else:
+        db.rollback()
+    return body
+
+
+async def get_payment_status(db: Session, stripe_id: str) -> dict:
+    """
+    Current status of a payment (PaymentStatus body)
+
+    Raises:
+        PaymentNotFound: Unknown id
+        PaymentGatewayError: Stripe rejected the lookup
+    """
+    body = get_cached_status(stripe_id)
+    if body is not None:
+        return body
+
+    body = await run_in_threadpool(_load_payment, db, stripe_id)
+    if body["status"] in FINAL_STATUSES:
+        return cache_status(body)
+
+    try:
+        stripe_object = await fetch_stripe_object(stripe_id)
+    except PaymentGatewayUnavailable as e:
+        # Stripe unreachable - answer with what we know, the next poll retries
+        print(f"[WARNING] Stripe status lookup for {stripe_id} failed: {e}")
+        return body
+
+    body = await run_in_threadpool(_store_state, db, stripe_id, stripe_state(stripe_object))
+    return cache_status(body)
@@ -4,7 +4,8 @@ Converts BRUTTO prices from German VAT (19%) to other countries' VAT rates
 """
 
 from decimal import Decimal
-from typing import Optional
+from fractions import Fraction
+from typing import Iterable, List, Optional
 
 
 # VAT rates by country (in percentage)
@@ -34,6 +35,41 @@ def validate_country_code(country_code: str) -> bool:
     return country_code.upper() in VAT_RATES
 
 
+# Country names as the checkout form sends them (frontend/app/checkout/page.tsx)
+COUNTRY_NAMES = {
+    "Österreich": "AT",
+    "Deutschland": "DE",
+    "Frankreich": "FR",
+    "Italien": "IT",
+    "Spanien": "ES",
+    "Niederlande": "NL",
+    "Belgien": "BE",
+    "Polen": "PL",
+    "Tschechien": "CZ",
+    "Schweiz": "CH",
+    "Vereinigtes Königreich": "GB",
+    "Schweden": "SE",
+    "Dänemark": "DK",
+    "Norwegen": "NO",
+}
+
+_COUNTRY_NAME_LOOKUP = {name.casefold(): code for name, code in COUNTRY_NAMES.items()}
+
+
+def resolve_country(country: str) -> Optional[str]:
+    """
+    Country code for a code or a checkout country name, None if unknown
+
+    Example:
+        >>> resolve_country("Österreich"), resolve_country("de"), resolve_country("Atlantis")
+        ('AT', 'DE', None)
+    """
+    value = (country or "").strip()
+    if validate_country_code(value):
+        return value.upper()
+    return _COUNTRY_NAME_LOOKUP.get(value.casefold())
+
+
 def get_vat_rate(country_code: str) -> Decimal:
     """
     Get VAT rate for country
@@ -137,6 +173,149 @@ def convert_price_by_country(brutto_price: float, target_country: str = "AT") ->
     return final_price
 
 
+def convert_prices_by_country(brutto_prices: Iterable, target_country: str = "AT") -> List[Decimal]:
+    """
+    Batch version of convert_price_by_country for many prices at once
+    
+    Validates the country once and converts with the integer engine below.
+    Accepts Decimal (as loaded from the DB), float or int; None becomes 0.
+    
+    Args:
+        brutto_prices: Prices from database (include 19% German VAT)
+        target_country: Target country code (default: "AT" for Austria)
+    
+    Returns:
+        List of final BRUTTO prices, in input order
+    
+    Example:
+        >>> convert_prices_by_country([Decimal('1190.00'), 1190, None], "AT")
+        [Decimal('1200.00'), Decimal('1200.00'), Decimal('0.00')]
+    """
+    return localize_prices(brutto_prices, target_country)
+
+
+# ============================================================================
+# VECTORIZED ENGINE
+# ============================================================================
+#
+# convert_price_by_country rounds twice (half-even, to cents):
+#     netto = round(brutto * 100 / 119, 2)
+#     final = round(netto * (100 + vat) / 100, 2)
+# Both factors are exact fractions, so with prices in integer cents the same
+# result is two integer divisions with half-even rounding - no Decimal
+# contexts, no string parsing. A tie can't occur in the first step (119 and
+# 200 are coprime), but does in the second (e.g. 1.25 * 2 cents), so half-even
+# is kept exactly.
+
+# Brutto (German VAT) -> netto
+NETTO_FACTOR = Fraction(100) / (Fraction(100) + Fraction(GERMAN_VAT_RATE))
+
+# Netto -> brutto per country
+COUNTRY_FACTORS = {
+    code: (Fraction(100) + Fraction(rate)) / Fraction(100)
+    for code, rate in VAT_RATES.items()
+}
+
+
+def _div_half_even(numerator: int, denominator: int) -> int:
+    """numerator / denominator rounded half-even (denominator > 0)"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def localize_cents(brutto_cents: int, country_code: str = "AT") -> int:
+    """
+    Localize one price in cents (same rounding as convert_price_by_country)
+    
+    Example:
+        >>> localize_cents(119000, "AT")
+        120000
+    """
+    factor = COUNTRY_FACTORS[country_code.upper()]
+    netto = _div_half_even(brutto_cents * NETTO_FACTOR.numerator, NETTO_FACTOR.denominator)
+    return _div_half_even(netto * factor.numerator, factor.denominator)
+
+
+def to_cents(price) -> Optional[int]:
+    """
+    Price (Decimal, float, int or None) as integer cents
+    
+    Returns None for prices with fractions of a cent; those go through the
+    Decimal path (convert_price_by_country) instead.
+    """
+    if price is None:
+        return 0
+    if isinstance(price, int):
+        return price * 100
+    # Decimal(str(...)) like convert_brutto_to_netto, so floats are read as printed
+    scaled = (price if isinstance(price, Decimal) else Decimal(str(price))) * 100
+    cents = int(scaled)
+    if cents != scaled:
+        return None
+    return cents
+
+
+def localize_prices(brutto_prices: Iterable, country_code: str = "AT") -> List[Decimal]:
+    """
+    Localize a list of prices in one call
+    
+    Identical results to [convert_price_by_country(p, country_code) ...] for
+    every price, including rounding.
+    
+    Raises:
+        ValueError: If country code is invalid
+    """
+    if not validate_country_code(country_code):
+        raise ValueError(
+            f"Invalid country code: {country_code}. "
+            f"Valid codes: {', '.join(sorted(VAT_RATES.keys()))}"
+        )
+    
+    factor = COUNTRY_FACTORS[country_code.upper()]
+    netto_num, netto_den = NETTO_FACTOR.numerator, NETTO_FACTOR.denominator
+    vat_num, vat_den = factor.numerator, factor.denominator
+    
+    results = []
+    for price in brutto_prices:
+        cents = to_cents(price)
+        if cents is None:
+            results.append(convert_price_by_country(price, country_code))
+            continue
+        netto = _div_half_even(cents * netto_num, netto_den)
+        results.append(Decimal(_div_half_even(netto * vat_num, vat_den)).scaleb(-2))
+    return results
+
+
+def localize_cents_array(brutto_cents, country_code: str = "AT"):
+    """
+    Localize a NumPy integer array of cents (optional numpy dependency)
+    
+    Args:
+        brutto_cents: Array-like of integer cents (German BRUTTO)
+        country_code: Target country code
+    
+    Returns:
+        numpy.ndarray (int64) of localized cents
+    """
+    import numpy as np  # Optional, only needed for array input
+
+    if not validate_country_code(country_code):
+        raise ValueError(f"Invalid country code: {country_code}")
+
+    def div_half_even(numerator, denominator):
+        quotient, remainder = np.divmod(numerator, denominator)
+        twice = 2 * remainder
+        return quotient + ((twice > denominator) | ((twice == denominator) & (quotient % 2 == 1)))
+
+    factor = COUNTRY_FACTORS[country_code.upper()]
+    cents = np.asarray(brutto_cents, dtype=np.int64)
+    netto = div_half_even(cents * NETTO_FACTOR.numerator, NETTO_FACTOR.denominator)
+    return div_half_even(netto * factor.numerator, factor.denominator)
+
+
 def calculate_vat_breakdown(brutto_price: float, country_code: str = "AT") -> dict:
     """
     Calculate VAT breakdown for a product in a specific country
@@ -0,0 +1,105 @@
+"""
+Product search
+Full-text + trigram search over productdata (see migrations/004_add_product_search.sql)
+
+Every word of the query is matched as a prefix ("sand" finds "Sandman") against
+productdata.search_vector, and article numbers additionally by substring via
+the pg_trgm index. Results are ranked by ts_rank_cd plus article number similarity.
+
+Databases without the migration (and SQLite in local tests) fall back to the
+old ILIKE '%q%' matching on articlename, articlenr and manufacturer.
+"""
+
+import re
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import cast, func, literal_column, or_, text
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import Session
+
+from models.product import Product
+
+
+# Unicode word characters, so "Größe" and "RB-1234" tokenize like to_tsvector does
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Re-check for the migration every 5 minutes until it is found
+_FTS_RECHECK_SECONDS = 300
+
+_fts_state = {"available": False, "checked_at": None}
+_fts_lock = threading.Lock()
+
+
+def fts_available(db: Session) -> bool:
+    """True if productdata.search_vector and pg_trgm exist (cached per process)"""
+    with _fts_lock:
+        if _fts_state["available"]:
+            return True
+        checked_at = _fts_state["checked_at"]
+        if checked_at is not None and time.monotonic() - checked_at < _FTS_RECHECK_SECONDS:
+            return False
+
+    available = False
+    if db.get_bind().dialect.name == "postgresql":
+        try:
+            with db.begin_nested():
+                available = db.execute(text("""
+                    SELECT
+                        EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = 'productdata' AND column_name = 'search_vector'
+                        )
+                        AND EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+                """)).scalar()
+        except Exception as e:
+            print(f"[WARNING] Could not check product search columns: {e}")
+
+    with _fts_lock:
+        _fts_state["available"] = bool(available)
+        _fts_state["checked_at"] = time.monotonic()
+    return bool(available)
+
+
+def prefix_tsquery(q: str) -> Optional[str]:
+    """'sand bike' -> 'sand:* & bike:*' (None if the query has no words)"""
+    tokens = _TOKEN_RE.findall(q.lower())
+    if not tokens:
+        return None
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def product_search(db: Session, q: str):
+    """
+    Search condition for productdata and its relevance rank
+
+    Returns (condition, rank). rank is a double precision expression
+    (higher = better), or None when falling back to ILIKE.
+    """
+    pattern = f"%{q}%"
+    tsquery_text = prefix_tsquery(q)
+
+    if not tsquery_text or not fts_available(db):
+        return or_(
+            Product.articlename.ilike(pattern),
+            Product.articlenr.ilike(pattern),
+            Product.manufacturer.ilike(pattern)
+        ), None
+
+    search_vector = literal_column("productdata.search_vector")
+    # Same two configurations as the generated column
+    tsquery = func.to_tsquery("german", tsquery_text).op("||")(
+        func.to_tsquery("simple", tsquery_text)
+    )
+
+    condition = or_(
+        search_vector.op("@@")(tsquery),
+        Product.articlenr.ilike(pattern)
+    )
+    # double precision so the rank survives the JSON round trip of a pagination cursor
+    rank = cast(
+        func.ts_rank_cd(search_vector, tsquery) + func.similarity(Product.articlenr, q),
+        DOUBLE_PRECISION
+    )
+    return condition, rank
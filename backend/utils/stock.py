@@ -0,0 +1,175 @@
+"""
+Stock / availability service
+Stock per articlenr from inventorydata, for many articles with one query
+
+inventorydata has one row per article and location. get_stock() sums the
+locations of a whole batch of articles in one grouped query and keeps the
+result for STOCK_CACHE_SECONDS, so cart, listing and detail pages show real
+stock without a query per product. The ERP sync updates inventorydata, so
+stock shown is at most STOCK_CACHE_SECONDS older than the last sync.
+
+Stock reserved for open web orders (stock_reservations, see utils/checkout.py)
+is subtracted, so what is shown is what can still be ordered.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.orm import Session
+
+from config import settings
+from models.order import StockReservation, WebOrder
+from models.product import InventoryData
+
+
+# More than this many pieces counts as "in_stock", 1..LOW_STOCK_LIMIT as "low_stock"
+LOW_STOCK_LIMIT = 10
+
+# Rows per IN (...) list
+_BATCH_SIZE = 500
+
+_cache = {}  # articlenr -> (total_stock, loaded_at)
+_lock = threading.Lock()
+
+
+def active_reservations(now: datetime):
+    """
+    Condition for reservations that still hold stock
+
+    Held ones until they expire, committed (paid) ones until their order is
+    synced to the ERP.
+    """
+    order_synced = exists().where(
+        (WebOrder.web_order_id == StockReservation.web_order_id) & WebOrder.synced_to_erp.is_(True)
+    )
+    return or_(
+        and_(StockReservation.status == 'held', StockReservation.expires_at > now),
+        and_(StockReservation.status == 'committed', ~order_synced),
+    )
+
+
+def load_reserved(db: Session, articlenrs: Iterable[str], now: Optional[datetime] = None) -> Dict[str, int]:
+    """Quantity per articlenr held by active reservations"""
+    articlenrs = list(dict.fromkeys(articlenrs))
+    now = now or datetime.utcnow()
+    reserved = {articlenr: 0 for articlenr in articlenrs}
+    for start in range(0, len(articlenrs), _BATCH_SIZE):
+        rows = db.query(
+            StockReservation.articlenr,
+            func.sum(StockReservation.quantity)
+        ).filter(
+            StockReservation.articlenr.in_(articlenrs[start:start + _BATCH_SIZE]),
+            active_reservations(now)
+        ).group_by(StockReservation.articlenr).all()
+        for articlenr, total in rows:
+            reserved[articlenr] = int(total or 0)
+    return reserved
+
+
+def load_stock(db: Session, articlenrs: Iterable[str]) -> Dict[str, int]:
+    """Orderable stock per articlenr (all locations minus reservations), straight from the database"""
+    articlenrs = list(dict.fromkeys(articlenrs))
+    stock = {articlenr: 0 for articlenr in articlenrs}
+    for start in range(0, len(articlenrs), _BATCH_SIZE):
+        rows = db.query(
+            InventoryData.articlenr,
+            func.sum(InventoryData.quantity)
+        ).filter(
+            InventoryData.articlenr.in_(articlenrs[start:start + _BATCH_SIZE])
+        ).group_by(InventoryData.articlenr).all()
+        for articlenr, total in rows:
+            stock[articlenr] = int(total or 0)
+
+    for articlenr, quantity in load_reserved(db, [a for a, total in stock.items() if total > 0]).items():
+        stock[articlenr] = max(stock[articlenr] - quantity, 0)
+    return stock
+
+
+def get_stock(db: Session, articlenrs: Iterable[str]) -> Dict[str, int]:
+    """
+    Total stock per articlenr, cached for STOCK_CACHE_SECONDS
+
+    Args:
+        db: Database session (only used for articles not in the cache)
+        articlenrs: Article numbers to look up
+
+    Returns:
+        {articlenr: total_stock} for every requested article (0 if none)
+    """
+    articlenrs = list(dict.fromkeys(articlenrs))
+    now = time.monotonic()
+    max_age = settings.STOCK_CACHE_SECONDS
+    stock = {}
+    missing = []
+
+    with _lock:
+        for articlenr in articlenrs:
+            entry = _cache.get(articlenr)
+            if entry is not None and now - entry[1] < max_age:
+                stock[articlenr] = entry[0]
+            else:
+                missing.append(articlenr)
+
+    if missing:
+        loaded = load_stock(db, missing)
+        loaded_at = time.monotonic()
+        with _lock:
+            for articlenr, total in loaded.items():
+                _cache[articlenr] = (total, loaded_at)
+            # Drop expired entries now and then instead of growing forever
+            if len(_cache) > 4 * len(loaded) + 10000:
+                for key in [k for k, (_, t) in _cache.items() if loaded_at - t >= max_age]:
+                    del _cache[key]
+        stock.update(loaded)
+
+    return stock
+
+
+def invalidate_stock_cache(articlenrs: Optional[Iterable[str]] = None) -> None:
+    """Forget cached stock of some or all articles (e.g. after a checkout or an inventory sync)"""
+    with _lock:
+        if articlenrs is None:
+            _cache.clear()
+        else:
+            for articlenr in articlenrs:
+                _cache.pop(articlenr, None)
+
+
+def availability(total_stock: int) -> dict:
+    """Availability block of product responses"""
+    if total_stock > LOW_STOCK_LIMIT:
+        status = "in_stock"
+        status_display = "In Stock"
+    elif total_stock > 0:
+        status = "low_stock"
+        status_display = f"Low Stock - Only {int(total_stock)} left"
+    else:
+        status = "out_of_stock"
+        status_display = "Out of Stock"
+
+    return {
+        "status": status,
+        "status_display": status_display,
+        "total_stock": int(total_stock)
+    }
+
+
+def add_availability(db: Session, product_dicts: list, children_by_father=None) -> list:
+    """
+    Add "availability" to listing products (one stock lookup for the whole page)
+
+    With children_by_father (catalog snapshot), a father's stock is its own
+    plus that of all its variations.
+    """
+    children_by_father = children_by_father or {}
+    family = {
+        p["articlenr"]: [p["articlenr"]] + [c["articlenr"] for c in children_by_father.get(p["articlenr"], [])]
+        for p in product_dicts
+    }
+    stock = get_stock(db, [articlenr for members in family.values() for articlenr in members])
+    for p in product_dicts:
+        p["availability"] = availability(sum(stock[a] for a in family[p["articlenr"]]))
+    return product_dicts
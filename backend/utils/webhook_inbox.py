@@ -0,0 +1,306 @@
+"""
+Stripe webhook inbox
+Stores verified Stripe events and applies them outside the webhook request
+
+The webhook (api/routers/payments.py) verifies the signature, inserts the raw
+event into stripe_webhook_events (ON CONFLICT on the Stripe event id, so
+Stripe's retries are no-ops) and answers 200 - one insert per call. Order
+updates, stock reservations and receipt emails happen here, in a worker:
+
+    - right after each webhook answer: drain_webhook_events() as a FastAPI
+      BackgroundTask - needs no long-lived process, so it also works on the
+      Vercel serverless entry point (api/index.py)
+    - in the API process: a background thread (STRIPE_WEBHOOK_WORKER) polling
+      every STRIPE_WEBHOOK_POLL_SECONDS, which picks up retries that are due
+    - from the command line: python process_webhooks.py [--loop]
+
+Serverless instances don't keep the thread alive between requests, so there a
+retry only runs with the next webhook; schedule process_webhooks.py (cron) to
+retry failed events without waiting for one.
+
+Events are applied one per transaction, oldest first (Stripe's created time),
+and locked with FOR UPDATE SKIP LOCKED so several workers never apply the same
+event twice. Handlers are idempotent and never downgrade a paid order, so a
+late or repeated event is harmless. A failing event is retried with backoff
+and marked 'failed' after STRIPE_WEBHOOK_MAX_ATTEMPTS.
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from config import settings
+from database.connection import Base
+from models.order import WebOrder, StripePaymentIntent, StripeWebhookEvent
+from utils.checkout import commit_reservations, release_reservations
+from utils.payment_status import apply_state, stripe_state, cache_payments
+
+
+def ensure_webhook_inbox_table(engine) -> None:
+    """Create stripe_webhook_events if missing (called on startup)"""
+    Base.metadata.create_all(bind=engine, tables=[StripeWebhookEvent.__table__])
+
+
+# ============================================================================
+# INBOX
+# ============================================================================
+
+def store_event(db: Session, event, payload: bytes) -> bool:
+    """
+    Insert a verified event (and commit)
+
+    Returns False if the event was already stored (Stripe retry).
+    """
+    stored = db.execute(text("""
+        INSERT INTO stripe_webhook_events
+            (stripe_event_id, event_type, stripe_created, payload, status, attempts, received_at)
+        VALUES (:event_id, :event_type, :created, :payload, 'pending', 0, :now)
+        ON CONFLICT (stripe_event_id) DO NOTHING
+        RETURNING webhook_event_id
+    """), {
+        "event_id": event["id"],
+        "event_type": event["type"],
+        "created": event.get("created"),
+        "payload": payload.decode("utf-8"),
+        "now": datetime.utcnow()
+    }).first()
+    db.commit()
+    return stored is not None
+
+
+# ============================================================================
+# EVENT HANDLERS
+# ============================================================================
+# Each handler applies one event without committing and returns the orders
+# that just became paid (for receipt emails after the commit).
+
+def _mark_paid(db: Session, order: WebOrder, payment_intent_id: Optional[str] = None) -> bool:
+    """Set an order to paid; False if it already was"""
+    if payment_intent_id:
+        order.payment_intent_id = payment_intent_id
+    if order.payment_status == 'paid':
+        return False
+    order.payment_status = 'paid'
+    order.updated_at = datetime.utcnow()
+    commit_reservations(db, order.web_order_id)
+    return True
+
+
+def _payment_and_order(db: Session, stripe_payment_intent_id: str):
+    """StripePaymentIntent and its WebOrder in one query"""
+    return db.query(StripePaymentIntent, WebOrder).outerjoin(
+        WebOrder, WebOrder.web_order_id == StripePaymentIntent.web_order_id
+    ).filter(
+        StripePaymentIntent.stripe_payment_intent_id == stripe_payment_intent_id
+    ).first() or (None, None)
+
+
+def handle_payment_succeeded(db: Session, intent: dict) -> list:
+    payment, order = _payment_and_order(db, intent['id'])
+    if not payment:
+        return []
+    payment.status = 'succeeded'
+    payment.updated_at = datetime.utcnow()
+    if order and _mark_paid(db, order):
+        return [(payment, order)]
+    return []
+
+
+def handle_payment_failed(db: Session, intent: dict) -> list:
+    payment, order = _payment_and_order(db, intent['id'])
+    if not payment:
+        return []
+    payment.status = 'failed'
+    payment.updated_at = datetime.utcnow()
+    # A failed attempt after a successful one doesn't unpay the order
+    if order and order.payment_status != 'paid':
+        order.payment_status = 'failed'
+        order.updated_at = datetime.utcnow()
+        release_reservations(db, order.web_order_id)
+    return []
+
+
+def handle_checkout_completed(db: Session, session: dict) -> list:
+    order_id = (session.get('metadata') or {}).get('order_id')
+    payment_intent_id = session.get('payment_intent')
+
+    # Order by metadata order_id (most reliable) or by payment intent, one query
+    conditions = []
+    if order_id and str(order_id).isdigit():
+        conditions.append(WebOrder.web_order_id == int(order_id))
+    if payment_intent_id:
+        conditions.append(WebOrder.payment_intent_id == payment_intent_id)
+    if not conditions:
+        print(f"[WARNING] checkout.session.completed {session.get('id')} without order reference")
+        return []
+
+    orders = db.query(WebOrder).filter(or_(*conditions)).all()
+    order = next((o for o in orders if str(o.web_order_id) == str(order_id)), orders[0] if orders else None)
+    if not order:
+        print(f"[WARNING] Order not found - order_id={order_id}, payment_intent={payment_intent_id}")
+        return []
+
+    # The payment row of a Checkout Session is keyed by the session id
+    payment = db.query(StripePaymentIntent).filter(
+        StripePaymentIntent.stripe_payment_intent_id == session.get('id')
+    ).first()
+    if payment:
+        apply_state(payment, stripe_state(dict(session, object='checkout.session')))
+
+    if _mark_paid(db, order, payment_intent_id):
+        return [(None, order)]
+    return []
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': handle_payment_succeeded,
+    'payment_intent.payment_failed': handle_payment_failed,
+    'checkout.session.completed': handle_checkout_completed,
+}
+
+
+def send_receipts(paid: list) -> None:
+    """Payment receipt emails for orders that just became paid (errors are logged only)"""
+    from api.email.email_notifications import send_payment_receipt_from_payment
+
+    for payment, order in paid:
+        try:
+            if not send_payment_receipt_from_payment(payment, order):
+                print(f"[WARNING] Payment receipt email failed for order {order.ordernr}")
+        except Exception as e:
+            print(f"[WARNING] Error sending payment receipt email for order {order.ordernr}: {e}")
+
+
+# ============================================================================
+# PROCESSING
+# ============================================================================
+
+def _retry_delay(attempts: int) -> timedelta:
+    """30s, 1m, 2m, 4m, ... capped at 1h"""
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 3600))
+
+
+def process_next_event(db: Session) -> Optional[StripeWebhookEvent]:
+    """
+    Apply the oldest due pending event in its own transaction
+
+    Returns the event, or None if nothing is due.
+    """
+    now = datetime.utcnow()
+    event_row = db.query(StripeWebhookEvent).filter(
+        StripeWebhookEvent.status == 'pending',
+        or_(StripeWebhookEvent.next_attempt_at.is_(None), StripeWebhookEvent.next_attempt_at <= now)
+    ).order_by(
+        StripeWebhookEvent.stripe_created, StripeWebhookEvent.webhook_event_id
+    ).limit(1).with_for_update(skip_locked=True).first()
+    if event_row is None:
+        db.rollback()
+        return None
+
+    try:
+        # The handler runs in a savepoint: on errors only its changes are undone
+        # and the row stays locked while the failure is recorded, so no other
+        # worker can claim the event in between
+        with db.begin_nested():
+            event = json.loads(event_row.payload)
+            handler = EVENT_HANDLERS.get(event_row.event_type)
+            paid = handler(db, event['data']['object']) if handler else []
+    except Exception as e:
+        event_row.attempts += 1
+        event_row.last_error = str(e)[:2000]
+        if event_row.attempts >= settings.STRIPE_WEBHOOK_MAX_ATTEMPTS:
+            event_row.status = 'failed'
+            print(f"[ERROR] Stripe event {event_row.stripe_event_id} failed for good: {e}")
+        else:
+            event_row.next_attempt_at = now + _retry_delay(event_row.attempts)
+            print(f"[WARNING] Stripe event {event_row.stripe_event_id} failed (attempt {event_row.attempts}): {e}")
+        db.commit()
+        return event_row
+
+    event_row.status = 'processed'
+    event_row.attempts += 1
+    event_row.last_error = None
+    event_row.processed_at = datetime.utcnow()
+    db.commit()
+
+    # Status polls see the new state without asking Stripe
+    stripe_object = event['data']['object'] or {}
+    try:
+        cache_payments(db, [stripe_object.get('id'), stripe_object.get('payment_intent')])
+    except Exception as e:
+        print(f"[WARNING] Could not cache payment status for {event_row.stripe_event_id}: {e}")
+
+    send_receipts(paid)
+    return event_row
+
+
+def process_pending_events(db: Session, max_events: int = 1000) -> dict:
+    """Apply due pending events; returns {"processed": n, "failed": n}"""
+    report = {"processed": 0, "failed": 0}
+    for _ in range(max_events):
+        event_row = process_next_event(db)
+        if event_row is None:
+            break
+        report["processed" if event_row.status == 'processed' else "failed"] += 1
+    return report
+
+
+def drain_webhook_events(session_factory, max_events: int = 20) -> dict:
+    """
+    Apply due events with an own session (BackgroundTask of the webhook)
+
+    Errors are logged only; the events stay in the inbox for the next run.
+    """
+    db = session_factory()
+    try:
+        report = process_pending_events(db, max_events)
+        if any(report.values()):
+            print(f"[OK] Stripe events applied: {report}")
+        return report
+    except Exception as e:
+        print(f"[WARNING] Could not apply Stripe events: {e}")
+        return {"processed": 0, "failed": 0}
+    finally:
+        db.close()
+
+
+# ============================================================================
+# WORKER THREAD
+# ============================================================================
+
+_worker_stop = threading.Event()
+_worker_wake = threading.Event()
+
+
+def start_webhook_worker(session_factory) -> Optional[threading.Thread]:
+    """Apply stored events in a background thread (STRIPE_WEBHOOK_WORKER=false = off)"""
+    if not settings.STRIPE_WEBHOOK_WORKER:
+        return None
+
+    def run():
+        while not _worker_stop.is_set():
+            _worker_wake.clear()
+            db = session_factory()
+            try:
+                report = process_pending_events(db)
+                if any(report.values()):
+                    print(f"[OK] Stripe events applied: {report}")
+            except Exception as e:
+                print(f"[WARNING] Stripe webhook worker failed: {e}")
+            finally:
+                db.close()
+            _worker_wake.wait(settings.STRIPE_WEBHOOK_POLL_SECONDS)
+
+    _worker_stop.clear()
+    thread = threading.Thread(target=run, name="stripe-webhooks", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_webhook_worker() -> None:
+    _worker_stop.set()
+    _worker_wake.set()
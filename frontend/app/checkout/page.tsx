@@ -5,7 +5,7 @@
 
 'use client'
 
-import { useEffect, useState } from 'react'
+import { MutableRefObject, useEffect, useRef, useState } from 'react'
 import { useRouter } from 'next/navigation'
 import { ordersApi, paymentsApi } from '@/lib/api'
 import { useCartStore } from '@/store/cartStore'
@@ -18,12 +18,35 @@ const stripePromise = loadStripe(
   process.env.NEXT_PUBLIC_STRIPE_PUBLISHABLE_KEY || ''
 )
 
+// Idempotency-Key of a request and the body it was sent with
+type KeyedRequest = { body: string; key: string }
+
+// Same key only for a byte-identical retry; a changed payload gets a new one
+function idempotencyKeyFor(request: MutableRefObject<KeyedRequest | null>, payload: unknown) {
+  const body = JSON.stringify(payload)
+  if (request.current?.body !== body) {
+    request.current = { body, key: crypto.randomUUID() }
+  }
+  return request.current.key
+}
+
+// No response, timeouts, "still in progress" (409), rate limits and server
+// errors may be retried with the same key; any other 4xx was rejected for good
+function isRetryable(err: any) {
+  const status = err?.response?.status
+  return !status || status === 408 || status === 409 || status === 429 || status >= 500
+}
+
 export default function CheckoutPage() {
   const router = useRouter()
   const { items, getSubtotal, clearCart } = useCartStore()
 
   const [processing, setProcessing] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  // Double submits and retries after a failed payment step get the already
+  // created order back; the key changes with the payload (see idempotencyKeyFor)
+  const orderRequest = useRef<KeyedRequest | null>(null)
+  const paymentRequest = useRef<KeyedRequest | null>(null)
 
   // Form data
   const [formData, setFormData] = useState({
@@ -127,13 +150,29 @@ export default function CheckoutPage() {
         payment_method: 'stripe'
       }
 
-      const order = await ordersApi.createOrderFromCart(orderPayload)
+      let order
+      try {
+        order = await ordersApi.createOrderFromCart(
+          orderPayload, idempotencyKeyFor(orderRequest, orderPayload)
+        )
+      } catch (err) {
+        if (!isRetryable(err)) orderRequest.current = null
+        throw err
+      }
 
       // Step 2: Create payment intent
-      const payment = await paymentsApi.createPaymentIntent(
-        order.web_order_id,
-        `${window.location.origin}/order/${order.web_order_id}`
-      )
+      const returnUrl = `${window.location.origin}/order/${order.web_order_id}`
+      let payment
+      try {
+        payment = await paymentsApi.createPaymentIntent(
+          order.web_order_id,
+          returnUrl,
+          idempotencyKeyFor(paymentRequest, { order_id: order.web_order_id, return_url: returnUrl })
+        )
+      } catch (err) {
+        if (!isRetryable(err)) paymentRequest.current = null
+        throw err
+      }
 
       // Step 3: Show success and redirect
       console.log('Payment intent created successfully:', payment)
@@ -156,8 +195,9 @@ export default function CheckoutPage() {
 
     } catch (err: any) {
       console.error('Fehler beim Checkout:', err)
+      const detail = err.response?.data?.detail
       setError(
-        err.response?.data?.detail ||
+        (typeof detail === 'string' ? detail : detail?.message) ||
         'Fehler beim Verarbeiten der Bestellung. Bitte versuchen Sie es erneut.'
       )
       setProcessing(false)
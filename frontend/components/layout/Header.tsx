@@ -13,7 +13,7 @@ import { ShoppingCart, User, Menu, X, Search, ChevronDown, ArrowRight } from 'lu
 import { useCartStore } from '@/store/cartStore'
 import { useAuthStore } from '@/store/authStore'
 import { categoriesApi, Category, pagesApi, MenuPage } from '@/lib/api'
-import { buildCategoryTree, CategoryNode } from '@/lib/categoryTree'
+import { linkCategoryTree, CategoryNode } from '@/lib/categoryTree'
 import MegaMenu, { SimpleDropdown } from './MegaMenu'
 
 // Category name mapping for display
@@ -54,8 +54,8 @@ export default function Header() {
   useEffect(() => {
     async function fetchData() {
       try {
-        const categoriesResponse = await categoriesApi.getAll()
-        const tree = buildCategoryTree(categoriesResponse.categories)
+        const categoriesResponse = await categoriesApi.getTree()
+        const tree = linkCategoryTree(categoriesResponse.tree)
         setCategoryTree(tree)
 
         const pagesRes = await fetch('/api/pages/public/menu', {
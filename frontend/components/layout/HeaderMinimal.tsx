@@ -12,7 +12,7 @@ import { ShoppingCart, User, Menu, X, Search, ChevronDown, ChevronRight } from '
 import { useCartStore } from '@/store/cartStore'
 import { useAuthStore } from '@/store/authStore'
 import { categoriesApi } from '@/lib/api'
-import { buildCategoryTree, CategoryNode } from '@/lib/categoryTree'
+import { linkCategoryTree, CategoryNode } from '@/lib/categoryTree'
 
 // Delay constants for smooth UX
 const OPEN_DELAY = 50
@@ -57,8 +57,8 @@ export default function HeaderMinimal() {
     setHydrated(true)
     async function fetchCategories() {
       try {
-        const response = await categoriesApi.getAll()
-        const tree = buildCategoryTree(response.categories)
+        const response = await categoriesApi.getTree()
+        const tree = linkCategoryTree(response.tree)
         setCategoryTree(tree)
       } catch (error) {
         console.error('Failed to fetch categories:', error)
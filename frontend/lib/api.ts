@@ -169,6 +169,33 @@ export interface ProductResponse {
   products: Product[];
 }
 
+export interface FacetValue {
+  value: string;
+  count: number;
+}
+
+export interface FacetFilters {
+  category?: string;
+  manufacturer?: string;
+  productgroup?: string;
+  min_price?: number;
+  max_price?: number;
+  country?: string;
+}
+
+export interface ProductFacetsResponse {
+  status: string;
+  total: number;
+  facets: {
+    manufacturers: FacetValue[];
+    product_groups: FacetValue[];
+    colours: FacetValue[];
+    sizes: FacetValue[];
+    types: FacetValue[];
+    price_range: { min: number; max: number };
+  };
+}
+
 // ============================================================================
 // PRODUCTS API
 // ============================================================================
@@ -208,6 +235,12 @@ export const productsApi = {
     });
     return response.data;
   },
+
+  // Filter values with product counts under the current filters
+  getFacets: async (filters: FacetFilters = {}): Promise<ProductFacetsResponse> => {
+    const response = await apiClient.get('/meta/facets', { params: filters });
+    return response.data;
+  },
 };
 
 // ============================================================================
@@ -220,6 +253,12 @@ export interface Category {
   categorypath?: string | null;
   categoryimageurl?: string | null;
   product_count?: number;
+  father_count?: number;
+}
+
+export interface CategoryTreeNode extends Category {
+  level: number;
+  children: CategoryTreeNode[];
 }
 
 export interface CategoryProductsResponse {
@@ -239,6 +278,12 @@ export const categoriesApi = {
     return response.data;
   },
 
+  // Get categories as a tree (built server-side from categorypath)
+  getTree: async (): Promise<{ status: string; count: number; tree: CategoryTreeNode[] }> => {
+    const response = await apiClient.get('/meta/categories/tree');
+    return response.data;
+  },
+
   // Get products in a specific category
   getProducts: async (categoryId: number, skip: number = 0, limit: number = 24): Promise<CategoryProductsResponse> => {
     const response = await apiClient.get(`/meta/categories/${categoryId}`, {
@@ -367,8 +412,11 @@ export const ordersApi = {
     shipping: number;
     total_amount: number;
     payment_method: string;
-  }): Promise<Order> => {
-    const response = await apiClient.post('/web-orders/create', orderPayload);
+  }, idempotencyKey?: string): Promise<Order> => {
+    // Same key for retries of one checkout: the backend returns the first order
+    const response = await apiClient.post('/web-orders/create', orderPayload, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
+    });
     return response.data;
   },
 
@@ -421,7 +469,8 @@ export const paymentsApi = {
   // Create payment intent
   createPaymentIntent: async (
     orderId: number,
-    returnUrl: string
+    returnUrl: string,
+    idempotencyKey?: string
   ): Promise<{
     payment_intent_id: string;
     client_secret: string;
@@ -431,6 +480,8 @@ export const paymentsApi = {
     const response = await apiClient.post('/payments/create-payment-intent', {
       order_id: orderId,
       return_url: returnUrl,
+    }, {
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
     });
     return response.data;
   },
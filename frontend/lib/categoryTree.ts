@@ -3,7 +3,7 @@
  * Converts flat category array into hierarchical tree structure
  */
 
-import { Category } from './api'
+import { Category, CategoryTreeNode } from './api'
 
 export interface CategoryNode extends Category {
   children: CategoryNode[]
@@ -78,6 +78,18 @@ export function buildCategoryTree(categories: Category[]): CategoryNode[] {
   return tree
 }
 
+/**
+ * Add parent links to a tree from categoriesApi.getTree()
+ * (the server sends nodes without `parent`, which is needed for breadcrumbs)
+ */
+export function linkCategoryTree(nodes: CategoryTreeNode[], parent?: CategoryNode): CategoryNode[] {
+  return nodes.map(treeNode => {
+    const node: CategoryNode = { ...treeNode, children: [], parent }
+    node.children = linkCategoryTree(treeNode.children, node)
+    return node
+  })
+}
+
 /**
  * Get top-level categories (e.g., Fahrräder, Zubehör, Bekleidung)
  */
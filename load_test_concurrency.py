@@ -0,0 +1,93 @@
+"""
+Concurrency Load Test
+Checks that concurrent API requests are served in parallel instead of
+queueing behind each other on the event loop
+
+Usage:
+    python load_test_concurrency.py [endpoint] [concurrency] [rounds]
+    python load_test_concurrency.py /pages/public/menu 20 3
+
+Compares the latency of a single request with the wall time of N
+simultaneous requests. If the route blocks the event loop, N requests take
+about N x the single latency; served from the threadpool they take about
+1-2 x (until the DB pool or THREADPOOL_SIZE is exhausted).
+"""
+import sys
+import time
+import statistics
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuration
+BASE_URL = "http://localhost:8000/api"  # Change if your backend runs on different port
+ENDPOINT = sys.argv[1] if len(sys.argv) > 1 else "/pages/public/menu"
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+ROUNDS = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+# Colors for output
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    END = '\033[0m'
+
+def print_success(message):
+    print(f"{Colors.GREEN}✓ {message}{Colors.END}")
+
+def print_error(message):
+    print(f"{Colors.RED}✗ {message}{Colors.END}")
+
+def print_info(message):
+    print(f"{Colors.YELLOW}ℹ {message}{Colors.END}")
+
+def timed_get(session, url):
+    """GET url, return (status_code, seconds)"""
+    start = time.perf_counter()
+    response = session.get(url, timeout=60)
+    return response.status_code, time.perf_counter() - start
+
+def main():
+    url = f"{BASE_URL}{ENDPOINT}"
+    print(f"{Colors.BLUE}{'='*60}")
+    print(f"CONCURRENCY TEST: {url}")
+    print(f"{CONCURRENCY} parallel requests x {ROUNDS} rounds")
+    print(f"{'='*60}{Colors.END}")
+
+    session = requests.Session()
+
+    # Warm up (connection pools, catalog snapshot, ...)
+    status_code, _ = timed_get(session, url)
+    if status_code >= 500:
+        print_error(f"Endpoint returned {status_code} - is the backend running?")
+        return
+
+    # Single request latency
+    single = statistics.median(timed_get(session, url)[1] for _ in range(5))
+    print_info(f"Single request (median of 5): {single * 1000:.1f} ms")
+
+    ratios = []
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        sessions = [requests.Session() for _ in range(CONCURRENCY)]
+        for round_nr in range(1, ROUNDS + 1):
+            start = time.perf_counter()
+            results = list(pool.map(lambda s: timed_get(s, url), sessions))
+            wall = time.perf_counter() - start
+
+            errors = [code for code, _ in results if code >= 500]
+            ratio = wall / single if single > 0 else 0
+            ratios.append(ratio)
+            print_info(
+                f"Round {round_nr}: {CONCURRENCY} requests in {wall * 1000:.1f} ms "
+                f"({ratio:.1f}x single latency, {len(errors)} errors)"
+            )
+
+    # Fully serialized requests would take ~CONCURRENCY x the single latency
+    worst = max(ratios)
+    if worst < CONCURRENCY / 2:
+        print_success(f"Requests run concurrently (worst round {worst:.1f}x, serialized would be ~{CONCURRENCY}x)")
+    else:
+        print_error(f"Requests look serialized (worst round {worst:.1f}x, expected well below {CONCURRENCY}x)")
+
+if __name__ == "__main__":
+    main()
@@ -184,6 +184,28 @@ def run_schema_updates(neon_cursor, neon_conn):
         print(f"⚠ Schema update warning: {e}")
         neon_conn.rollback()
 
+def bump_catalog_version(neon_cursor, neon_conn):
+    """Tell the API workers to reload their cached catalog snapshot"""
+    try:
+        neon_cursor.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version BIGINT NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        neon_cursor.execute("""
+            INSERT INTO catalog_version (id, version, updated_at)
+            VALUES (1, 1, NOW())
+            ON CONFLICT (id) DO UPDATE
+            SET version = catalog_version.version + 1, updated_at = NOW()
+        """)
+        neon_conn.commit()
+        print("✓ Catalog version bumped (API caches will refresh)")
+    except psycopg2.Error as e:
+        print(f"⚠ Could not bump catalog version: {e}")
+        neon_conn.rollback()
+
 def main():
     print("\n" + "=" * 60)
     print("DATABASE SYNC: LOCAL → NEON (Vercel)")
@@ -237,6 +259,8 @@ def main():
             rows = sync_table(local_cursor, neon_cursor, neon_conn, table)
             total_web_rows += rows
 
+        bump_catalog_version(neon_cursor, neon_conn)
+
         print("\n" + "=" * 60)
         print("SYNC COMPLETE")
         print("=" * 60)